@@ -489,6 +489,7 @@ export function startApiServer(port = 3000) {
         const PYTHON_PATH = process.env.RAG_PYTHON || `${process.env.HOME}/.venv/bin/python`;
         const obsidianRagScript = new URL("../rag/obsidian_rag.py", import.meta.url).pathname;
         const agenticRagScript = new URL("../rag/agentic_rag.py", import.meta.url).pathname;
+        const RAG_SEARCH_MODES = ["vector", "hybrid"];
 
         // Helper to run Python scripts
         async function runPython(args: string[]): Promise<unknown> {
@@ -544,13 +545,44 @@ export function startApiServer(port = 3000) {
         // RAG - search (simple)
         if (path === "/api/rag/search" && method === "POST") {
           const body = await req.json();
-          const { query, top_k = 5 } = body;
+          const {
+            query,
+            top_k = 5,
+            mode = "vector",
+            expand,
+            mmr,
+            notes,
+            links,
+            folder,
+            tag,
+            since,
+            until,
+          } = body;
           if (!query) {
             return Response.json(
               { error: "query required" },
               { status: 400, headers: corsHeaders },
             );
           }
+          if (!RAG_SEARCH_MODES.includes(mode)) {
+            return Response.json(
+              { error: `mode must be one of: ${RAG_SEARCH_MODES.join(", ")}` },
+              { status: 400, headers: corsHeaders },
+            );
+          }
+          // mmr=0、expand=0 等 falsy 值也是有效的選項，只略過未指定的
+          const options = Object.entries({
+            expand,
+            mmr,
+            notes,
+            links,
+            folder,
+            tag,
+            since,
+            until,
+          }).flatMap(([key, value]) =>
+            value !== undefined && value !== null ? [`--${key}`, String(value)] : [],
+          );
           const result = await runPython([
             obsidianRagScript,
             "search",
@@ -560,6 +592,9 @@ export function startApiServer(port = 3000) {
             VAULT_PATH,
             "-k",
             String(top_k),
+            "--mode",
+            mode,
+            ...options,
             "--json",
           ]);
           return Response.json({ results: result }, { headers: corsHeaders });
@@ -53,12 +53,49 @@ export function registerObsidianTools(server: McpServer): void {
       inputSchema: {
         query: z.string().describe("搜尋查詢（自然語言）"),
         top_k: z.number().optional().describe("返回結果數量（預設 5）"),
+        mode: z
+          .enum(["vector", "hybrid"])
+          .optional()
+          .describe("搜尋模式（預設 vector；hybrid 另以關鍵字比對，適合人名、程式識別字）"),
+        expand: z
+          .boolean()
+          .optional()
+          .describe("合併同一筆記的結果並補上前後文，回傳較少但較完整的段落"),
+        diverse: z
+          .boolean()
+          .optional()
+          .describe("以 MMR 重排，避免回傳多篇內容幾乎相同的筆記（例如日記）"),
+        linked: z
+          .boolean()
+          .optional()
+          .describe("另外附上結果筆記以 [[wikilinks]] 連結的相關筆記"),
+        folder: z.string().optional().describe("只搜尋此頂層資料夾（例如 Projects）"),
+        tag: z.string().optional().describe("只搜尋含此 tag 的筆記"),
+        since: z.string().optional().describe("只搜尋此時間之後修改的筆記（ISO 日期或 30d）"),
+        until: z.string().optional().describe("只搜尋此時間之前修改的筆記（ISO 日期，含當天）"),
       },
     },
-    async ({ query, top_k = 5 }) => {
+    async ({
+      query,
+      top_k = 5,
+      mode = "vector",
+      expand = false,
+      diverse = false,
+      linked = false,
+      folder,
+      tag,
+      since,
+      until,
+    }) => {
       try {
+        const filters = Object.entries({ folder, tag, since, until }).flatMap(([key, value]) =>
+          value ? [`--${key}`, value] : [],
+        );
+        if (expand) filters.push("--expand");
+        if (diverse) filters.push("--mmr");
+        if (linked) filters.push("--links");
         const result =
-          await $`${VENV_PYTHON} ${RAG_SCRIPT} search --vault ${VAULT_PATH} -q ${query} -k ${top_k}`.quiet();
+          await $`${VENV_PYTHON} ${RAG_SCRIPT} search --vault ${VAULT_PATH} -q ${query} -k ${top_k} --mode ${mode} ${filters}`.quiet();
         const output = result.stdout.toString();
 
         if (!output.trim()) {
@@ -15,7 +15,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
-from obsidian_rag import ObsidianRAG
+from obsidian_rag import EXPAND_MAX_TOKENS, MMR_LAMBDA, ObsidianRAG
 from pydantic import BaseModel, Field
 
 if TYPE_CHECKING:
@@ -158,7 +158,9 @@ def create_rag_graph(
         query = state.get("rewritten_query") or state["question"]
         print(f"  [retrieve] 查詢: {query}", file=sys.stderr)
 
-        results = rag.search(query, top_k=5)
+        # MMR 避免回傳多篇幾乎相同的筆記（例如日記）而觸發不必要的重寫；
+        # 同一筆記的命中合併成段落並補上前後文，生成時看到的不是零碎片段
+        results = rag.search(query, top_k=5, mmr=MMR_LAMBDA, expand=EXPAND_MAX_TOKENS)
 
         documents = [
             Document(
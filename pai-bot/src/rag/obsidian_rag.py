@@ -1,22 +1,140 @@
 #!/usr/bin/env python3
-"""Obsidian RAG 索引工具 - 使用 OpenAI embedding"""
+"""Obsidian RAG 索引工具 - 預設使用 OpenAI embedding（見 rag_embeddings.py）"""
 
 from __future__ import annotations
 
 import hashlib
+import json
 import os
 import re
-from datetime import datetime, timezone
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import product
 from pathlib import Path
-from typing import Any, cast
+from typing import TYPE_CHECKING, Any, Literal, TypedDict
 
-import chromadb
-from chromadb.api.types import Embeddable, EmbeddingFunction
+import numpy as np
+from obsidian_vault import (
+    ManifestEntry,
+    ManifestScan,
+    content_hash,
+    default_manifest_path,
+    extract_links,
+    extract_tags,
+    is_hidden,
+    manifest_entry,
+    mtime_iso,
+    save_manifest,
+    scan_manifest,
+    walk_markdown,
+)
+from rag_cache import (
+    EMBED_CACHE_MAX_BYTES,
+    EMBED_CACHE_PATH,
+    QUERY_CACHE_MAX_ITEMS,
+    QUERY_CACHE_PATH,
+    EmbeddingCache,
+    QueryEmbeddingCache,
+)
+from rag_compact import (
+    CHROMA_SQLITE_FILE,
+    COMPACT_SUFFIX,
+    db_footprint,
+    remove_orphaned_segments,
+    vacuum_sqlite,
+)
+from rag_embeddings import (
+    EMBEDDING_DIMENSION_ENV,
+    EMBEDDING_PROVIDERS,
+    EmbeddingProvider,
+    get_embedding_provider,
+    get_openai_embedding_function,  # noqa: F401 - 保留舊的 import 路徑
+    truncate_embedding,
+)
+from rag_journal import JOURNAL_FILE, SyncJournal
+from rag_lexical import LEXICAL_INDEX_FILE, LexicalIndex, reciprocal_rank_fusion
+from rag_links import LINK_INDEX_FILE, LinkIndex
+from rag_lock import WRITER_LOCK_FILE, SyncInProgressError, WriterLease
+from rag_metrics import SyncMetrics, append_metrics, percentile
+from rag_pipeline import RateLimiter, SyncPipeline, bounded_map, call_with_retry
+from rag_stats import STATS_SNAPSHOT_FILE, read_snapshot, write_snapshot
+from rag_watch import WATCH_DEBOUNCE, WATCH_POLL_INTERVAL, watch_vault_changes
+
+if TYPE_CHECKING:
+    from chromadb.api.collection_configuration import CreateHNSWConfiguration
+    from chromadb.api.models.Collection import Collection
+    from chromadb.api.types import Embeddings, PyEmbeddings, Where
 
 # 設定
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+CHUNK_MAX_TOKENS = 300  # markdown chunker 每個 chunk 的 token 上限
+CHUNK_MIN_CHARS = 20  # 過短的 chunk（例如只有標題）不索引
+CHUNK_STRATEGIES = ("markdown", "paragraph")  # paragraph = 舊版 chunk_text()
+# 預設沿用舊版段落切分；改用 markdown 需以 --chunk-strategy 指定，切換後第一次 sync 會重新切分並
+# embed 整個 vault
+DEFAULT_CHUNK_STRATEGY = "paragraph"
 DB_PATH = Path.home() / ".chromadb" / "obsidian"
+# chunk metadata 的版本：2 = 加入 folder / tags / mtime_ts（搜尋過濾用）
+# 舊版本的檔案在下次 sync 時重新切分並寫入；內容沒變的 chunk 沿用已存的向量，不重新 embed
+CHUNK_METADATA_VERSION = 2
+# 沒有 embedding 記錄的舊 collection 都是由 OpenAI text-embedding-3-small 建立的
+LEGACY_EMBEDDING = {
+    "embedding_provider": "openai",
+    "embedding_model": "text-embedding-3-small",
+    "embedding_dimension": 1536,
+}
+META_PAGE_SIZE = 1000  # 每次從 obsidian_meta 讀取的筆數
+BULK_BATCH_SIZE = 500  # 批次刪除 / upsert 的筆數上限
+EMBED_BATCH_MAX_ITEMS = 512  # 單次 embedding 請求的 chunk 上限
+EMBED_BATCH_MAX_TOKENS = 100_000  # 單次 embedding 請求的 token 上限（OpenAI 為 300k）
+EMBED_RPM = 3000  # OpenAI text-embedding-3-small tier 1 限制
+EMBED_TPM = 1_000_000
+SYNC_READ_WORKERS = 4  # 讀檔 + chunk 的 worker 數
+SYNC_EMBED_CONCURRENCY = 4  # 同時進行的 embedding 請求數
+SEARCH_MODES = ("vector", "hybrid")  # hybrid = 向量 + BM25，以 RRF 合併
+DEFAULT_SEARCH_MODE = "vector"
+HYBRID_CANDIDATES = 20  # hybrid 模式每種檢索至少取回的候選數
+EXPAND_MAX_TOKENS = 800  # 結果擴展：每個段落（含相鄰 chunks）的 token 上限
+EXPAND_RADIUS = 2  # 結果擴展：每個命中前後最多補幾個 chunks
+MMR_LAMBDA = 0.5  # MMR：1 = 只看相關性，0 = 只看多樣性
+MMR_CANDIDATES = 20  # MMR 重排的候選數
+NOTE_CANDIDATES = 10  # 兩階段搜尋：先找出的筆記數
+NOTE_BATCH_SIZE = 100  # 更新筆記向量時每次讀取的檔案數
+LINK_NEIGHBORS = 3  # 連結擴展：加入的一步連結筆記數
+LINK_MAX_CHUNKS = 500  # 連結擴展：在連結筆記中挑選最佳 chunk 時最多比對的 chunks
+# 以向量查詢的 collections，可個別指定 HNSW 參數（--hnsw）
+HNSW_COLLECTIONS = ("obsidian_vault", "obsidian_notes")
+# --hnsw 的參數名稱 → Chroma configuration 欄位；M 與 construction_ef 需重建索引才會生效
+HNSW_PARAMS = {"M": "max_neighbors", "construction_ef": "ef_construction", "search_ef": "ef_search"}
+HNSW_REBUILD_PARAMS = ("max_neighbors", "ef_construction")
+TUNE_SUFFIX = "__tune"  # tune 暫存 collection 名稱後綴
+MIGRATE_SUFFIX = "__migrate"  # migrate 暫存 collection 名稱後綴
+TUNE_SAMPLES = 100  # tune 抽樣的查詢數（以既有 chunk 向量查詢）
+TUNE_M = (16, 32)
+TUNE_CONSTRUCTION_EF = (100, 200)
+TUNE_SEARCH_EF = (10, 20, 50, 100)
+COMPACT_PROBE_QUERIES = 20  # compact 前後量測查詢延遲的查詢數（以既有 chunk 向量查詢）
+WRITE_COMMANDS = ("sync", "compact", "tune", "migrate")  # 執行期間持有 writer lease 的命令
+
+# CJK 字元（中日韓）大約一字一 token，其餘文字約 4 字元一 token
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+_FRONTMATTER_RE = re.compile(r"^---\n.*?\n---\n", re.DOTALL)
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？.!?])\s+|(?<=[。！？])")
+
+
+class Chunk(TypedDict):
+    text: str
+    start_byte: int  # 在原始檔案（UTF-8）中的位置，-1 表示未知
+    end_byte: int
+    heading_path: str  # 例如 "專案 > 進度"
 
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
@@ -66,238 +184,2865 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     return [c for c in final_chunks if len(c) > 20]
 
 
-def generate_chunk_id(file_path: str, chunk_index: int) -> str:
-    """產生 chunk 的唯一 ID"""
-    return hashlib.md5(f"{file_path}:{chunk_index}".encode()).hexdigest()
+def _markdown_blocks(text: str, start: int) -> Iterator[tuple[int, int, str, bool]]:
+    """逐行掃描 markdown，產生 (start, end, heading_path, is_heading) 區塊
 
+    空行分隔段落，標題行自成一個區塊並更新標題路徑；code fence 內不切分
+    """
+    headings: list[tuple[int, str]] = []
+    block_start = -1
+    block_end = -1
+    in_fence = False
 
-def get_openai_embedding_function() -> EmbeddingFunction[Embeddable]:
-    """取得 OpenAI embedding function"""
-    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+    for line in re.finditer(r"[^\n]*\n?", text[start:]):
+        if not line.group():
+            break
+        line_start, line_end = start + line.start(), start + line.end()
+        content = line.group().rstrip("\n")
 
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY 環境變數未設定")
+        if _FENCE_RE.match(content):
+            in_fence = not in_fence
+        elif not in_fence:
+            heading = _HEADING_RE.match(content)
+            if heading or not content.strip():
+                if block_start >= 0:
+                    yield block_start, block_end, " > ".join(h for _, h in headings), False
+                    block_start = -1
+                if heading:
+                    level = len(heading.group(1))
+                    headings = [h for h in headings if h[0] < level]
+                    headings.append((level, heading.group(2)))
+                    path = " > ".join(h for _, h in headings)
+                    yield line_start, line_end, path, True
+                continue
+
+        if block_start < 0:
+            block_start = line_start
+        block_end = line_end
+
+    if block_start >= 0:
+        yield block_start, block_end, " > ".join(h for _, h in headings), False
+
+
+def _split_oversized(text: str, start: int, end: int, max_tokens: int) -> Iterator[tuple[int, int]]:
+    """將超過 token 上限的區塊依句子切分，單句仍過長則硬切"""
+    pieces: list[tuple[int, int]] = []
+    piece_start = start
+    for match in _SENTENCE_END_RE.finditer(text, start, end):
+        if match.end() > piece_start and match.start() > piece_start:
+            pieces.append((piece_start, match.end()))
+            piece_start = match.end()
+    if piece_start < end:
+        pieces.append((piece_start, end))
+
+    for piece_start, piece_end in pieces:
+        while piece_end - piece_start > 0:
+            n = piece_end - piece_start
+            tokens = estimate_tokens(text[piece_start : piece_start + n])
+            while tokens > max_tokens and n > 1:
+                n = max(1, n * max_tokens // tokens)
+                tokens = estimate_tokens(text[piece_start : piece_start + n])
+            yield piece_start, piece_start + n
+            piece_start += n
+
+
+def chunk_markdown(text: str, max_tokens: int = CHUNK_MAX_TOKENS) -> list[Chunk]:
+    """依標題邊界與 token 預算切分 markdown（單次串流掃描）
+
+    每個 chunk 是原文的連續片段，附帶 UTF-8 byte offsets 與所在標題路徑
+    """
+    frontmatter = _FRONTMATTER_RE.match(text)
+    body_start = frontmatter.end() if frontmatter else 0
+
+    chunks: list[Chunk] = []
+    # 字元位置 -> byte offset：chunk 位置單調遞增，所以只需往前累加
+    cursor = (0, 0)
+
+    def to_byte(pos: int) -> int:
+        nonlocal cursor
+        char_pos, byte_pos = cursor if pos >= cursor[0] else (0, 0)
+        cursor = (pos, byte_pos + len(text[char_pos:pos].encode("utf-8")))
+        return cursor[1]
+
+    cur_start, cur_end, cur_path = -1, -1, ""
+
+    def emit() -> None:
+        if cur_start < 0:
+            return
+        raw = text[cur_start:cur_end]
+        stripped = raw.strip()
+        if len(stripped) <= CHUNK_MIN_CHARS:
+            return
+        start = cur_start + len(raw) - len(raw.lstrip())
+        end = start + len(stripped)
+        chunks.append(
+            Chunk(
+                text=stripped,
+                start_byte=to_byte(start),
+                end_byte=to_byte(end),
+                heading_path=cur_path,
+            )
+        )
+
+    def overflows(end: int) -> bool:
+        # 以合併後的實際範圍估算（含區塊之間的空行），max_tokens 是硬上限
+        return cur_start >= 0 and estimate_tokens(text[cur_start:end]) > max_tokens
+
+    for block_start, block_end, path, is_heading in _markdown_blocks(text, body_start):
+        if is_heading or overflows(block_end):
+            emit()
+            cur_start = -1
+
+        if estimate_tokens(text[block_start:block_end]) > max_tokens:
+            for piece_start, piece_end in _split_oversized(
+                text, block_start, block_end, max_tokens
+            ):
+                if overflows(piece_end):
+                    emit()
+                    cur_start = -1
+                if cur_start < 0:
+                    cur_start, cur_path = piece_start, path
+                cur_end = piece_end
+            continue
+
+        if cur_start < 0:
+            cur_start, cur_path = block_start, path
+        cur_end = block_end
+
+    emit()
+    return chunks
+
+
+def split_chunks(text: str, strategy: str = DEFAULT_CHUNK_STRATEGY) -> list[Chunk]:
+    """依策略切分文字：markdown（標題 + token 預算）或 paragraph（舊版 chunk_text）"""
+    if strategy == "markdown":
+        return chunk_markdown(text)
+    if strategy == "paragraph":
+        return [
+            Chunk(text=c, start_byte=-1, end_byte=-1, heading_path="") for c in chunk_text(text)
+        ]
+    raise ValueError(f"未知的 chunk 策略: {strategy}")
+
+
+def top_folder(rel_path: str) -> str:
+    """檔案所在的頂層資料夾，vault 根目錄的檔案為空字串"""
+    parts = Path(rel_path).parts
+    return parts[0] if len(parts) > 1 else ""
+
+
+def parse_time(value: str, end: bool = False) -> float:
+    """解析 --since / --until：ISO 日期或時間，或相對天數（例如 30d）
+
+    只有日期時，end=True 代表該日結束（隔天 00:00）；未指定時區時使用本地時區
+    """
+    value = value.strip()
+    if re.fullmatch(r"\d+d", value):
+        return (datetime.now(tz=timezone.utc) - timedelta(days=int(value[:-1]))).timestamp()
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed.timestamp()
+
+
+def build_where(
+    folder: str | None = None,
+    tag: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> dict[str, Any] | None:
+    """將搜尋過濾條件轉成 Chroma 的 where（在索引內過濾，不佔 top_k 名額）"""
+    conditions: list[dict[str, Any]] = []
+    if folder:
+        conditions.append({"folder": Path(folder.strip("/")).parts[0]})
+    if tag:
+        conditions.append({"tags": {"$contains": tag.lstrip("#")}})
+    if since:
+        conditions.append({"mtime_ts": {"$gte": parse_time(since)}})
+    if until:
+        conditions.append({"mtime_ts": {"$lt": parse_time(until, end=True)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_: float) -> list[int]:
+    """Maximal marginal relevance：依序挑選與已選結果最不相似、又與查詢相關的候選
+
+    relevance 為每個候選與查詢的相關性，vectors 為候選的 embedding（n × d）；
+    相似度矩陣一次算好，每一步只做向量運算。回傳被選中的候選索引（依挑選順序）
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1.0, norms)
+    similarity = unit @ unit.T
+
+    selected: list[int] = []
+    redundancy = np.zeros(n)  # 與已選結果的最大相似度
+    available = np.ones(n, dtype=bool)
+    for step in range(min(k, n)):
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = similarity[best] if step == 0 else np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def read_query_lines(lines: Iterable[str]) -> list[str]:
+    """解析 JSON lines 查詢：每行為 JSON 字串或含 query 欄位的物件，空白行略過"""
+    queries: list[str] = []
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_no} 行不是有效的 JSON: {e}") from e
+        query = item.get("query") if isinstance(item, dict) else item
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError(f"第 {line_no} 行缺少查詢字串")
+        queries.append(query)
+    return queries
+
+
+def parse_hnsw_params(values: Iterable[str]) -> dict[str, dict[str, int]]:
+    """解析 --hnsw 參數（COLLECTION:key=value[,key=value]），格式錯誤時拋出 ValueError
+
+    例如 obsidian_vault:M=32,search_ef=64；key 為 M、construction_ef 或 search_ef
+    """
+    params: dict[str, dict[str, int]] = {}
+    for value in values:
+        name, sep, pairs = value.partition(":")
+        if not sep or name not in HNSW_COLLECTIONS:
+            raise ValueError(f"--hnsw 需指定 collection（{' / '.join(HNSW_COLLECTIONS)}）: {value}")
+        for pair in pairs.split(","):
+            key, sep, number = pair.partition("=")
+            if not sep or key not in HNSW_PARAMS or not number.isdigit() or int(number) <= 0:
+                raise ValueError(f"無效的 HNSW 參數（{', '.join(HNSW_PARAMS)}）: {pair}")
+            params.setdefault(name, {})[key] = int(number)
+    return params
+
+
+def _hnsw_config(collection: Collection) -> dict[str, Any]:
+    """collection 目前的 HNSW 設定（Chroma configuration 的 hnsw 欄位）"""
+    return dict((collection.configuration or {}).get("hnsw") or {})
 
-    # OpenAIEmbeddingFunction 只接受 list[str]，但 chromadb API 期望 Embeddable
-    # 實際使用時只會傳入 list[str]，所以這個 cast 是安全的
-    return cast(
-        EmbeddingFunction[Embeddable],
-        OpenAIEmbeddingFunction(
-            api_key=api_key,
-            model_name="text-embedding-3-small",
-        ),
-    )
+
+def estimate_tokens(text: str) -> int:
+    """粗估文字的 token 數（不依賴 tokenizer）"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _batched(items: list[str], size: int) -> list[list[str]]:
+    """將 list 切成固定大小的批次"""
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _where_in(field: str, values: Iterable[str]) -> Where:
+    """metadata 欄位值在 values 之中的篩選條件（$in）"""
+    members: list[str | int | float | bool] = list(values)
+    expression: dict[Literal["$in", "$nin"], list[str | int | float | bool]] = {"$in": members}
+    return {field: expression}
+
+
+def generate_chunk_id(file_path: str, chunk: str, occurrence: int = 0) -> str:
+    """產生 chunk 的唯一 ID
+
+    由 chunk 內容決定，不受前後段落增刪影響；同一檔案內重複的內容以出現次序區分
+    """
+    digest = hashlib.sha256(chunk.encode()).hexdigest()
+    return hashlib.md5(f"{file_path}:{digest}:{occurrence}".encode()).hexdigest()
+
+
+def generate_chunk_ids(file_path: str, chunks: list[str]) -> list[str]:
+    """產生檔案所有 chunks 的 ID"""
+    seen: dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        occurrence = seen.get(chunk, 0)
+        seen[chunk] = occurrence + 1
+        ids.append(generate_chunk_id(file_path, chunk, occurrence))
+    return ids
+
+
+class _EmbedBatch:
+    """跨檔案累積待 embed 的 chunks，依 chunk 數與 token 數上限分批
+
+    內容沒變的 chunks 只更新 metadata，消失的 chunks 在同一次 flush 刪除
+    """
+
+    def __init__(
+        self, max_items: int = EMBED_BATCH_MAX_ITEMS, max_tokens: int = EMBED_BATCH_MAX_TOKENS
+    ):
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.clear()
+
+    def take(self) -> _EmbedBatch:
+        """取出目前內容成為獨立批次（交給管線），自身清空繼續累積"""
+        taken = _EmbedBatch(self.max_items, self.max_tokens)
+        taken.__dict__.update(self.__dict__)
+        self.clear()
+        return taken
+
+    def has_embeddings(self) -> bool:
+        return bool(self.ids)
+
+    def clear(self) -> None:
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict[str, Any]] = []
+        self.tokens = 0
+        self.update_ids: list[str] = []
+        self.update_metadatas: list[dict[str, Any]] = []
+        self.delete_ids: list[str] = []
+        # 即將刪除的舊 chunks，內容與待 embed 的 chunk 相同時沿用其向量
+        self.reuse_ids: list[str] = []
+        # 最後一個 chunk 在此批次中的檔案，批次寫入後才更新其 meta
+        self.completed: dict[str, dict[str, Any]] = {}
+        # completed 中內容有變的檔案（需要重新計算筆記向量）
+        self.changed_files: list[str] = []
+        # completed 中內容有變的檔案的 wikilinks 目標，與 meta 一起寫入連結索引
+        self.links: dict[str, list[str]] = {}
+
+    def would_overflow(self, tokens: int) -> bool:
+        return bool(self.ids) and (
+            len(self.ids) >= self.max_items or self.tokens + tokens > self.max_tokens
+        )
+
+    def add(self, chunk_id: str, document: str, metadata: dict[str, Any], tokens: int) -> None:
+        self.ids.append(chunk_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self.tokens += tokens
+
+    def update(self, chunk_id: str, metadata: dict[str, Any]) -> None:
+        self.update_ids.append(chunk_id)
+        self.update_metadatas.append(metadata)
+
+
+def _new_stats() -> dict[str, int]:
+    return {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0, "touched": 0}
+
+
+def _add_folder_delta(
+    delta: dict[str, dict[str, int]], rel_path: str, files: int, chunks: int
+) -> None:
+    """累加一個檔案對其頂層資料夾檔案數與 chunk 數的變化"""
+    folder = delta.setdefault(top_folder(rel_path), {"files": 0, "chunks": 0})
+    folder["files"] += files
+    folder["chunks"] += chunks
 
 
 class ObsidianRAG:
     """Obsidian RAG 索引管理器"""
 
-    def __init__(self, vault_path: str | Path, db_path: str | Path | None = None, readonly: bool = False):
+    def __init__(
+        self,
+        vault_path: str | Path,
+        db_path: str | Path | None = None,
+        readonly: bool = False,
+        chunk_strategy: str = DEFAULT_CHUNK_STRATEGY,
+        embed_rpm: int = EMBED_RPM,
+        embed_tpm: int = EMBED_TPM,
+        embedding: str | EmbeddingProvider | None = None,
+        embedding_dim: int | None = None,
+        embed_cache: str | Path | None = None,
+        embed_cache_size: int = EMBED_CACHE_MAX_BYTES,
+        query_cache: str | Path | None = None,
+        query_cache_size: int = QUERY_CACHE_MAX_ITEMS,
+        metrics_path: str | Path | None = None,
+        manifest_path: str | Path | None = None,
+        hnsw: dict[str, dict[str, int]] | None = None,
+    ):
+        if chunk_strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"未知的 chunk 策略: {chunk_strategy}")
+        self.chunk_strategy = chunk_strategy
+        self.rate_limiter = RateLimiter(embed_rpm, embed_tpm)
+        # 各 collection 指定的 HNSW 參數（見 parse_hnsw_params），未指定的沿用 collection 目前的設定
+        self.hnsw = hnsw or {}
+        # 最近一次 sync 的指標；metrics_path 設定時每次 sync 附加一行到該 JSONL 檔
+        self.metrics = SyncMetrics()
+        self.metrics_path = Path(metrics_path).expanduser() if metrics_path else None
         self.vault_path = Path(vault_path).expanduser()
+        # vault 掃描結果（與 scripts/obsidian_index.py 共用），見 obsidian_vault.scan_manifest
+        self.manifest_path = (
+            Path(manifest_path).expanduser()
+            if manifest_path
+            else default_manifest_path(self.vault_path)
+        )
         self.db_path = Path(db_path).expanduser() if db_path else DB_PATH
         self.db_path.mkdir(parents=True, exist_ok=True)
 
+        # chromadb 載入很慢，延遲到建立索引管理器時才 import（stats 讀快照時不需要）
+        import chromadb
+
         self.client = chromadb.PersistentClient(path=str(self.db_path))
+        self.lease = WriterLease(self.db_path / WRITER_LOCK_FILE)
+        self._restore_compacted_collections()
 
+        # embeddings 一律由 provider 算好再傳給 Chroma，collection 不綁 embedding function
+        self.embedder: EmbeddingProvider | None = None
+        self.embed_cache: EmbeddingCache | None = None
         if readonly:
             # Stats only - no embedding needed
-            self.embedding_fn = None
             self.collection = self.client.get_or_create_collection(name="obsidian_vault")
         else:
-            self.embedding_fn = get_openai_embedding_function()
+            if isinstance(embedding, EmbeddingProvider):
+                self.embedder = embedding
+            else:
+                self.embedder = get_embedding_provider(embedding, embedding_dim)
             self.collection = self.client.get_or_create_collection(
                 name="obsidian_vault",
-                metadata={"hnsw:space": "cosine"},
-                embedding_function=self.embedding_fn,
+                metadata={"hnsw:space": "cosine", **self.embedder.collection_metadata()},
+                configuration=self._hnsw_configuration("obsidian_vault"),
             )
+            # 未指定維度（--embedding-dim / OBSIDIAN_RAG_EMBEDDING_DIM）時沿用 collection 的維度
+            explicit_dim = embedding_dim is not None or os.environ.get(EMBEDDING_DIMENSION_ENV)
+            if not explicit_dim and not isinstance(embedding, EmbeddingProvider):
+                self.embedder = self._stored_dimension(self.embedder)
+            self._check_embedding_provider(self.embedder)
+            # embed_cache_size 為 0 時停用快取
+            if embed_cache_size > 0:
+                self.embed_cache = EmbeddingCache(embed_cache or EMBED_CACHE_PATH, embed_cache_size)
 
         self.meta_collection = self.client.get_or_create_collection(name="obsidian_meta")
+        self._meta_dimension: int | None = None
+        # 每篇筆記一個向量（其 chunks 向量的平均），用於兩階段搜尋
+        self.note_collection = self.client.get_or_create_collection(
+            name="obsidian_notes",
+            metadata={"hnsw:space": "cosine"},
+            configuration=self._hnsw_configuration("obsidian_notes"),
+        )
+        self.lexical = LexicalIndex(self.db_path / LEXICAL_INDEX_FILE)
+        self.links = LinkIndex(self.db_path / LINK_INDEX_FILE)
+        self.journal = SyncJournal(self.db_path / JOURNAL_FILE)
+        if self.hnsw:
+            self._apply_hnsw_params()
+        # query_cache_size 為 0 時停用；readonly 模式也開啟，讓 stats 能回報命中次數
+        self.query_cache: QueryEmbeddingCache | None = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(
+                query_cache or QUERY_CACHE_PATH, query_cache_size
+            )
+
+    @contextmanager
+    def writer_lease(self, wait: float | None = 0) -> Iterator[None]:
+        """持有 DB 目錄的 writer lease；已有其他 writer 時拋出 SyncInProgressError
+
+        wait 為等待秒數（0 不等待，None 一直等待）；同一個 process 內可重複取得。
+        取得 lease 時重新以名稱取得 collections：lease 之外的期間其他 process 可能已
+        compact / migrate / tune 替換了 collection，原本的 handle 會指向已刪除的 collection
+        """
+        outermost = not self.lease.held()
+        if not self.lease.acquire(wait):
+            raise SyncInProgressError(self.lease.holder())
+        try:
+            if outermost:
+                self._refresh_collections()
+            yield
+        finally:
+            self.lease.release()
+
+    def _hnsw_configuration(self, name: str, current: dict[str, Any] | None = None) -> Any:
+        """建立 collection 用的 configuration：目前的 HNSW 設定（預設 cosine）加上指定的參數"""
+        hnsw = dict(current or {"space": "cosine"})
+        for key, value in self.hnsw.get(name, {}).items():
+            hnsw[HNSW_PARAMS[key]] = value
+        return {"hnsw": hnsw}
+
+    def _apply_hnsw_params(self) -> None:
+        """將指定的 HNSW 參數套用到既有的 collections
+
+        search_ef 寫入 collection 設定，之後載入索引的 process 生效；
+        M 與 construction_ef 只能在建立索引時指定，需執行 compact 重建
+        """
+        if not self.lease.acquire(0):
+            print("sync 進行中，略過 HNSW 參數變更", file=sys.stderr)
+            return
+        try:
+            for collection in (self.collection, self.note_collection):
+                if collection.name not in self.hnsw:
+                    continue
+                current = _hnsw_config(collection)
+                wanted = self._hnsw_configuration(collection.name, current)["hnsw"]
+                if wanted.get("ef_search") != current.get("ef_search"):
+                    collection.modify(configuration={"hnsw": {"ef_search": wanted["ef_search"]}})
+                stale = [k for k in HNSW_REBUILD_PARAMS if wanted.get(k) != current.get(k)]
+                if stale:
+                    print(
+                        f"{collection.name}: {', '.join(stale)} 需執行 compact 重建索引後才會生效",
+                        file=sys.stderr,
+                    )
+        finally:
+            self.lease.release()
+
+    def _collection_embedding(self) -> dict[str, Any] | None:
+        """collection 記錄的 embedding provider 資訊；空的舊 collection 回傳 None"""
+        metadata = dict(self.collection.metadata or {})
+        if "embedding_provider" in metadata:
+            return {k: metadata.get(k) for k in LEGACY_EMBEDDING}
+        return dict(LEGACY_EMBEDDING) if self.collection.count() else None
+
+    def _stored_dimension(self, embedder: EmbeddingProvider) -> EmbeddingProvider:
+        """provider 與模型相同時改用 collection 記錄的維度
+
+        migrate 縮短維度後，搜尋、MCP 工具與 watch 服務不必另外設定維度
+        """
+        stored = self._collection_embedding()
+        if (
+            stored is None
+            or stored["embedding_provider"] != embedder.name
+            or stored["embedding_model"] != embedder.model
+            or not stored["embedding_dimension"]
+            or stored["embedding_dimension"] == embedder.dimension
+        ):
+            return embedder
+        return embedder.with_dimension(int(stored["embedding_dimension"]))
+
+    def _check_embedding_provider(self, embedder: EmbeddingProvider) -> None:
+        """拒絕用不同的 embedding provider 開啟已有向量的 collection"""
+        expected = embedder.collection_metadata()
+        stored = self._collection_embedding()
+        if stored is not None and stored != expected and self.collection.count():
+            raise ValueError(
+                f"collection 由 {stored['embedding_provider']}:{stored['embedding_model']} "
+                f"({stored['embedding_dimension']} 維) 建立，與目前的 {embedder.describe()} "
+                f"({embedder.dimension} 維) 不符；請使用相同的 --embedding / --embedding-dim、"
+                "另一個 --db，或以 migrate 轉換"
+            )
+        metadata = dict(self.collection.metadata or {})
+        if all(metadata.get(k) == v for k, v in expected.items()):
+            return
+        # 搜尋等讀取路徑也會走到這裡：只在取得 writer lease 時寫入，否則留給下次 sync
+        if not self.lease.acquire(0):
+            return
+        try:
+            # hnsw:* 設定無法透過 modify 變更，只更新 embedding 相關欄位
+            keep = {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+            self.collection.modify(metadata={**keep, **expected})
+        finally:
+            self.lease.release()
 
     def _get_file_mtime(self, file_path: Path) -> str:
-        return datetime.fromtimestamp(file_path.stat().st_mtime, tz=timezone.utc).isoformat()
+        return mtime_iso(file_path.stat().st_mtime_ns)
 
-    def _get_stored_mtime(self, rel_path: str) -> str | None:
-        result = self.meta_collection.get(ids=[rel_path])
-        if result["metadatas"] and result["metadatas"][0]:
-            mtime = result["metadatas"][0].get("mtime")
-            return str(mtime) if mtime is not None else None
-        return None
+    def _load_meta(self) -> dict[str, dict[str, Any]]:
+        """分頁載入整個 obsidian_meta，回傳 {rel_path: metadata}"""
+        meta: dict[str, dict[str, Any]] = {}
+        offset = 0
+        while True:
+            page = self.meta_collection.get(
+                limit=META_PAGE_SIZE, offset=offset, include=["metadatas"]
+            )
+            ids = page["ids"]
+            metadatas = page["metadatas"] or []
+            for i, rel_path in enumerate(ids):
+                meta[rel_path] = dict(metadatas[i] or {}) if i < len(metadatas) else {}
+            if len(ids) < META_PAGE_SIZE:
+                return meta
+            offset += len(ids)
+
+    def _get_meta(self, rel_paths: list[str]) -> dict[str, dict[str, Any]]:
+        """批次載入指定檔案的 meta"""
+        meta: dict[str, dict[str, Any]] = {}
+        for batch in _batched(rel_paths, BULK_BATCH_SIZE):
+            page = self.meta_collection.get(ids=batch, include=["metadatas"])
+            for rel_path, metadata in zip(page["ids"], page["metadatas"] or []):
+                meta[rel_path] = dict(metadata or {})
+        return meta
+
+    def _file_meta(self, mtime: str, data: bytes) -> dict[str, Any]:
+        return {
+            "mtime": mtime,
+            "content_hash": content_hash(data),
+            "size": len(data),
+            "chunker": self.chunk_strategy,
+            "metadata_version": CHUNK_METADATA_VERSION,
+            "indexed_at": datetime.now(tz=timezone.utc).isoformat(),
+            # Chroma 不接受空的 list；None 會在 upsert / update 時移除舊的 tags
+            "tags": sorted(extract_tags(data.decode("utf-8"))) or None,
+        }
 
-    def _update_stored_mtime(self, rel_path: str, mtime: str) -> None:
-        self.meta_collection.upsert(
-            ids=[rel_path],
-            metadatas=[{"mtime": mtime, "indexed_at": datetime.now(tz=timezone.utc).isoformat()}],
-            documents=[rel_path],
+    def _is_current(self, meta: dict[str, Any], mtime: str) -> bool:
+        """meta 是否與目前檔案一致（mtime 相同、chunk 策略與 metadata 版本相同）"""
+        return meta.get("mtime") == mtime and self._same_layout(meta)
+
+    def _same_layout(self, meta: dict[str, Any]) -> bool:
+        """檔案的 chunks 是否以目前的 chunk 策略與 metadata 版本建立"""
+        # 沒有 chunker 欄位的舊 meta 是由 chunk_text() 建立的
+        return bool(
+            meta.get("chunker", "paragraph") == self.chunk_strategy
+            and meta.get("metadata_version", 1) == CHUNK_METADATA_VERSION
         )
 
-    def _delete_file_chunks(self, rel_path: str) -> int:
-        results = self.collection.get(where={"file_path": rel_path})
-        if results["ids"]:
-            self.collection.delete(ids=results["ids"])
-            return len(results["ids"])
-        return 0
+    def _meta_placeholder(self) -> list[float]:
+        """obsidian_meta 只用來存 metadata，給固定向量避免 Chroma 用預設模型 embed 路徑"""
+        if self._meta_dimension is None:
+            sample = self.meta_collection.get(limit=1, include=["embeddings"])
+            embeddings = sample.get("embeddings")
+            # 舊的 meta collection 由 Chroma 預設模型（384 維）建立，沿用既有維度
+            self._meta_dimension = (
+                len(embeddings[0]) if embeddings is not None and len(embeddings) else 1
+            )
+        return [0.0] * self._meta_dimension
 
-    def index_file(self, file_path: Path) -> int:
-        """索引單一檔案，回傳 chunk 數量"""
-        rel_path = str(file_path.relative_to(self.vault_path))
-        current_mtime = self._get_file_mtime(file_path)
-        stored_mtime = self._get_stored_mtime(rel_path)
+    def _update_file_meta(self, entries: dict[str, dict[str, Any]]) -> None:
+        """批次寫入多個檔案的 meta（mtime、content hash、size）"""
+        if not entries:
+            return
+        placeholder = self._meta_placeholder()
+        for batch in _batched(list(entries), BULK_BATCH_SIZE):
+            embeddings: PyEmbeddings = [placeholder] * len(batch)
+            self.meta_collection.upsert(
+                ids=batch,
+                metadatas=[entries[p] for p in batch],
+                documents=batch,
+                embeddings=embeddings,
+            )
 
-        if stored_mtime == current_mtime:
-            return 0
+    def _get_files_chunk_ids(self, rel_paths: list[str]) -> dict[str, set[str]]:
+        """批次取得多個檔案目前的 chunk IDs，回傳 {rel_path: ids}"""
+        chunk_ids: dict[str, set[str]] = {}
+        for batch in _batched(rel_paths, BULK_BATCH_SIZE):
+            results = self.collection.get(
+                where=_where_in("file_path", batch), include=["metadatas"]
+            )
+            for chunk_id, metadata in zip(results["ids"], results["metadatas"] or []):
+                chunk_ids.setdefault(str(metadata["file_path"]), set()).add(chunk_id)
+        return chunk_ids
+
+    def _delete_ids(self, ids: list[str]) -> None:
+        for batch in _batched(ids, BULK_BATCH_SIZE):
+            self.collection.delete(ids=batch)
+            self.lexical.delete(batch)
 
-        self._delete_file_chunks(rel_path)
+    def _ensure_lexical_index(self, full_check: bool = True) -> None:
+        """關鍵字索引與 collection 不一致時（舊 DB、中途中斷）從 collection 重建
 
+        full_check=False 時只在索引為空時重建（搜尋時使用）；
+        其他 process 持有 writer lease 時不重建，搜尋沿用現有索引
+        """
+        lexical_count = self.lexical.count()
+        if lexical_count and not full_check:
+            return
+        if not self.lease.acquire(timeout=0):
+            return
         try:
-            content = file_path.read_text(encoding="utf-8")
+            total = self.collection.count()
+            if lexical_count == total:
+                return
+
+            print(f"重建關鍵字索引（{total} chunks）...", file=sys.stderr)
+            self.lexical.clear()
+            offset = 0
+            while offset < total:
+                page = self.collection.get(
+                    limit=BULK_BATCH_SIZE, offset=offset, include=["documents"]
+                )
+                if not page["ids"]:
+                    break
+                self.lexical.upsert(page["ids"], [d or "" for d in page["documents"] or []])
+                offset += len(page["ids"])
+        finally:
+            self.lease.release()
+
+    def _delete_file_chunks(self, rel_path: str) -> int:
+        ids = self._get_files_chunk_ids([rel_path]).get(rel_path, set())
+        self._delete_ids(sorted(ids))
+        return len(ids)
+
+    def _read_file(self, file_path: Path, rel_path: str) -> bytes | None:
+        """讀取檔案原始內容；無法讀取時回傳 None"""
+        try:
+            data = file_path.read_bytes()
+            data.decode("utf-8")
         except Exception as e:
             print(f"  無法讀取 {rel_path}: {e}")
-            return 0
+            return None
+        return data
 
-        chunks = chunk_text(content)
-        if not chunks:
-            return 0
+    def _queue_chunks(
+        self,
+        batch: _EmbedBatch,
+        rel_path: str,
+        chunks: list[Chunk],
+        meta: dict[str, Any],
+        existing_ids: set[str] | None = None,
+        flush: Callable[[_EmbedBatch], None] | None = None,
+        links: list[str] | None = None,
+    ) -> int:
+        """將檔案的 chunks 與既有 chunks 比對後加入批次，回傳需要 embed 的數量
 
-        ids = [generate_chunk_id(rel_path, i) for i in range(len(chunks))]
-        metadatas = [
-            {"file_path": rel_path, "chunk_index": i, "mtime": current_mtime}
-            for i in range(len(chunks))
-        ]
+        已存在的 chunk（內容相同）只更新 metadata，不在新版本中的 chunk 會被刪除，
+        刪除前先讓內容相同的新 chunk 沿用其向量（例如舊版以位置編號的 chunk ID）；
+        批次滿了就交給 flush（預設為同步的 _flush_batch）；links 為檔案的 wikilinks 目標
+        """
+        existing_ids = existing_ids or set()
+        flush = flush or self._flush_batch
+        new_ids = generate_chunk_ids(rel_path, [c["text"] for c in chunks])
+        obsolete = sorted(existing_ids - set(new_ids))
+        batch.reuse_ids.extend(obsolete)
+        file_metadata: dict[str, Any] = {
+            "file_path": rel_path,
+            "folder": top_folder(rel_path),
+            "mtime": meta["mtime"],
+            "mtime_ts": datetime.fromisoformat(meta["mtime"]).timestamp(),
+            "tags": meta.get("tags") or None,
+        }
 
-        self.collection.upsert(ids=ids, documents=chunks, metadatas=metadatas)  # type: ignore[arg-type]
-        self._update_stored_mtime(rel_path, current_mtime)
+        embedded = 0
+        for i, (chunk_id, chunk) in enumerate(zip(new_ids, chunks)):
+            metadata: dict[str, Any] = {
+                **file_metadata,
+                "chunk_index": i,
+                "heading_path": chunk["heading_path"],
+            }
+            if chunk["start_byte"] >= 0:
+                metadata["start_byte"] = chunk["start_byte"]
+                metadata["end_byte"] = chunk["end_byte"]
+            if chunk_id in existing_ids:
+                if len(batch.update_ids) >= BULK_BATCH_SIZE:
+                    flush(batch.take())
+                batch.update(chunk_id, metadata)
+                continue
 
-        return len(ids)
+            tokens = estimate_tokens(chunk["text"])
+            if batch.would_overflow(tokens):
+                flush(batch.take())
+                batch.reuse_ids.extend(obsolete)
+            batch.add(chunk_id, chunk["text"], metadata, tokens)
+            embedded += 1
 
-    def sync(self) -> dict[str, int]:
-        """同步整個 vault"""
-        stats = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        batch.delete_ids.extend(obsolete)
+        batch.completed[rel_path] = meta
+        batch.changed_files.append(rel_path)
+        batch.links[rel_path] = links or []
+        return embedded
 
-        all_meta = self.meta_collection.get()
-        indexed_files = set(all_meta["ids"]) if all_meta["ids"] else set()
+    def _embed_batch(self, batch: _EmbedBatch) -> Embeddings:
+        """取得批次的 embeddings：先查快取，未命中的內容才發出一次 embedding 請求
+
+        請求受 RPM / TPM 限制，失敗時退避重試；同一批次中重複的內容只 embed 一次
+        """
+        with self.metrics.phase("embed"):
+            embedder = self._require_embedder()
+            vectors: list[Any] = (
+                list(self.embed_cache.get_many(embedder, batch.documents))
+                if self.embed_cache is not None
+                else [None] * len(batch.documents)
+            )
+            missing = list(dict.fromkeys(d for d, v in zip(batch.documents, vectors) if v is None))
+            # list.count(None) 會以 == 比較 ndarray，逐一以 is 判斷
+            self.metrics.add("embed_cache_hits", sum(v is not None for v in vectors))
+            if missing and batch.reuse_ids:
+                stored = self._stored_embeddings(batch.reuse_ids, set(missing))
+                for i, document in enumerate(batch.documents):
+                    if vectors[i] is None and document in stored:
+                        vectors[i] = stored[document]
+                        self.metrics.add("embeddings_reused")
+                missing = [d for d in missing if d not in stored]
+            if not missing:
+                return vectors
+
+            tokens = sum(estimate_tokens(d) for d in missing)
+
+            def embed() -> Embeddings:
+                with self.metrics.phase("rate_limit_wait"):
+                    self.rate_limiter.acquire(tokens)
+                started = time.monotonic()
+                result = embedder.embed(missing)
+                self.metrics.observe_embed(time.monotonic() - started)
+                return result
+
+            embedded = call_with_retry(
+                embed,
+                f"embedding ({len(missing)} chunks)",
+                on_retry=lambda: self.metrics.add("embed_retries"),
+            )
+            self.metrics.add("embed_requests")
+            self.metrics.add("chunks_embedded", len(missing))
+            self.metrics.add("tokens_sent", tokens)
+            if self.embed_cache is not None:
+                self.embed_cache.put_many(embedder, missing, embedded)
+            by_text = dict(zip(missing, embedded))
+            return [v if v is not None else by_text[d] for d, v in zip(batch.documents, vectors)]
 
-        current_files = set()
-        for md_file in self.vault_path.rglob("*.md"):
-            if any(part.startswith(".") for part in md_file.parts):
+    def _stored_embeddings(self, ids: list[str], texts: set[str]) -> dict[str, Any]:
+        """已存的 chunks（ids）中內容在 texts 之中的向量，回傳 {內容: 向量}"""
+        found: dict[str, Any] = {}
+        for batch in _batched(ids, BULK_BATCH_SIZE):
+            page = self.collection.get(ids=batch, include=["documents", "embeddings"])
+            embeddings = page["embeddings"]
+            if embeddings is None:
                 continue
+            for document, embedding in zip(page["documents"] or [], embeddings):
+                if document in texts:
+                    found[document] = embedding
+        return found
 
-            rel_path = str(md_file.relative_to(self.vault_path))
-            current_files.add(rel_path)
+    def _require_embedder(self) -> EmbeddingProvider:
+        if self.embedder is None:
+            raise RuntimeError("readonly 模式無法使用 embedding")
+        return self.embedder
 
-            stored_mtime = self._get_stored_mtime(rel_path)
-            is_new = stored_mtime is None
+    def _flush_batch(self, batch: _EmbedBatch) -> None:
+        """同步送出批次：embedding 後寫入"""
+        self._write_batch(batch, self._embed_batch(batch) if batch.ids else None)
 
-            chunks_indexed = self.index_file(md_file)
+    def _write_batch(self, batch: _EmbedBatch, embeddings: Embeddings | None) -> None:
+        """一次 upsert，之後才寫入已完成檔案的 meta（管線中只由 writer thread 呼叫）
 
-            if chunks_indexed > 0:
-                if is_new:
-                    stats["added"] += 1
-                    print(f"  + {rel_path} ({chunks_indexed} chunks)")
-                else:
-                    stats["updated"] += 1
-                    print(f"  * {rel_path} ({chunks_indexed} chunks)")
-            else:
-                stats["unchanged"] += 1
+        寫入前先記錄到 sync journal，全部完成後才移除，中斷時下次 sync 可以 roll forward
+        """
+        with self.metrics.phase("write"):
+            seq = self.journal.begin(
+                {
+                    "upsert_ids": batch.ids,
+                    "update_ids": batch.update_ids,
+                    "update_metadatas": batch.update_metadatas,
+                    "delete_ids": batch.delete_ids,
+                    "changed_files": batch.changed_files,
+                    "links": batch.links,
+                    "completed": batch.completed,
+                }
+            )
+            if batch.ids:
+                self.collection.upsert(
+                    ids=batch.ids,
+                    documents=batch.documents,
+                    metadatas=batch.metadatas,  # type: ignore[arg-type]
+                    embeddings=embeddings,
+                )
+                self.lexical.upsert(batch.ids, batch.documents)
+            if batch.update_ids:
+                self.collection.update(
+                    ids=batch.update_ids,
+                    metadatas=batch.update_metadatas,  # type: ignore[arg-type]
+                )
+            self._delete_ids(batch.delete_ids)
+            self._update_note_vectors(batch.changed_files)
+            self.links.update(batch.links)
+            self._update_file_meta(batch.completed)
+            self.journal.commit(seq)
+
+    def _update_note_vectors(self, rel_paths: list[str]) -> None:
+        """重新計算筆記向量：該筆記所有 chunks 向量的平均（不需呼叫 embedding API）
+
+        沒有 chunks 的筆記（空白或已刪除）會從 obsidian_notes 移除
+        """
+        for batch in _batched(rel_paths, NOTE_BATCH_SIZE):
+            page = self.collection.get(
+                where=_where_in("file_path", batch), include=["embeddings", "metadatas"]
+            )
+            vectors: dict[str, list[Any]] = {}
+            metadatas: dict[str, dict[str, Any]] = {}
+            embeddings = page.get("embeddings")
+            for i, metadata in enumerate(page["metadatas"] or []):
+                rel_path = str(metadata["file_path"])
+                vectors.setdefault(rel_path, []).append(embeddings[i])  # type: ignore[index]
+                metadatas[rel_path] = {
+                    "file_path": rel_path,
+                    "folder": metadata.get("folder", top_folder(rel_path)),
+                    "mtime_ts": metadata.get("mtime_ts", 0.0),
+                    "tags": metadata.get("tags") or None,
+                    "chunks": len(vectors[rel_path]),
+                }
+
+            if vectors:
+                ids = list(vectors)
+                means = []
+                for rel_path in ids:
+                    mean = np.mean(np.asarray(vectors[rel_path], dtype=np.float32), axis=0)
+                    means.append(mean / (np.linalg.norm(mean) or 1.0))
+                self.note_collection.upsert(
+                    ids=ids,
+                    embeddings=means,
+                    metadatas=[metadatas[p] for p in ids],
+                    documents=ids,
+                )
+            empty = [p for p in batch if p not in vectors]
+            if empty:
+                self.note_collection.delete(ids=empty)
+
+    def _ensure_note_index(self) -> None:
+        """舊 DB 沒有筆記向量時，從已索引的 chunks 建立（其他 process 正在寫入時略過）"""
+        if self.note_collection.count() or not self.collection.count():
+            return
+        if not self.lease.acquire(timeout=0):
+            return
+        try:
+            rel_paths = sorted(self._load_meta())
+            print(f"建立筆記向量（{len(rel_paths)} 篇）...", file=sys.stderr)
+            self._update_note_vectors(rel_paths)
+        finally:
+            self.lease.release()
+
+    def _ensure_link_index(self) -> None:
+        """連結索引與 obsidian_meta 的檔案數不一致時（舊 DB、中途中斷）重新讀取檔案建立
+
+        只在 sync 時檢查；搜尋時只讀取索引，不重新解析檔案
+        """
+        total = self.meta_collection.count()
+        if self.links.count() == total:
+            return
+
+        rel_paths = sorted(self._load_meta())
+        print(f"重建連結索引（{len(rel_paths)} 篇）...", file=sys.stderr)
+        self.links.clear()
+        for batch in _batched(rel_paths, BULK_BATCH_SIZE):
+            files: dict[str, list[str]] = {}
+            for rel_path in batch:
+                # 已刪除的檔案在本次 sync 稍後會從 meta 移除，這裡直接略過
+                md_file = self.vault_path / rel_path
+                data = self._read_file(md_file, rel_path) if md_file.is_file() else None
+                if data is not None:
+                    files[rel_path] = extract_links(data.decode("utf-8"))
+            self.links.update(files)
+
+    def index_file(self, file_path: Path) -> int:
+        """索引單一檔案，回傳 chunk 數量"""
+        with self.writer_lease():
+            rel_path = str(file_path.relative_to(self.vault_path))
+            current_mtime = self._get_file_mtime(file_path)
+            stored = self.meta_collection.get(ids=[rel_path])
+            if stored["metadatas"] and self._is_current(
+                dict(stored["metadatas"][0]), current_mtime
+            ):
+                return 0
+
+            data = self._read_file(file_path, rel_path)
+            if data is None:
+                return 0
+
+            existing_ids = self._get_files_chunk_ids([rel_path]).get(rel_path, set())
+
+            text = data.decode("utf-8")
+            chunks = split_chunks(text, self.chunk_strategy)
+            batch = _EmbedBatch()
+            self._queue_chunks(
+                batch,
+                rel_path,
+                chunks,
+                self._file_meta(current_mtime, data),
+                existing_ids,
+                links=extract_links(text),
+            )
+            self._flush_batch(batch.take())
+            return len(chunks)
+
+    def _prepare_file(
+        self,
+        md_file: Path,
+        rel_path: str,
+        mtime: str,
+        meta: dict[str, Any] | None,
+        known_hash: str | None = None,
+        manifest: dict[str, ManifestEntry] | None = None,
+    ) -> tuple[str, dict[str, Any], list[Chunk], list[str]] | None:
+        """讀取、比對 content hash 並切分單一檔案（在讀檔 worker 中執行）
 
-        deleted_files = indexed_files - current_files
+        known_hash 為 manifest 中的 content hash；與 meta 相同時不必讀檔。
+        manifest 中此檔案的 hash 尚未計算時，以這次讀到的內容補上。
+        回傳 (狀態, file meta, chunks, wikilinks)，狀態為 touched 或 changed；
+        無法讀取時回傳 None
+        """
+        if (
+            meta is not None
+            and known_hash
+            and meta.get("content_hash") == known_hash
+            and self._same_layout(meta)
+        ):
+            return "touched", {**meta, "mtime": mtime}, [], []
+
+        with self.metrics.phase("read"):
+            data = self._read_file(md_file, rel_path)
+        if data is None:
+            return None
+        self.metrics.add("files_read")
+        self.metrics.add("bytes_read", len(data))
+        entry = manifest.get(rel_path) if manifest is not None else None
+        if manifest is not None and entry is not None and not entry["hash"]:
+            # 每個 worker 只寫入自己的檔案
+            manifest[rel_path] = manifest_entry(entry["size"], entry["mtime_ns"], data)
+
+        # mtime 變了但內容沒變（LiveSync / mutagen / git checkout）只刷新 meta
+        if (
+            meta is not None
+            and meta.get("content_hash") == content_hash(data)
+            and meta.get("size") == len(data)
+            and self._same_layout(meta)
+        ):
+            return "touched", {**meta, "mtime": mtime}, [], []
+
+        with self.metrics.phase("chunk"):
+            text = data.decode("utf-8")
+            chunks = split_chunks(text, self.chunk_strategy)
+            result = "changed", self._file_meta(mtime, data), chunks, extract_links(text)
+        self.metrics.add("chunks", len(chunks))
+        return result
+
+    def sync(
+        self,
+        workers: int = SYNC_READ_WORKERS,
+        embed_concurrency: int = SYNC_EMBED_CONCURRENCY,
+    ) -> dict[str, int]:
+        """同步整個 vault
+
+        先分頁載入 obsidian_meta，在記憶體中比對出新增 / 更新 / 刪除，
+        再以批次呼叫處理刪除與 meta 更新；沒有變更時不會逐檔查詢 DB。
+        mtime 改變但 content hash 相同的檔案只更新 meta（計入 touched），不重新 embed。
+        vault 以 scan_manifest 掃描：大小與 mtime 沒變的檔案沿用 manifest 中的 content hash，
+        不必讀檔即可判斷內容是否有變；其餘檔案只 stat，在讀檔 worker 中讀取時才計算 hash
+        並補進 manifest，每個檔案只讀一次。
+
+        變更檔案以管線處理：讀檔 + chunk 在 worker pool 中進行，chunks 跨檔案合併成
+        批次後併發 embedding（受 RPM / TPM 限制），再由單一 writer 依序寫入 Chroma。
+        開始前先 roll forward 上次中斷時未完成的寫入批次（見 _recover_journal）。
+        需要 writer lease，其他 process 正在寫入時拋出 SyncInProgressError。
+        """
+        with self.writer_lease():
+            self.metrics = SyncMetrics()
+            stats = _new_stats()
+            with self.metrics.phase("recover"):
+                self._recover_journal()
+
+            with self.metrics.phase("load_meta"):
+                stored_meta = self._load_meta()
+
+            candidates: list[tuple[Path, str, str]] = []
+            known_hashes: dict[str, str] = {}
+            with self.metrics.phase("scan"):
+                scan = scan_manifest(self.vault_path, self.manifest_path, read=False)
+                for rel_path, entry in scan["files"].items():
+                    current_mtime = mtime_iso(entry["mtime_ns"])
+                    meta = stored_meta.get(rel_path)
+                    if meta is not None and self._is_current(meta, current_mtime):
+                        stats["unchanged"] += 1
+                        continue
+
+                    candidates.append((self.vault_path / rel_path, rel_path, current_mtime))
+                    known_hashes[rel_path] = entry["hash"]
+            self.metrics.add("files_scanned", len(scan["files"]))
+
+            deleted_files = sorted(stored_meta.keys() - scan["files"].keys())
+            folder_delta: dict[str, dict[str, int]] = {}
+            self._sync_files(
+                candidates,
+                deleted_files,
+                stored_meta,
+                stats,
+                workers,
+                embed_concurrency,
+                known_hashes=known_hashes,
+                manifest=scan["files"],
+                folder_delta=folder_delta,
+            )
+            self._save_manifest(scan)
+            self._finish_sync(stats, folder_delta)
+            return stats
+
+    def _save_manifest(self, scan: ManifestScan) -> None:
+        """寫回 sync 讀檔時補上 hash 的 manifest；沒讀到的 pending 檔案留給下次掃描"""
+        pending = [rel_path for rel_path in scan["pending"] if not scan["files"][rel_path]["hash"]]
+        self.metrics.add("files_hashed", len(scan["pending"]) - len(pending))
+        if not scan["pending"] or len(pending) == len(scan["pending"]):
+            return
+        skip = set(pending)
+        try:
+            save_manifest(
+                self.manifest_path, {k: v for k, v in scan["files"].items() if k not in skip}
+            )
+        except OSError:
+            pass  # manifest 只是快取，寫入失敗時下次重新讀取
+
+    def sync_paths(
+        self,
+        rel_paths: Iterable[str],
+        workers: int = SYNC_READ_WORKERS,
+        embed_concurrency: int = SYNC_EMBED_CONCURRENCY,
+    ) -> dict[str, int]:
+        """只同步指定的路徑（watch 模式用）
+
+        路徑可以是檔案或資料夾；不存在的檔案視為刪除，不存在的資料夾會刪除其下
+        所有已索引的檔案（資料夾搬移時只會收到資料夾本身的事件）。
+        """
+        with self.writer_lease():
+            self.metrics = SyncMetrics()
+            stats = _new_stats()
+            with self.metrics.phase("recover"):
+                self._recover_journal()
+
+            paths: set[str] = set()
+            removed_dirs: list[str] = []
+            for rel_path in rel_paths:
+                full_path = self.vault_path / rel_path
+                if full_path.is_dir():
+                    paths.update(rel for rel, _ in walk_markdown(full_path, base=self.vault_path))
+                elif rel_path.endswith(".md"):
+                    paths.add(rel_path)
+                elif not full_path.exists():
+                    removed_dirs.append(rel_path.rstrip("/") + "/")
+            paths = {p for p in paths if not is_hidden(p)}
+
+            stored_meta = self._get_meta(sorted(paths))
+            if removed_dirs:
+                for rel_path, removed_meta in self._load_meta().items():
+                    if rel_path.startswith(tuple(removed_dirs)):
+                        stored_meta[rel_path] = removed_meta
+                        paths.add(rel_path)
+
+            candidates: list[tuple[Path, str, str]] = []
+            deleted_files: list[str] = []
+            for rel_path in sorted(paths):
+                md_file = self.vault_path / rel_path
+                if not md_file.is_file():
+                    if rel_path in stored_meta:
+                        deleted_files.append(rel_path)
+                    continue
+
+                current_mtime = self._get_file_mtime(md_file)
+                # 沒有 meta 的檔案（新檔案，或 meta 列缺少 metadata）視為需要重新索引
+                stored = stored_meta.get(rel_path)
+                if stored is not None and self._is_current(stored, current_mtime):
+                    stats["unchanged"] += 1
+                    continue
+
+                candidates.append((md_file, rel_path, current_mtime))
+
+            folder_delta: dict[str, dict[str, int]] = {}
+            self._sync_files(
+                candidates,
+                deleted_files,
+                stored_meta,
+                stats,
+                workers,
+                embed_concurrency,
+                folder_delta=folder_delta,
+            )
+            self._finish_sync(stats, folder_delta)
+            return stats
+
+    def _delete_files_meta(self, rel_paths: list[str]) -> None:
+        """移除已刪除檔案的 meta、筆記向量與連結（其 chunks 需另外刪除）"""
+        for batch_ids in _batched(rel_paths, BULK_BATCH_SIZE):
+            self.meta_collection.delete(ids=batch_ids)
+            self.note_collection.delete(ids=batch_ids)
+        self.links.delete(rel_paths)
+
+    def _recover_journal(self) -> None:
+        """roll forward 上次 sync 中斷時未完成的寫入批次（不需重新 embed）
+
+        chunks 已全部 upsert 的批次補完其餘寫入（關鍵字索引、metadata、刪除舊 chunks、
+        筆記向量、連結、meta）；upsert 未完成的批次只補上已寫入 chunks 的關鍵字索引，
+        其檔案的 meta 沒有更新，接下來的掃描會重新處理（已寫入的 chunks 只更新 metadata）
+        """
+        pending = self.journal.pending()
+        if not pending:
+            return
+        print(f"恢復上次中斷的 sync（{len(pending)} 個未完成的批次）...", file=sys.stderr)
+        for seq, entry in pending:
+            if "deleted_files" in entry:
+                self._delete_ids(entry["delete_ids"])
+                # 中斷後又出現的檔案交給這次 sync 處理
+                self._delete_files_meta(
+                    [p for p in entry["deleted_files"] if not (self.vault_path / p).is_file()]
+                )
+            elif self._restore_lexical(entry["upsert_ids"]) == len(entry["upsert_ids"]):
+                if entry["update_ids"]:
+                    self.collection.update(
+                        ids=entry["update_ids"],
+                        metadatas=entry["update_metadatas"],
+                    )
+                self._delete_ids(entry["delete_ids"])
+                self._update_note_vectors(entry["changed_files"])
+                self.links.update(entry["links"])
+                self._update_file_meta(entry["completed"])
+            self.journal.commit(seq)
+            self.metrics.add("journal_recovered")
+
+    def _restore_lexical(self, ids: list[str]) -> int:
+        """將已寫入 Chroma 的 chunks 補進關鍵字索引，回傳已寫入的數量"""
+        present = 0
+        for batch in _batched(ids, BULK_BATCH_SIZE):
+            page = self.collection.get(ids=batch, include=["documents"])
+            self.lexical.upsert(page["ids"], [d or "" for d in page["documents"] or []])
+            present += len(page["ids"])
+        return present
+
+    def _finish_sync(
+        self, stats: dict[str, int], folder_delta: dict[str, dict[str, int]] | None = None
+    ) -> None:
+        """sync 結束：寫入統計快照，metrics_path 有設定時附加本次指標"""
+        with self.metrics.phase("snapshot"):
+            self._write_stats_snapshot(stats, self.metrics.elapsed(), folder_delta)
+        if self.metrics_path is None:
+            return
+        record = {
+            "vault": str(self.vault_path),
+            "embedding": self.embedder.describe() if self.embedder else "-",
+            "stats": stats,
+            "metrics": self.metrics.to_dict(),
+        }
+        try:
+            append_metrics(self.metrics_path, record)
+        except OSError as e:
+            print(f"無法寫入 sync 指標: {e}", file=sys.stderr)
+
+    def _sync_files(
+        self,
+        candidates: list[tuple[Path, str, str]],
+        deleted_files: list[str],
+        stored_meta: dict[str, dict[str, Any]],
+        stats: dict[str, int],
+        workers: int,
+        embed_concurrency: int,
+        known_hashes: dict[str, str] | None = None,
+        manifest: dict[str, ManifestEntry] | None = None,
+        folder_delta: dict[str, dict[str, int]] | None = None,
+    ) -> dict[str, int]:
+        """處理可能有變更的檔案與已刪除的檔案
+
+        known_hashes 為 manifest 中的 content hash；manifest 中尚未計算 hash 的項目
+        在讀檔時補上（見 _prepare_file）。folder_delta 累加各資料夾檔案數與 chunk 數的
+        變化，用來更新統計快照（見 _write_stats_snapshot）
+        """
+        known_hashes = known_hashes or {}
+        folder_delta = folder_delta if folder_delta is not None else {}
+        with self.metrics.phase("ensure_indexes"):
+            if self.embedder:
+                # 開啟時未取得 lease 而略過的 embedding metadata 更新在此補上
+                self._check_embedding_provider(self.embedder)
+            self._ensure_lexical_index()
+            self._ensure_note_index()
+            self._ensure_link_index()
+
+        # 已刪除檔案與可能有變的檔案，既有 chunk IDs 一次批次載入；
+        # 已刪除檔案的 chunks 直接刪除，有變的檔案稍後逐 chunk 比對
+        stale_files = [rel_path for _, rel_path, _ in candidates if rel_path in stored_meta]
+        with self.metrics.phase("load_chunk_ids"):
+            existing_ids = self._get_files_chunk_ids(deleted_files + stale_files)
+        deleted_seq: int | None = None
+        with self.metrics.phase("write"):
+            deleted_ids = [i for p in deleted_files for i in sorted(existing_ids.get(p, ()))]
+            if deleted_files:
+                deleted_seq = self.journal.begin(
+                    {"deleted_files": deleted_files, "delete_ids": deleted_ids}
+                )
+            self._delete_ids(deleted_ids)
+
+        def prepare(candidate: tuple[Path, str, str]) -> Any:
+            md_file, rel_path, current_mtime = candidate
+            return self._prepare_file(
+                md_file,
+                rel_path,
+                current_mtime,
+                stored_meta.get(rel_path),
+                known_hash=known_hashes.get(rel_path),
+                manifest=manifest,
+            )
+
+        pipeline: SyncPipeline[_EmbedBatch, Embeddings] = SyncPipeline(
+            self._embed_batch,
+            self._write_batch,
+            concurrency=embed_concurrency,
+            has_work=_EmbedBatch.has_embeddings,
+        )
+        batch = _EmbedBatch()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="read") as pool:
+                prepared = bounded_map(pool, prepare, candidates, window=workers * 4)
+                for (_, rel_path, _), result in zip(candidates, prepared):
+                    if result is None:
+                        continue
+                    status, file_meta, chunks, links = result
+
+                    if status == "touched":
+                        batch.completed[rel_path] = file_meta
+                        stats["touched"] += 1
+                        continue
+
+                    # 空白筆記也記錄 meta，避免每次 sync 重新讀取
+                    embedded = self._queue_chunks(
+                        batch,
+                        rel_path,
+                        chunks,
+                        file_meta,
+                        existing_ids.get(rel_path),
+                        flush=pipeline.submit,
+                        links=links,
+                    )
+
+                    _add_folder_delta(
+                        folder_delta,
+                        rel_path,
+                        0 if rel_path in stored_meta else 1,
+                        len(chunks) - len(existing_ids.get(rel_path, ())),
+                    )
+                    if not chunks:
+                        stats["unchanged"] += 1
+                    elif rel_path not in stored_meta:
+                        stats["added"] += 1
+                        print(f"  + {rel_path} ({len(chunks)} chunks)")
+                    else:
+                        stats["updated"] += 1
+                        print(f"  * {rel_path} ({len(chunks)} chunks, {embedded} embedded)")
+
+            pipeline.submit(batch.take())
+        finally:
+            pipeline.close()
+
+        with self.metrics.phase("write"):
+            self._delete_files_meta(deleted_files)
+            if deleted_seq is not None:
+                self.journal.commit(deleted_seq)
         for rel_path in deleted_files:
-            deleted_chunks = self._delete_file_chunks(rel_path)
-            self.meta_collection.delete(ids=[rel_path])
+            _add_folder_delta(folder_delta, rel_path, -1, -len(existing_ids.get(rel_path, ())))
             stats["deleted"] += 1
-            print(f"  - {rel_path} ({deleted_chunks} chunks)")
+            print(f"  - {rel_path} ({len(existing_ids.get(rel_path, ()))} chunks)")
 
         return stats
 
-    def search(self, query: str, top_k: int = 5) -> list[dict[str, Any]]:
-        """語意搜尋"""
+    def watch(
+        self,
+        debounce: float = WATCH_DEBOUNCE,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        force_polling: bool = False,
+        workers: int = SYNC_READ_WORKERS,
+        embed_concurrency: int = SYNC_EMBED_CONCURRENCY,
+    ) -> None:
+        """監看 vault，檔案儲存後幾秒內重新索引受影響的檔案（不會返回）"""
+        # 只在每批同步時持有 writer lease（其他 writer 執行中則等候），
+        # 批次之間釋放，讓手動的 sync / compact / tune / migrate 可以執行
+        with self.writer_lease(wait=None):
+            # 啟動時先完整同步一次，補上服務停止期間的變更
+            stats = self.sync(workers, embed_concurrency)
+        print(f"初始同步完成: {stats}", file=sys.stderr)
+
+        for changed in watch_vault_changes(self.vault_path, debounce, poll_interval, force_polling):
+            try:
+                with self.writer_lease(wait=None):
+                    stats = self.sync_paths(changed, workers, embed_concurrency)
+            except Exception as e:
+                # 失敗的檔案沒有寫入 meta，下次變更或重啟時的完整同步會補上
+                print(f"同步失敗: {e}", file=sys.stderr)
+                continue
+            if any(stats[k] for k in ("added", "updated", "deleted", "touched")):
+                print(
+                    f"[{datetime.now().isoformat(timespec='seconds')}] "
+                    f"+{stats['added']} *{stats['updated']} -{stats['deleted']} "
+                    f"~{stats['touched']}",
+                    file=sys.stderr,
+                )
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        mode: str = DEFAULT_SEARCH_MODE,
+        folder: str | None = None,
+        tag: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        expand: int = 0,
+        mmr: float | None = None,
+        mmr_candidates: int = MMR_CANDIDATES,
+        notes: int = 0,
+        links: int = 0,
+    ) -> list[dict[str, Any]]:
+        """搜尋：vector 為語意搜尋；hybrid 另外以 BM25 關鍵字搜尋，兩者以 RRF 合併
+
+        folder / tag / since / until 轉成 Chroma where 條件，在索引內過濾；
+        notes > 0 時先以筆記向量找出前 notes 篇筆記，只在這些筆記的 chunks 中排序；
+        mmr 為 MMR 的 lambda，設定時先取 mmr_candidates 個候選再依多樣性重排；
+        links > 0 時另外附上結果筆記的一步連結筆記（見 _linked_results）；
+        expand > 0 時將結果擴展成段落（見 _expand_results），expand 為每段的 token 上限
+        """
+        return self.search_many(
+            [query],
+            top_k,
+            mode=mode,
+            folder=folder,
+            tag=tag,
+            since=since,
+            until=until,
+            expand=expand,
+            mmr=mmr,
+            mmr_candidates=mmr_candidates,
+            notes=notes,
+            links=links,
+        )[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        top_k: int = 5,
+        mode: str = DEFAULT_SEARCH_MODE,
+        folder: str | None = None,
+        tag: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        expand: int = 0,
+        mmr: float | None = None,
+        mmr_candidates: int = MMR_CANDIDATES,
+        notes: int = 0,
+        links: int = 0,
+    ) -> list[list[dict[str, Any]]]:
+        """批次搜尋多個查詢，依序回傳每個查詢的結果（選項同 search）
+
+        所有查詢的向量以一次 embedding 請求取得（快取命中的不重算），
+        再以一次多查詢的 Chroma query 取回候選；notes > 0 時每個查詢的筆記範圍不同，
+        chunks 改為逐一查詢。
+        搜尋不取得 writer lease：其他 process 在 compact / migrate / tune 替換 collection 後，
+        舊的 handle 會找不到 collection，此時以名稱重新取得後重試一次
+        """
+        from chromadb.errors import NotFoundError
+
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"未知的搜尋模式: {mode}")
+        if not queries:
+            return []
+        query_embeddings = self._embed_queries(queries)
+        options: dict[str, Any] = {
+            "mode": mode,
+            "filters": build_where(folder, tag, since, until),
+            "expand": expand,
+            "mmr": mmr,
+            "mmr_candidates": mmr_candidates,
+            "notes": notes,
+            "links": links,
+        }
+        try:
+            return self._search_embeddings(queries, query_embeddings, top_k, **options)
+        except NotFoundError:
+            self._refresh_collections()
+            return self._search_embeddings(queries, query_embeddings, top_k, **options)
+
+    def _search_embeddings(
+        self,
+        queries: list[str],
+        query_embeddings: Embeddings,
+        top_k: int,
+        mode: str,
+        filters: dict[str, Any] | None,
+        expand: int,
+        mmr: float | None,
+        mmr_candidates: int,
+        notes: int,
+        links: int,
+    ) -> list[list[dict[str, Any]]]:
+        """以算好的查詢向量執行 search_many（選項同 search，filters 為 build_where 的結果）"""
+        pool = max(top_k, mmr_candidates) if mmr is not None else top_k
+        n_results = pool if mode == "vector" else max(pool * 4, HYBRID_CANDIDATES)
+
+        wheres: list[dict[str, Any] | None] = [filters] * len(queries)
+        # None 表示該查詢在筆記階段就沒有結果
+        hits: list[dict[str, dict[str, Any]] | None] = []
+        if notes > 0:
+            for i, embedding in enumerate(query_embeddings):
+                note_paths = [
+                    n["file_path"] for n in self._query_notes([embedding], notes, filters)
+                ]
+                if not note_paths:
+                    hits.append(None)
+                    continue
+                restrict = _where_in("file_path", note_paths)
+                wheres[i] = {"$and": [filters, restrict]} if filters else restrict
+                hits.extend(self._query_chunks([embedding], n_results, wheres[i]))
+        else:
+            hits.extend(self._query_chunks(query_embeddings, n_results, filters))
+
+        outputs: list[list[dict[str, Any]]] = []
+        for i, query in enumerate(queries):
+            query_hits = hits[i]
+            if query_hits is None:
+                outputs.append([])
+                continue
+            # 單一查詢的向量（_fuse_lexical / _linked_results 以 query_embeddings 格式接收）
+            single: Embeddings = [query_embeddings[i]]
+            if mode == "vector":
+                output = list(query_hits.values())
+            else:
+                output = self._fuse_lexical(query, single, query_hits, wheres[i], n_results, pool)
+            if mmr is not None and len(output) > top_k:
+                output = self._mmr_rerank(output, top_k, mmr)
+            output = output[:top_k]
+            if links > 0:
+                output += self._linked_results(single, output, links, filters)
+            outputs.append(self._expand_results(output, expand) if expand > 0 else output)
+        return outputs
+
+    def _query_chunks(
+        self, query_embeddings: Embeddings, n_results: int, where: dict[str, Any] | None
+    ) -> list[dict[str, dict[str, Any]]]:
+        """一次 Chroma query 取回每個查詢向量的候選，回傳 [{chunk_id: result}]"""
         results = self.collection.query(
-            query_texts=[query],
-            n_results=top_k,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
             include=["documents", "metadatas", "distances"],
         )
+        metadatas = results.get("metadatas") or []
+        documents = results.get("documents") or []
+        distances = results.get("distances") or []
+        hits: list[dict[str, dict[str, Any]]] = []
+        for q, ids in enumerate(results["ids"]):
+            hits.append(
+                {
+                    chunk_id: self._format_result(
+                        chunk_id, metadatas[q][i], documents[q][i], distances[q][i]
+                    )
+                    for i, chunk_id in enumerate(ids)
+                }
+            )
+        return hits
 
-        output: list[dict[str, Any]] = []
+    def search_notes(
+        self,
+        query: str,
+        top_k: int = NOTE_CANDIDATES,
+        folder: str | None = None,
+        tag: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """筆記層級搜尋：回傳最相關的筆記（file_path、distance、tags 等），不含 chunk 內容"""
+        where = build_where(folder, tag, since, until)
+        return self._query_notes(self._embed_query(query), top_k, where)
+
+    def _query_notes(
+        self, query_embeddings: Embeddings, top_k: int, where: dict[str, Any] | None
+    ) -> list[dict[str, Any]]:
+        self._ensure_note_index()
+        results = self.note_collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where,
+            include=["metadatas", "distances"],
+        )
         metadatas = results.get("metadatas") or [[]]
-        documents = results.get("documents") or [[]]
         distances = results.get("distances") or [[]]
+        notes: list[dict[str, Any]] = []
+        for i, rel_path in enumerate(results["ids"][0]):
+            metadata = metadatas[0][i]
+            note: dict[str, Any] = {
+                "file_path": rel_path,
+                "distance": distances[0][i],
+                "chunks": metadata.get("chunks", 0),
+            }
+            if metadata.get("tags"):
+                note["tags"] = metadata["tags"]
+            notes.append(note)
+        return notes
 
-        for i in range(len(results["ids"][0])):
-            output.append(
-                {
-                    "file_path": metadatas[0][i]["file_path"],
-                    "chunk": documents[0][i],
-                    "distance": distances[0][i],
-                }
+    def _mmr_rerank(
+        self, candidates: list[dict[str, Any]], top_k: int, lambda_: float
+    ) -> list[dict[str, Any]]:
+        """以 MMR 從候選中挑出 top_k 個（向量由 Chroma 讀取，不需呼叫 embedding API）"""
+        page = self.collection.get(ids=[c["id"] for c in candidates], include=["embeddings"])
+        embeddings = page.get("embeddings")
+        if embeddings is None:
+            return candidates
+        by_id = dict(zip(page["ids"], embeddings))
+        candidates = [c for c in candidates if c["id"] in by_id]
+        vectors = np.asarray([by_id[c["id"]] for c in candidates], dtype=np.float32)
+        # hybrid 以 RRF 分數（正規化到 0-1）為相關性，vector 以 cosine similarity
+        if all("score" in c for c in candidates):
+            top_score = max(c["score"] for c in candidates) or 1.0
+            relevance = np.asarray([c["score"] / top_score for c in candidates])
+        else:
+            relevance = np.asarray([1.0 - c["distance"] for c in candidates])
+        return [candidates[i] for i in mmr_select(relevance, vectors, top_k, lambda_)]
+
+    def _fuse_lexical(
+        self,
+        query: str,
+        query_embeddings: Embeddings,
+        hits: dict[str, dict[str, Any]],
+        where: dict[str, Any] | None,
+        n_results: int,
+        top_k: int,
+    ) -> list[dict[str, Any]]:
+        """取 BM25 候選，與向量結果（hits）以 RRF 合併成前 top_k 名"""
+        self._ensure_lexical_index(full_check=False)
+        lexical_ids = [chunk_id for chunk_id, _ in self.lexical.search(query, n_results)]
+        if where and lexical_ids:
+            # 關鍵字索引沒有 metadata，候選交給 Chroma 依相同條件過濾
+            allowed = set(self.collection.get(ids=lexical_ids, where=where, include=[])["ids"])
+            lexical_ids = [chunk_id for chunk_id in lexical_ids if chunk_id in allowed]
+        scores = reciprocal_rank_fusion(hits, lexical_ids)
+        ranked = sorted(scores, key=lambda chunk_id: -scores[chunk_id])[:top_k]
+
+        # 只由 BM25 找到的 chunks：補取內容，並以向量計算 distance 讓結果可以比較
+        missing = [chunk_id for chunk_id in ranked if chunk_id not in hits]
+        if missing:
+            extra = self.collection.get(
+                ids=missing, include=["documents", "metadatas", "embeddings"]
             )
+            query_vector = np.asarray(query_embeddings[0], dtype=np.float32)
+            for i, chunk_id in enumerate(extra["ids"]):
+                vector = np.asarray(extra["embeddings"][i], dtype=np.float32)  # type: ignore[index]
+                similarity = float(query_vector @ vector) / (
+                    float(np.linalg.norm(query_vector) * np.linalg.norm(vector)) or 1.0
+                )
+                hits[chunk_id] = self._format_result(
+                    chunk_id,
+                    extra["metadatas"][i],  # type: ignore[index]
+                    extra["documents"][i],  # type: ignore[index]
+                    1.0 - similarity,
+                )
 
+        output: list[dict[str, Any]] = []
+        for chunk_id in ranked:
+            # 關鍵字索引可能比 collection 稍舊，已刪除的 chunk 直接略過
+            if chunk_id in hits:
+                output.append({**hits[chunk_id], "score": scores[chunk_id]})
         return output
 
+    def _linked_results(
+        self,
+        query_embeddings: Embeddings,
+        results: list[dict[str, Any]],
+        limit: int,
+        where: dict[str, Any] | None,
+    ) -> list[dict[str, Any]]:
+        """結果筆記的一步連結筆記（正向連結 + 反向連結），依連結權重排序
+
+        連結來自 sync 時建立的連結索引；每篇連結筆記只附上與查詢最接近的一個 chunk，
+        結果帶有 linked_from（從哪些結果筆記連過來）與 link_weight
+        """
+        hit_files = list(dict.fromkeys(r["file_path"] for r in results))
+        neighbors = self.links.neighbors(hit_files, limit)
+        if not neighbors:
+            return []
+
+        paths = [path for path, _, _ in neighbors]
+        notes = self.note_collection.get(ids=paths, include=["metadatas"])
+        chunk_counts = [m.get("chunks", 1) for m in notes["metadatas"] or []]
+        n_chunks = sum(c for c in chunk_counts if isinstance(c, int))
+        if not n_chunks:
+            return []
+        restrict = _where_in("file_path", paths)
+        found = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=min(n_chunks, LINK_MAX_CHUNKS),
+            where={"$and": [where, restrict]} if where else restrict,
+            include=["documents", "metadatas", "distances"],
+        )
+
+        best: dict[str, dict[str, Any]] = {}
+        metadatas = found.get("metadatas") or [[]]
+        documents = found.get("documents") or [[]]
+        distances = found.get("distances") or [[]]
+        # 結果依距離排序，每篇筆記第一個出現的就是最接近的 chunk
+        for i, chunk_id in enumerate(found["ids"][0]):
+            file_path = str(metadatas[0][i]["file_path"])
+            if file_path not in best:
+                best[file_path] = self._format_result(
+                    chunk_id, metadatas[0][i], documents[0][i], distances[0][i]
+                )
+        return [
+            {**best[path], "linked_from": via, "link_weight": weight}
+            for path, weight, via in neighbors
+            if path in best
+        ]
+
+    def _expand_results(
+        self, results: list[dict[str, Any]], max_tokens: int
+    ) -> list[dict[str, Any]]:
+        """將同一檔案的結果合併成連續段落，並在 token 預算內補上前後相鄰的 chunks
+
+        相鄰 chunks 以 chunk_index 一次批次 get 取回；段落依其中最前面的結果排序，
+        合併後的結果數會少於原本的 top_k，但每個段落的上下文較完整
+        """
+        by_file: dict[str, list[dict[str, Any]]] = {}
+        for result in results:
+            if "chunk_index" in result:
+                by_file.setdefault(result["file_path"], []).append(result)
+
+        conditions: list[dict[str, Any]] = []
+        for file_path, hits in by_file.items():
+            hit_indices = {r["chunk_index"] for r in hits}
+            nearby = {
+                i + offset
+                for i in hit_indices
+                for offset in range(-EXPAND_RADIUS, EXPAND_RADIUS + 1)
+                if i + offset >= 0
+            }
+            if nearby - hit_indices:
+                conditions.append(
+                    {
+                        "$and": [
+                            {"file_path": file_path},
+                            {"chunk_index": {"$in": sorted(nearby - hit_indices)}},
+                        ]
+                    }
+                )
+
+        neighbors: dict[tuple[str, int], tuple[str, dict[str, Any]]] = {}
+        if conditions:
+            page = self.collection.get(
+                where=conditions[0] if len(conditions) == 1 else {"$or": conditions},
+                include=["documents", "metadatas"],
+            )
+            for document, metadata in zip(page["documents"] or [], page["metadatas"] or []):
+                key = (str(metadata["file_path"]), int(metadata["chunk_index"]))  # type: ignore[arg-type]
+                neighbors[key] = (document, dict(metadata))
+
+        passages: list[tuple[int, dict[str, Any]]] = []
+        order = {id(r): rank for rank, r in enumerate(results)}
+        for file_path, hits in by_file.items():
+            selected: dict[int, tuple[str, dict[str, Any]]] = {
+                r["chunk_index"]: (r["chunk"], r) for r in hits
+            }
+            tokens = sum(estimate_tokens(r["chunk"]) for r in hits)
+            # 由近到遠補上相鄰 chunks，只接受與已選 chunks 相連的，避免產生孤立片段
+            candidates = sorted(
+                (min(abs(i - h) for h in selected), i)
+                for (path, i) in neighbors
+                if path == file_path
+            )
+            for _, i in candidates:
+                document, metadata = neighbors[(file_path, i)]
+                cost = estimate_tokens(document)
+                if tokens + cost > max_tokens or not ({i - 1, i + 1} & selected.keys()):
+                    continue
+                selected[i] = (document, metadata)
+                tokens += cost
+
+            run: list[int] = []
+            for i in sorted(selected):
+                if run and i != run[-1] + 1:
+                    passages.append(self._merge_passage(run, selected, hits, order))
+                    run = []
+                run.append(i)
+            if run:
+                passages.append(self._merge_passage(run, selected, hits, order))
+
+        passages.extend((order[id(r)], r) for r in results if "chunk_index" not in r)
+        return [passage for _, passage in sorted(passages, key=lambda p: p[0])]
+
+    def _merge_passage(
+        self,
+        run: list[int],
+        selected: dict[int, tuple[str, dict[str, Any]]],
+        hits: list[dict[str, Any]],
+        order: dict[int, int],
+    ) -> tuple[int, dict[str, Any]]:
+        """將連續的 chunk_index 合併成一個段落，回傳 (排序位置, 段落)"""
+        run_hits = [r for r in hits if r["chunk_index"] in run]
+        lead = min(run_hits, key=lambda r: order[id(r)])
+        passage: dict[str, Any] = {
+            **lead,
+            "chunk": "\n\n".join(selected[i][0] for i in run),
+            "distance": min(r["distance"] for r in run_hits),
+            "chunk_indices": run,
+        }
+        passage.pop("chunk_index", None)
+        first, last = selected[run[0]][1], selected[run[-1]][1]
+        if "start_byte" in first and "end_byte" in last:
+            passage["start_byte"] = first["start_byte"]
+            passage["end_byte"] = last["end_byte"]
+        return order[id(lead)], passage
+
+    def _embed_query(self, query: str) -> Embeddings:
+        return self._embed_queries([query])
+
+    def _embed_queries(self, queries: list[str]) -> Embeddings:
+        """查詢向量：先查查詢快取，未命中的查詢（去除重複）合併成一次 embedding 請求"""
+        embedder = self._require_embedder()
+        vectors: list[Any] = (
+            [self.query_cache.get(embedder, q) for q in queries]
+            if self.query_cache is not None
+            else [None] * len(queries)
+        )
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        by_query: dict[str, Any] = {}
+        for batch in _batched(missing, EMBED_BATCH_MAX_ITEMS):
+            embedded = embedder.embed(batch)
+            by_query.update(zip(batch, embedded))
+            if self.query_cache is not None:
+                for q, vector in zip(batch, embedded):
+                    self.query_cache.put(embedder, q, vector)
+        return [v if v is not None else by_query[q] for q, v in zip(queries, vectors)]
+
+    def _format_result(
+        self, chunk_id: str, metadata: Any, document: Any, distance: float
+    ) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "id": chunk_id,
+            "file_path": metadata["file_path"],
+            "chunk": document,
+            "distance": distance,
+        }
+        if "chunk_index" in metadata:
+            result["chunk_index"] = metadata["chunk_index"]
+        # markdown chunker 會記錄標題路徑與原檔位置，可直接回到原文
+        if metadata.get("heading_path"):
+            result["heading_path"] = metadata["heading_path"]
+        if "start_byte" in metadata:
+            result["start_byte"] = metadata["start_byte"]
+            result["end_byte"] = metadata["end_byte"]
+        return result
+
     def stats(self) -> dict[str, Any]:
-        """取得統計資訊"""
+        """取得統計資訊（即時從 Chroma 計算）"""
+        return {**self._index_stats(), **query_cache_stats(self.query_cache)}
+
+    def _index_stats(self) -> dict[str, Any]:
+        embedding = self._collection_embedding() or {}
         return {
             "total_chunks": self.collection.count(),
             "total_files": self.meta_collection.count(),
+            "total_notes": self.note_collection.count(),
             "db_path": str(self.db_path),
-            "embedding": "text-embedding-3-small",
+            "embedding": embedding.get("embedding_model") or "-",
+            "embedding_provider": embedding.get("embedding_provider") or "-",
+            "embedding_dimension": embedding.get("embedding_dimension") or 0,
+        }
+
+    def _folder_stats(self) -> dict[str, dict[str, int]]:
+        """各頂層資料夾的檔案數與 chunk 數（chunk 數取自筆記向量的 metadata，不讀取 chunks）"""
+        folders: dict[str, dict[str, int]] = {}
+        offset = 0
+        while True:
+            page = self.meta_collection.get(limit=META_PAGE_SIZE, offset=offset, include=[])
+            for rel_path in page["ids"]:
+                folder = folders.setdefault(top_folder(rel_path), {"files": 0, "chunks": 0})
+                folder["files"] += 1
+            if len(page["ids"]) < META_PAGE_SIZE:
+                break
+            offset += len(page["ids"])
+        offset = 0
+        while True:
+            page = self.note_collection.get(
+                limit=META_PAGE_SIZE, offset=offset, include=["metadatas"]
+            )
+            for rel_path, metadata in zip(page["ids"], page["metadatas"] or []):
+                folder = folders.setdefault(top_folder(rel_path), {"files": 0, "chunks": 0})
+                folder["chunks"] += int(metadata.get("chunks", 0))  # type: ignore[arg-type]
+            if len(page["ids"]) < META_PAGE_SIZE:
+                break
+            offset += len(page["ids"])
+        return dict(sorted(folders.items()))
+
+    def _updated_folder_stats(
+        self, index: dict[str, Any], folder_delta: dict[str, dict[str, int]] | None
+    ) -> dict[str, dict[str, int]]:
+        """以本次 sync 的變化更新上一份快照的資料夾統計
+
+        合計與目前的檔案數、chunk 數不符時（沒有快照、sync 曾中斷）才以 _folder_stats 重算
+        """
+        previous = read_snapshot(self.db_path / STATS_SNAPSHOT_FILE) or {}
+        folders = previous.get("folders")
+        if folder_delta is None or not isinstance(folders, dict):
+            return self._folder_stats()
+        updated = {name: dict(counts) for name, counts in folders.items()}
+        for name, change in folder_delta.items():
+            counts = updated.setdefault(name, {"files": 0, "chunks": 0})
+            counts["files"] += change["files"]
+            counts["chunks"] += change["chunks"]
+            if counts["files"] <= 0 and counts["chunks"] <= 0:
+                del updated[name]
+        files = sum(counts["files"] for counts in updated.values())
+        chunks = sum(counts["chunks"] for counts in updated.values())
+        if files != index["total_files"] or chunks != index["total_chunks"]:
+            return self._folder_stats()
+        return dict(sorted(updated.items()))
+
+    def _write_stats_snapshot(
+        self,
+        last_sync: dict[str, int],
+        duration: float,
+        folder_delta: dict[str, dict[str, int]] | None = None,
+    ) -> None:
+        """sync 完成後寫入統計快照，stats 命令讀取快照即可，不必開啟 Chroma
+
+        資料夾統計由 folder_delta 增量更新，不必每次 sync 都掃描整個 DB
+        """
+        index = self._index_stats()
+        snapshot = {
+            **index,
+            "folders": self._updated_folder_stats(index, folder_delta),
+            "last_sync_at": datetime.now(tz=timezone.utc).isoformat(),
+            "last_sync_duration": round(duration, 3),
+            "last_sync": last_sync,
         }
+        try:
+            write_snapshot(self.db_path / STATS_SNAPSHOT_FILE, snapshot)
+        except OSError as e:
+            print(f"無法寫入統計快照: {e}", file=sys.stderr)
+
+    def compact(self, probe_queries: int = COMPACT_PROBE_QUERIES) -> dict[str, Any]:
+        """壓縮 DB 目錄：重建向量索引、刪除孤立的 HNSW 目錄並 vacuum SQLite
+
+        每個 collection 以既有的 embeddings 複製到新的 collection 後替換（不重新 embed），
+        新的 HNSW 索引只含目前的 chunks，並套用指定的 HNSW 參數（M、construction_ef）；
+        回傳前後各元件的磁碟用量與查詢延遲。
+        需要 writer lease，其他 process 正在寫入時拋出 SyncInProgressError。
+        """
+        with self.writer_lease():
+            probes = self._probe_vectors(probe_queries)
+            before = {"sizes": db_footprint(self.db_path), "latency": self._probe_latency(probes)}
+
+            collections: dict[str, int] = {}
+            for attr in ("collection", "meta_collection", "note_collection"):
+                rebuilt = self._rebuild_collection(getattr(self, attr))
+                setattr(self, attr, rebuilt)
+                collections[rebuilt.name] = rebuilt.count()
+            removed = self._vacuum()
+
+            after = {"sizes": db_footprint(self.db_path), "latency": self._probe_latency(probes)}
+            return {
+                "collections": collections,
+                "removed_segments": removed,
+                "before": before,
+                "after": after,
+            }
+
+    def _vacuum(self) -> int:
+        """刪除孤立的 HNSW 目錄並 vacuum 各 SQLite 檔，回傳刪除的目錄數"""
+        removed = remove_orphaned_segments(self.db_path)
+        for path in (
+            self.db_path / CHROMA_SQLITE_FILE,
+            self.db_path / LEXICAL_INDEX_FILE,
+            self.db_path / LINK_INDEX_FILE,
+            self.db_path / JOURNAL_FILE,
+        ):
+            if path.exists():
+                vacuum_sqlite(path)
+        return removed
+
+    def _rebuild_collection(self, collection: Collection) -> Collection:
+        """以既有的 ids / embeddings / documents / metadatas 建立新的 collection 並替換舊的
+
+        先完整複製到暫存 collection 並確認筆數，才刪除舊的再改名；
+        在刪除與改名之間中斷時，下次啟動由 _restore_compacted_collections 完成改名
+        """
+        tmp = self._copy_collection(collection, collection.name + COMPACT_SUFFIX)
+        return self._swap_collection(tmp, collection.name)
+
+    def _copy_collection(
+        self,
+        collection: Collection,
+        tmp_name: str,
+        metadata: dict[str, Any] | None = None,
+        convert: Callable[[list[Any], Any], Embeddings] | None = None,
+    ) -> Collection:
+        """將 collection 的內容複製到暫存 collection 並確認筆數
+
+        metadata 預設沿用原本的；convert(documents, embeddings) 可轉換每頁的向量
+        """
+        name = collection.name
+        if tmp_name in self._collection_names():
+            self.client.delete_collection(tmp_name)  # 上次中斷留下的不完整副本
+        tmp = self.client.create_collection(
+            name=tmp_name,
+            metadata=metadata or collection.metadata or None,
+            configuration=self._hnsw_configuration(name, _hnsw_config(collection)),
+        )
+        offset = 0
+        while True:
+            page = collection.get(
+                limit=BULK_BATCH_SIZE,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            if not page["ids"]:
+                break
+            documents = page["documents"]
+            embeddings = page["embeddings"]
+            if convert is not None:
+                embeddings = convert(documents or [], embeddings)
+            tmp.add(
+                ids=page["ids"],
+                embeddings=embeddings,
+                documents=documents
+                if documents and any(d is not None for d in documents)
+                else None,
+                metadatas=page["metadatas"] if page["metadatas"] else None,
+            )
+            offset += len(page["ids"])
+
+        if tmp.count() != collection.count():
+            raise RuntimeError(f"{name} 重建後筆數不符（{tmp.count()} / {collection.count()}）")
+        return tmp
+
+    def _swap_collection(self, tmp: Collection, name: str) -> Collection:
+        """刪除舊的 collection，將暫存 collection 改名取代"""
+        self.client.delete_collection(name)
+        tmp.modify(name=name)
+        return tmp
+
+    def _collection_names(self) -> set[str]:
+        return {c.name for c in self.client.list_collections()}
+
+    def _restore_compacted_collections(self) -> None:
+        """完成上次 compact / migrate 中斷的替換，或捨棄尚未開始替換的暫存 collection
+
+        compact 逐一替換：舊 collection 已刪除時將暫存 collection 改名。
+        migrate 的 chunks 與筆記向量需一起替換：chunks 已開始替換時其餘的也完成替換。
+        上次 tune 中斷留下的暫存 collection 直接刪除。
+        """
+        names = self._collection_names()
+        leftovers = [n for n in names if n.endswith((COMPACT_SUFFIX, MIGRATE_SUFFIX, TUNE_SUFFIX))]
+        # 其他 process 持有 lease 時可能正在 compact，不動它的暫存 collection
+        if not leftovers or not self.lease.acquire(0):
+            return
+        migrating = "obsidian_vault" not in names or "obsidian_vault" + MIGRATE_SUFFIX not in names
+        try:
+            for tmp_name in leftovers:
+                if tmp_name.endswith(TUNE_SUFFIX):
+                    self.client.delete_collection(tmp_name)
+                    continue
+                name = tmp_name.removesuffix(COMPACT_SUFFIX).removesuffix(MIGRATE_SUFFIX)
+                if tmp_name.endswith(COMPACT_SUFFIX):
+                    roll_forward = name not in names
+                else:
+                    roll_forward = migrating
+                if not roll_forward:
+                    self.client.delete_collection(tmp_name)
+                    continue
+                if name in names:
+                    self.client.delete_collection(name)
+                self.client.get_collection(tmp_name).modify(name=name)
+                print(f"已完成上次中斷的替換: {name}", file=sys.stderr)
+        finally:
+            self.lease.release()
+
+    def migrate(
+        self,
+        target: EmbeddingProvider,
+        embed_cache: EmbeddingCache | None = None,
+        probe_queries: int = COMPACT_PROBE_QUERIES,
+    ) -> dict[str, Any]:
+        """將 chunks 轉換到 target 的向量空間（例如縮短 embedding 維度）後替換 collection
+
+        每個 chunk 的新向量依序取自：
+        1. collection 中同一模型的向量（可截斷且維度不小於目標時），截斷並重新正規化
+        2. embedding 快取：同一模型的完整向量（截斷），或目標維度的向量
+        3. 以 target 重新 embed（受 RPM / TPM 限制）
+        筆記向量由新的 chunk 向量重新計算；兩者都建好後才一起替換，回傳前後的磁碟用量與延遲。
+        """
+        with self.writer_lease():
+            source = self._collection_embedding() or {}
+            if source == target.collection_metadata():
+                raise ValueError(f"collection 已是 {target.describe()}（{target.dimension} 維）")
+            self.embedder = target
+            if embed_cache is not None:
+                self.embed_cache = embed_cache
+            self.metrics = SyncMetrics()
+
+            probes = self._probe_vectors(probe_queries)
+            before = {"sizes": db_footprint(self.db_path), "latency": self._probe_latency(probes)}
+
+            same_model = (
+                source.get("embedding_provider") == target.name
+                and source.get("embedding_model") == target.model
+            )
+            reuse_stored = (
+                same_model
+                and target.can_truncate()
+                and int(source.get("embedding_dimension") or 0) > target.dimension
+            )
+            full = target.with_dimension(target.full_dimension) if target.can_truncate() else None
+
+            def convert(documents: list[Any], embeddings: Any) -> Embeddings:
+                if reuse_stored:
+                    self.metrics.add("vectors_truncated", len(embeddings))
+                    return [truncate_embedding(v, target.dimension) for v in embeddings]
+                return self._embed_documents(documents, full)
+
+            chunk_tmp = self._copy_collection(
+                self.collection,
+                "obsidian_vault" + MIGRATE_SUFFIX,
+                metadata={"hnsw:space": "cosine", **target.collection_metadata()},
+                convert=convert,
+            )
+            collection, note_collection = self.collection, self.note_collection
+            try:
+                note_tmp = self.client.create_collection(
+                    name="obsidian_notes" + MIGRATE_SUFFIX,
+                    metadata=note_collection.metadata or None,
+                    configuration=self._hnsw_configuration(
+                        "obsidian_notes", _hnsw_config(note_collection)
+                    ),
+                )
+                self.collection, self.note_collection = chunk_tmp, note_tmp
+                self._update_note_vectors(sorted(self._load_meta()))
+            except BaseException:
+                self.collection, self.note_collection = collection, note_collection
+                # 先刪筆記向量的暫存 collection：只剩它時會被視為已開始替換
+                for name in ("obsidian_notes", "obsidian_vault"):
+                    if name + MIGRATE_SUFFIX in self._collection_names():
+                        self.client.delete_collection(name + MIGRATE_SUFFIX)
+                raise
+
+            self.collection = self._swap_collection(chunk_tmp, "obsidian_vault")
+            self.note_collection = self._swap_collection(note_tmp, "obsidian_notes")
+            removed = self._vacuum()
+            snapshot = read_snapshot(self.db_path / STATS_SNAPSHOT_FILE)
+            if snapshot is not None:
+                write_snapshot(
+                    self.db_path / STATS_SNAPSHOT_FILE, {**snapshot, **self._index_stats()}
+                )
+
+            after = {
+                "sizes": db_footprint(self.db_path),
+                "latency": self._probe_latency(self._probe_vectors(probe_queries)),
+            }
+            counts = self.metrics.counts
+            return {
+                "from": source,
+                "to": target.collection_metadata(),
+                "vectors": {
+                    "truncated": counts.get("vectors_truncated", 0),
+                    "cached": counts.get("embed_cache_hits", 0),
+                    "embedded": counts.get("chunks_embedded", 0),
+                },
+                "collections": {
+                    "obsidian_vault": self.collection.count(),
+                    "obsidian_notes": self.note_collection.count(),
+                },
+                "removed_segments": removed,
+                "before": before,
+                "after": after,
+            }
+
+    def _embed_documents(
+        self, documents: list[str], full: EmbeddingProvider | None = None
+    ) -> Embeddings:
+        """取得 documents 在目前 embedder 下的向量（migrate 用）
+
+        full 為同一模型的完整維度 provider：快取中有完整向量時截斷沿用；
+        其餘以 _embed_batch 處理（目標維度的快取、限速與重試）
+        """
+        embedder = self._require_embedder()
+        vectors: list[Any] = [None] * len(documents)
+        if (
+            full is not None
+            and self.embed_cache is not None
+            and full.dimension > embedder.dimension
+        ):
+            for i, vector in enumerate(self.embed_cache.get_many(full, documents)):
+                if vector is not None:
+                    vectors[i] = truncate_embedding(vector, embedder.dimension)
+            self.metrics.add("vectors_truncated", sum(v is not None for v in vectors))
+
+        batch = _EmbedBatch()
+        positions: list[int] = []
+
+        def flush() -> None:
+            for i, vector in zip(positions, self._embed_batch(batch)):
+                vectors[i] = vector
+            batch.clear()
+            positions.clear()
+
+        for i, document in enumerate(documents):
+            if vectors[i] is not None:
+                continue
+            tokens = estimate_tokens(document)
+            if batch.would_overflow(tokens):
+                flush()
+            batch.add(str(i), document, {}, tokens)
+            positions.append(i)
+        if positions:
+            flush()
+        return vectors
+
+    def _probe_vectors(self, n: int) -> Embeddings:
+        """取 n 個既有 chunk 的向量作為延遲量測的查詢（不需要呼叫 embedding API）"""
+        if n <= 0:
+            return []
+        page = self.collection.get(limit=n, include=["embeddings"])
+        embeddings = page["embeddings"]
+        if embeddings is None:
+            return []
+        return [np.asarray(vector, dtype=np.float32) for vector in embeddings]
+
+    def _probe_latency(self, vectors: Embeddings) -> dict[str, float]:
+        """逐一查詢並回傳延遲（毫秒）：第一次查詢（含載入索引）與 p50 / p99"""
+        count = self.collection.count()
+        if not vectors or not count:
+            return {}
+        latencies: list[float] = []
+        for vector in vectors:
+            started = time.monotonic()
+            self.collection.query(query_embeddings=[vector], n_results=min(5, count))
+            latencies.append((time.monotonic() - started) * 1000)
+        ordered = sorted(latencies)
+        return {
+            "first_ms": round(latencies[0], 2),
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+        }
+
+    def tune(
+        self,
+        collection_name: str = "obsidian_vault",
+        top_k: int = 5,
+        samples: int = TUNE_SAMPLES,
+        m_values: Iterable[int] = TUNE_M,
+        construction_ef_values: Iterable[int] = TUNE_CONSTRUCTION_EF,
+        search_ef_values: Iterable[int] = TUNE_SEARCH_EF,
+    ) -> list[dict[str, Any]]:
+        """量測 HNSW 參數組合的 recall@k 與查詢延遲
+
+        抽樣既有的向量作為查詢（排除向量本身），以 NumPy 暴力計算的 cosine 最近鄰為標準答案。
+        第一列為 collection 目前的設定；其餘每組 (M, construction_ef) 在暫存 collection 中
+        以既有的 embeddings 建立索引（不重新 embed），再逐一量測各 search_ef。
+        向量一律分頁讀取，記憶體中只保留抽樣的查詢向量與一頁向量。
+        """
+        if collection_name not in HNSW_COLLECTIONS:
+            raise ValueError(f"只能調整 {' / '.join(HNSW_COLLECTIONS)}")
+        with self.writer_lease():
+            source = self.client.get_collection(collection_name)
+            count = source.count()
+            if count <= top_k:
+                return []
+
+            rng = np.random.default_rng(0)  # 固定抽樣，各次執行的結果可比較
+            picks = sorted(rng.choice(count, size=min(samples, count), replace=False).tolist())
+            queries: list[tuple[str, np.ndarray]] = []
+            for offset in picks:
+                page = source.get(limit=1, offset=offset, include=["embeddings"])
+                if page["ids"] and page["embeddings"] is not None:
+                    vector = np.asarray(page["embeddings"][0], dtype=np.float32)
+                    queries.append((page["ids"][0], vector))
+            truth = self._exact_neighbors(source, queries, top_k)
+
+            current = _hnsw_config(source)
+            results = [
+                {
+                    "current": True,
+                    **self._measure_recall(source, queries, truth, top_k),
+                    **_grid_row(current),
+                }
+            ]
+            tmp_name = collection_name + TUNE_SUFFIX
+            try:
+                for m, construction_ef in product(m_values, construction_ef_values):
+                    if tmp_name in self._collection_names():
+                        self.client.delete_collection(tmp_name)
+                    started = time.monotonic()
+                    hnsw: CreateHNSWConfiguration = {
+                        "space": "cosine",
+                        "max_neighbors": m,
+                        "ef_construction": construction_ef,
+                    }
+                    tmp = self.client.create_collection(name=tmp_name, configuration={"hnsw": hnsw})
+                    for ids, vectors in self._iter_vectors(source):
+                        tmp.add(ids=ids, embeddings=vectors)
+                    build_seconds = round(time.monotonic() - started, 3)
+                    for search_ef in search_ef_values:
+                        # search_ef 在載入索引時讀取，變更後需重新開啟 client
+                        tmp.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                        self._reopen_client()
+                        tmp = self.client.get_collection(tmp_name)
+                        results.append(
+                            {
+                                **self._measure_recall(tmp, queries, truth, top_k),
+                                **_grid_row({**hnsw, "ef_search": search_ef}),
+                                "build_seconds": build_seconds,
+                            }
+                        )
+            finally:
+                if tmp_name in self._collection_names():
+                    self.client.delete_collection(tmp_name)
+                remove_orphaned_segments(self.db_path)
+            return results
+
+    def _iter_vectors(self, collection: Collection) -> Iterator[tuple[list[str], np.ndarray]]:
+        """分頁讀取 collection 的 ids 與 embeddings（每頁一個 float32 矩陣）"""
+        offset = 0
+        while True:
+            page = collection.get(limit=BULK_BATCH_SIZE, offset=offset, include=["embeddings"])
+            if not page["ids"]:
+                return
+            yield page["ids"], np.asarray(page["embeddings"], dtype=np.float32)
+            offset += len(page["ids"])
+
+    def _exact_neighbors(
+        self, collection: Collection, queries: list[tuple[str, np.ndarray]], top_k: int
+    ) -> list[set[str]]:
+        """逐頁以 NumPy 暴力計算每個查詢的 cosine 前 k 名（排除查詢本身）
+
+        與第 k 名同分的向量都算正確答案，避免重複內容造成的誤判；
+        每個查詢只保留目前的前 k 名（含同分），不需要整個向量矩陣
+        """
+        matrix = np.asarray([vector for _, vector in queries], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        positions = {query_id: q for q, (query_id, _) in enumerate(queries)}
+        best_scores = [np.empty(0, dtype=np.float32) for _ in queries]
+        best_ids: list[list[str]] = [[] for _ in queries]
+        for ids, vectors in self._iter_vectors(collection):
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            scores = matrix @ vectors.T
+            for j, chunk_id in enumerate(ids):
+                if chunk_id in positions:
+                    scores[positions[chunk_id], j] = -np.inf
+            for q, row in enumerate(scores):
+                combined = np.concatenate([best_scores[q], row])
+                combined_ids = best_ids[q] + ids
+                if len(combined) > top_k:
+                    kth = -np.partition(-combined, top_k - 1)[top_k - 1]
+                    keep = np.flatnonzero(combined >= kth - 1e-6)
+                    combined = combined[keep]
+                    combined_ids = [combined_ids[j] for j in keep]
+                best_scores[q], best_ids[q] = combined, combined_ids
+        return [set(ids) for ids in best_ids]
+
+    def _measure_recall(
+        self,
+        collection: Collection,
+        queries: list[tuple[str, np.ndarray]],
+        truth: list[set[str]],
+        top_k: int,
+    ) -> dict[str, float]:
+        """逐一查詢，回傳 recall@k 與延遲（毫秒）；第一次查詢（載入索引）不計入延遲"""
+        collection.query(query_embeddings=[queries[0][1]], n_results=top_k + 1, include=[])
+        latencies: list[float] = []
+        hits = 0
+        for (query_id, vector), expected in zip(queries, truth):
+            started = time.monotonic()
+            result = collection.query(query_embeddings=[vector], n_results=top_k + 1, include=[])
+            latencies.append((time.monotonic() - started) * 1000)
+            found = [i for i in result["ids"][0] if i != query_id][:top_k]
+            hits += len(expected.intersection(found))
+        ordered = sorted(latencies)
+        return {
+            "recall": round(hits / (top_k * len(queries)), 4),
+            "p50_ms": round(percentile(ordered, 50), 3),
+            "p99_ms": round(percentile(ordered, 99), 3),
+        }
+
+    def _reopen_client(self) -> None:
+        """重新開啟 PersistentClient（Chroma 在同一 process 中共用已載入的索引）"""
+        import chromadb
+
+        self.client.clear_system_cache()
+        self.client = chromadb.PersistentClient(path=str(self.db_path))
+        self._refresh_collections()
+
+    def _refresh_collections(self) -> None:
+        """以名稱重新取得 collections（替換後的 collection 名稱相同、ID 不同）"""
+        self.collection = self.client.get_collection("obsidian_vault")
+        self.meta_collection = self.client.get_collection("obsidian_meta")
+        self.note_collection = self.client.get_collection("obsidian_notes")
+
+
+def _grid_row(hnsw: dict[str, Any]) -> dict[str, Any]:
+    """HNSW 設定轉成 tune 結果的欄位（以 --hnsw 的參數名稱表示）"""
+    return {key: hnsw.get(field) for key, field in HNSW_PARAMS.items()}
+
+
+def _print_tune(results: list[dict[str, Any]], top_k: int, as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(results))
+        return
+    if not results:
+        print("向量數不足，無法量測")
+        return
+    print(
+        f"{'M':>4} {'construction_ef':>15} {'search_ef':>9} {f'recall@{top_k}':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8}"
+    )
+    for r in results:
+        build = "(目前)" if r.get("current") else f"{r['build_seconds']:.2f}"
+        print(
+            f"{r['M']:>4} {r['construction_ef']:>15} {r['search_ef']:>9} {r['recall']:>9.3f} "
+            f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {build:>8}"
+        )
+
+
+def query_cache_stats(query_cache: QueryEmbeddingCache | None) -> dict[str, int]:
+    stats = query_cache.stats() if query_cache is not None else {}
+    return {
+        "query_cache_entries": stats.get("entries", 0),
+        "query_cache_hits": stats.get("hits", 0),
+        "query_cache_misses": stats.get("misses", 0),
+    }
+
+
+def _empty_stats(db_path: Path) -> dict[str, Any]:
+    """尚未建立的 DB 的統計（與 stats() 相同的欄位，全為 0）"""
+    return {
+        "total_chunks": 0,
+        "total_files": 0,
+        "total_notes": 0,
+        "db_path": str(db_path),
+        "embedding": "-",
+        "embedding_provider": "-",
+        "embedding_dimension": 0,
+        "folders": {},
+    }
+
+
+def _print_stats(s: dict[str, Any], as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(s))
+        return
+    print(f"檔案數: {s['total_files']}")
+    print(f"筆記向量: {s['total_notes']}")
+    print(f"Chunks: {s['total_chunks']}")
+    print(f"DB 路徑: {s['db_path']}")
+    print(f"Embedding: {s['embedding_provider']}:{s['embedding']}")
+    print(
+        f"查詢快取: {s['query_cache_entries']} 筆，"
+        f"命中 {s['query_cache_hits']}，未命中 {s['query_cache_misses']}"
+    )
+    if s.get("sync_in_progress"):
+        print("sync 進行中（統計為上次同步完成時的狀態）")
+    if "last_sync_at" in s:
+        print(f"上次同步: {s['last_sync_at']}（{s['last_sync_duration']:.1f} 秒）")
+    for folder, counts in s.get("folders", {}).items():
+        print(f"  {folder or '(根目錄)'}: {counts['files']} 檔案，{counts['chunks']} chunks")
+
+
+def _int_list(value: str) -> tuple[int, ...]:
+    """argparse type：逗號分隔的正整數（ValueError 由 argparse 回報為參數錯誤）"""
+    numbers = tuple(int(v) for v in value.split(","))
+    if any(n <= 0 for n in numbers):
+        raise ValueError(value)
+    return numbers
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024  # type: ignore[assignment]
+    return f"{size:.1f} GB"
+
+
+def _print_compact(report: dict[str, Any], as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(report))
+        return
+    before = report["before"]["sizes"]
+    after = report.get("after", {}).get("sizes")
+    for component, size in before.items():
+        if after is None:
+            print(f"  {component}: {_format_size(size)}")
+        else:
+            print(f"  {component}: {_format_size(size)} → {_format_size(after.get(component, 0))}")
+    if after is None:
+        return
+    print(f"重建: {', '.join(f'{n} {c} 筆' for n, c in report['collections'].items())}")
+    if report["removed_segments"]:
+        print(f"刪除孤立的 HNSW 目錄: {report['removed_segments']}")
+    for label in ("before", "after"):
+        latency = report[label]["latency"]
+        if latency:
+            print(
+                f"查詢延遲（{'之前' if label == 'before' else '之後'}）: "
+                f"首次 {latency['first_ms']:.1f} ms，"
+                f"p50 {latency['p50_ms']:.1f} ms，p99 {latency['p99_ms']:.1f} ms"
+            )
+
+
+def _print_migrate(report: dict[str, Any], as_json: bool) -> None:
+    if as_json:
+        print(json.dumps(report))
+        return
+    source, target, vectors = report["from"], report["to"], report["vectors"]
+    print(
+        f"Embedding: {source.get('embedding_model')} ({source.get('embedding_dimension')} 維) → "
+        f"{target['embedding_model']} ({target['embedding_dimension']} 維)"
+    )
+    print(
+        f"向量: 截斷沿用 {vectors['truncated']}，快取 {vectors['cached']}，"
+        f"重新 embed {vectors['embedded']}"
+    )
+    _print_compact(report, as_json=False)
 
 
 def main() -> None:
     import argparse
-    import json
-    import sys
 
     parser = argparse.ArgumentParser(description="Obsidian RAG 索引工具")
-    parser.add_argument("command", choices=["sync", "search", "stats"], help="執行的命令")
+    parser.add_argument(
+        "command",
+        choices=["sync", "watch", "search", "notes", "stats", "compact", "tune", "migrate"],
+        help="執行的命令",
+    )
     parser.add_argument("--vault", default="~/obsidian", help="Vault 路徑")
     parser.add_argument("--db", default=None, help="ChromaDB 路徑")
     parser.add_argument("--query", "-q", help="搜尋查詢")
+    parser.add_argument(
+        "--stdin",
+        action="store_true",
+        help='批次搜尋：從 stdin 讀取查詢（每行一個 JSON 字串或 {"query": ...}）',
+    )
     parser.add_argument("--top-k", "-k", type=int, default=5, help="回傳數量")
+    parser.add_argument(
+        "--mode",
+        choices=SEARCH_MODES,
+        default=DEFAULT_SEARCH_MODE,
+        help="搜尋模式（vector: 語意搜尋；hybrid: 語意 + BM25 關鍵字）",
+    )
+    parser.add_argument(
+        "--expand",
+        type=int,
+        nargs="?",
+        const=EXPAND_MAX_TOKENS,
+        default=0,
+        help=f"合併同檔案結果並補上相鄰 chunks（可指定每段 token 上限，預設 {EXPAND_MAX_TOKENS}）",
+    )
+    parser.add_argument(
+        "--mmr",
+        type=float,
+        nargs="?",
+        const=MMR_LAMBDA,
+        default=None,
+        help=f"以 MMR 重排提高結果多樣性（可指定 lambda，預設 {MMR_LAMBDA}）",
+    )
+    parser.add_argument(
+        "--mmr-candidates", type=int, default=MMR_CANDIDATES, help="MMR 重排的候選數"
+    )
+    parser.add_argument(
+        "--notes",
+        type=int,
+        nargs="?",
+        const=NOTE_CANDIDATES,
+        default=0,
+        help=f"兩階段搜尋：先找出前 N 篇筆記再排序其 chunks（預設 {NOTE_CANDIDATES}）",
+    )
+    parser.add_argument(
+        "--links",
+        type=int,
+        nargs="?",
+        const=LINK_NEIGHBORS,
+        default=0,
+        help=f"附上結果筆記的一步連結筆記（[[wikilinks]]，預設 {LINK_NEIGHBORS} 篇）",
+    )
+    parser.add_argument("--folder", default=None, help="只搜尋此頂層資料夾（例如 Projects）")
+    parser.add_argument("--tag", default=None, help="只搜尋含此 tag 的筆記")
+    parser.add_argument(
+        "--since", default=None, help="只搜尋此時間之後修改的筆記（ISO 日期或 30d）"
+    )
+    parser.add_argument(
+        "--until", default=None, help="只搜尋此時間之前修改的筆記（ISO 日期，含當天）"
+    )
     parser.add_argument("--json", action="store_true", help="JSON 輸出")
+    parser.add_argument(
+        "--wait",
+        type=float,
+        nargs="?",
+        const=float("inf"),
+        default=0,
+        help="已有 sync 進行中時等待（可指定秒數，預設一直等待）；未指定時直接略過",
+    )
+    parser.add_argument("--metrics", default=None, help="將每次 sync 的各階段指標附加到此 JSONL 檔")
+    parser.add_argument(
+        "--hnsw",
+        action="append",
+        default=[],
+        metavar="COLLECTION:KEY=N[,KEY=N]",
+        help="HNSW 參數（M / construction_ef / search_ef），例如 obsidian_vault:M=32,search_ef=64",
+    )
+    parser.add_argument(
+        "--collection",
+        choices=HNSW_COLLECTIONS,
+        default="obsidian_vault",
+        help="tune 量測的 collection",
+    )
+    parser.add_argument("--samples", type=int, default=TUNE_SAMPLES, help="tune 抽樣的查詢數")
+    parser.add_argument(
+        "--tune-m", type=_int_list, default=TUNE_M, help="tune 的 M 候選值（逗號分隔）"
+    )
+    parser.add_argument(
+        "--tune-construction-ef",
+        type=_int_list,
+        default=TUNE_CONSTRUCTION_EF,
+        help="tune 的 construction_ef 候選值（逗號分隔）",
+    )
+    parser.add_argument(
+        "--tune-search-ef",
+        type=_int_list,
+        default=TUNE_SEARCH_EF,
+        help="tune 的 search_ef 候選值（逗號分隔）",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="compact 只列出各元件的磁碟用量，不重建"
+    )
+    parser.add_argument(
+        "--live", action="store_true", help="stats 改為開啟 Chroma 即時計算（預設讀取快照）"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=SYNC_READ_WORKERS, help="sync 讀檔 + chunk 的 worker 數"
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=SYNC_EMBED_CONCURRENCY,
+        help="sync 同時進行的 embedding 請求數",
+    )
+    parser.add_argument(
+        "--embed-rpm", type=int, default=EMBED_RPM, help="embedding 每分鐘請求上限（0 = 不限）"
+    )
+    parser.add_argument(
+        "--embed-tpm", type=int, default=EMBED_TPM, help="embedding 每分鐘 token 上限（0 = 不限）"
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=WATCH_DEBOUNCE, help="watch 合併連續寫入的秒數"
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        nargs="?",
+        const=WATCH_POLL_INTERVAL,
+        default=None,
+        help="watch 改用輪詢（可指定間隔秒數）",
+    )
+    parser.add_argument(
+        "--embedding",
+        choices=list(EMBEDDING_PROVIDERS),
+        default=None,
+        help="Embedding provider（預設讀取 OBSIDIAN_RAG_EMBEDDING，否則為 openai）",
+    )
+    parser.add_argument(
+        "--embedding-dim",
+        type=int,
+        default=None,
+        help="Embedding 維度（text-embedding-3 可縮短；預設讀取 OBSIDIAN_RAG_EMBEDDING_DIM，"
+        "否則為模型原生維度）；migrate 的目標維度",
+    )
+    parser.add_argument(
+        "--chunker",
+        choices=CHUNK_STRATEGIES,
+        default=DEFAULT_CHUNK_STRATEGY,
+        help="Chunk 策略（markdown: 標題 + token 預算；paragraph: 舊版段落切分）",
+    )
+    parser.add_argument(
+        "--embed-cache", default=None, help=f"Embedding 快取路徑（預設 {EMBED_CACHE_PATH}）"
+    )
+    parser.add_argument(
+        "--embed-cache-size",
+        type=int,
+        default=EMBED_CACHE_MAX_BYTES // (1024 * 1024),
+        help="Embedding 快取大小上限（MB，0 = 停用）",
+    )
+    parser.add_argument(
+        "--query-cache", default=None, help=f"查詢向量快取路徑（預設 {QUERY_CACHE_PATH}）"
+    )
+    parser.add_argument(
+        "--query-cache-size",
+        type=int,
+        default=QUERY_CACHE_MAX_ITEMS,
+        help="查詢向量快取保留的查詢數（0 = 停用）",
+    )
 
     args = parser.parse_args()
 
-    # stats 不需要 API key，使用 readonly 模式
-    readonly = args.command == "stats"
-    rag = ObsidianRAG(args.vault, args.db, readonly=readonly)
+    # stats 預設讀取 sync 寫入的快照，不載入 chromadb；--live 才開啟 Chroma 即時計算。
+    # 沒有快照時：DB 尚未建立則回報全為 0 的統計，已有 DB（尚未寫過快照）則即時計算
+    if args.command == "stats" and not args.live:
+        db_path = Path(args.db).expanduser() if args.db else DB_PATH
+        snapshot = read_snapshot(db_path / STATS_SNAPSHOT_FILE)
+        if snapshot is None and not (db_path / CHROMA_SQLITE_FILE).exists():
+            snapshot = _empty_stats(db_path)
+        if snapshot is not None:
+            query_cache = (
+                QueryEmbeddingCache(args.query_cache or QUERY_CACHE_PATH, args.query_cache_size)
+                if args.query_cache_size > 0
+                else None
+            )
+            writer = WriterLease(db_path / WRITER_LOCK_FILE).holder()
+            _print_stats(
+                {
+                    **snapshot,
+                    **query_cache_stats(query_cache),
+                    "sync_in_progress": writer is not None,
+                },
+                args.json,
+            )
+            return
+
+    # 只列出磁碟用量時不需要開啟 Chroma
+    if args.command == "compact" and args.dry_run:
+        db_path = Path(args.db).expanduser() if args.db else DB_PATH
+        _print_compact({"before": {"sizes": db_footprint(db_path)}}, args.json)
+        return
+
+    try:
+        hnsw = parse_hnsw_params(args.hnsw)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}) if args.json else e)
+        return
+
+    # stats、compact 與 tune 不需要 API key，使用 readonly 模式；
+    # migrate 的目標 provider 與既有 collection 不同，另外建立
+    readonly = args.command in ("stats", "compact", "tune", "migrate")
+    rag = ObsidianRAG(
+        args.vault,
+        args.db,
+        readonly=readonly,
+        chunk_strategy=args.chunker,
+        embed_rpm=args.embed_rpm,
+        embed_tpm=args.embed_tpm,
+        embedding=args.embedding,
+        embedding_dim=args.embedding_dim,
+        embed_cache=args.embed_cache,
+        embed_cache_size=args.embed_cache_size * 1024 * 1024,
+        query_cache=args.query_cache,
+        query_cache_size=args.query_cache_size,
+        metrics_path=args.metrics,
+        hnsw=hnsw,
+    )
+
+    # 寫入命令需取得 writer lease；已有 sync 進行中時直接回報（--wait 則排隊等候）。
+    # 略過的狀態輸出到 stdout，呼叫端（MCP obsidian_sync）只讀取 stdout。
+    # watch 只在每批同步時取得 lease，不在此處取得
+    rag.lease.command = args.command
+    if args.command in WRITE_COMMANDS and not rag.lease.acquire(args.wait):
+        holder = rag.lease.holder() or {}
+        if args.json:
+            print(json.dumps({"status": "sync_in_progress", "holder": holder}))
+        else:
+            print(f"{SyncInProgressError(holder)}，略過")
+        return
 
     if args.command == "sync":
         if not args.json:
-            print(f"同步 {args.vault} (embedding: text-embedding-3-small) ...", file=sys.stderr)
-        stats = rag.sync()
+            embedding = rag.embedder.describe() if rag.embedder else "-"
+            print(f"同步 {args.vault} (embedding: {embedding}) ...", file=sys.stderr)
+        stats = rag.sync(workers=args.workers, embed_concurrency=args.embed_concurrency)
+        metrics = rag.metrics.to_dict()
         if args.json:
-            print(json.dumps(stats))
+            print(json.dumps({**stats, "metrics": metrics}))
         else:
             print(
                 f"\n完成: +{stats['added']} *{stats['updated']} "
-                f"-{stats['deleted']} ={stats['unchanged']}"
+                f"-{stats['deleted']} ={stats['unchanged']} ~{stats['touched']}"
+            )
+            phases = "，".join(f"{name} {sec:.1f}s" for name, sec in metrics["phases"].items())
+            print(f"耗時 {metrics['wall_seconds']:.1f}s（{phases}）")
+            if rag.embed_cache is not None and rag.embed_cache.hits:
+                cache = rag.embed_cache.stats()
+                print(f"Embedding 快取: 命中 {cache['hits']}，未命中 {cache['misses']}")
+
+    elif args.command == "watch":
+        print(f"監看 {args.vault} ...", file=sys.stderr)
+        try:
+            rag.watch(
+                debounce=args.debounce,
+                poll_interval=args.poll or WATCH_POLL_INTERVAL,
+                force_polling=args.poll is not None,
+                workers=args.workers,
+                embed_concurrency=args.embed_concurrency,
             )
+        except KeyboardInterrupt:
+            pass
 
     elif args.command == "search":
-        if not args.query:
+        if args.stdin:
+            try:
+                queries = read_query_lines(sys.stdin)
+            except ValueError as e:
+                if args.json:
+                    print(json.dumps({"error": str(e)}))
+                else:
+                    print(e)
+                return
+        elif args.query:
+            queries = [args.query]
+        else:
             if args.json:
                 print(json.dumps({"error": "query required"}))
             else:
                 print("請提供 --query 參數")
             return
-        results = rag.search(args.query, args.top_k)
-        if args.json:
-            print(json.dumps(results))
-        else:
+        batch_results = rag.search_many(
+            queries,
+            args.top_k,
+            mode=args.mode,
+            folder=args.folder,
+            tag=args.tag,
+            since=args.since,
+            until=args.until,
+            expand=args.expand,
+            mmr=args.mmr,
+            mmr_candidates=args.mmr_candidates,
+            notes=args.notes,
+            links=args.links,
+        )
+        for query, results in zip(queries, batch_results):
+            if args.json:
+                # --stdin 時每行輸出一個查詢的結果（JSON lines），順序與輸入相同
+                print(json.dumps({"query": query, "results": results} if args.stdin else results))
+                continue
+            if args.stdin:
+                print(f"\n=== {query} ===")
             for i, r in enumerate(results, 1):
-                print(f"\n--- {i}. {r['file_path']} (distance: {r['distance']:.4f}) ---")
+                heading = f" § {r['heading_path']}" if r.get("heading_path") else ""
+                linked = f" ← {', '.join(r['linked_from'])}" if r.get("linked_from") else ""
+                print(
+                    f"\n--- {i}. {r['file_path']}{heading}{linked} "
+                    f"(distance: {r['distance']:.4f}) ---"
+                )
                 print(r["chunk"][:200] + "..." if len(r["chunk"]) > 200 else r["chunk"])
 
-    elif args.command == "stats":
-        s = rag.stats()
+    elif args.command == "notes":
+        if not args.query:
+            if args.json:
+                print(json.dumps({"error": "query required"}))
+            else:
+                print("請提供 --query 參數")
+            return
+        notes = rag.search_notes(
+            args.query, args.top_k, args.folder, args.tag, args.since, args.until
+        )
         if args.json:
-            print(json.dumps(s))
+            print(json.dumps(notes))
         else:
-            print(f"檔案數: {s['total_files']}")
-            print(f"Chunks: {s['total_chunks']}")
-            print(f"DB 路徑: {s['db_path']}")
-            print(f"Embedding: {s['embedding']}")
+            for i, n in enumerate(notes, 1):
+                print(f"{i}. {n['file_path']} (distance: {n['distance']:.4f})")
+
+    elif args.command == "compact":
+        if not args.json:
+            print(f"壓縮 {rag.db_path} ...", file=sys.stderr)
+        _print_compact(rag.compact(), args.json)
+
+    elif args.command == "migrate":
+        try:
+            target = get_embedding_provider(args.embedding, args.embedding_dim)
+            if not args.json:
+                print(f"轉換為 {target.describe()}（{target.dimension} 維）...", file=sys.stderr)
+            embed_cache = (
+                EmbeddingCache(
+                    args.embed_cache or EMBED_CACHE_PATH, args.embed_cache_size * 1024 * 1024
+                )
+                if args.embed_cache_size > 0
+                else None
+            )
+            report = rag.migrate(target, embed_cache)
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}) if args.json else e)
+            return
+        _print_migrate(report, args.json)
+
+    elif args.command == "tune":
+        if not args.json:
+            print(f"量測 {args.collection} 的 HNSW 參數（recall@{args.top_k}）...", file=sys.stderr)
+        results = rag.tune(
+            args.collection,
+            args.top_k,
+            args.samples,
+            args.tune_m,
+            args.tune_construction_ef,
+            args.tune_search_ef,
+        )
+        _print_tune(results, args.top_k, args.json)
+
+    elif args.command == "stats":
+        _print_stats({**rag.stats(), "sync_in_progress": rag.lease.holder() is not None}, args.json)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""Obsidian vault 共用工具（obsidian_rag 與 scripts/obsidian_index 共用）
+
+只使用標準函式庫：scripts/obsidian_index.py 直接 import 這個檔案。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TypedDict
+
+# 設定
+MANIFEST_DIR = Path.home() / ".cache" / "obsidian-rag"  # 與 embedding 快取放在一起
+MANIFEST_VERSION = 1
+
+
+class ManifestEntry(TypedDict):
+    size: int
+    mtime_ns: int
+    hash: str  # content_hash()，無法讀取的檔案為空字串
+    tags: list[str]
+
+
+class ManifestScan(TypedDict):
+    files: dict[str, ManifestEntry]
+    added: list[str]
+    changed: list[str]  # 內容有變的檔案（只有 mtime 改變的不算）
+    removed: list[str]
+    read: int  # 本次掃描實際讀取的檔案數（大小或 mtime 改變的）
+    pending: list[str]  # read=False 時大小或 mtime 改變、尚未計算 hash 的檔案
+
+
+def extract_tags(content: str) -> list[str]:
+    """從 markdown 內容提取 tags"""
+    tags = set()
+
+    # Frontmatter tags (tags: [a, b] 或 tags: a, b)
+    frontmatter_match = re.search(r"^---\n(.*?)\n---", content, re.DOTALL)
+    if frontmatter_match:
+        fm = frontmatter_match.group(1)
+        # tags: [a, b, c]
+        list_match = re.search(r"tags:\s*\[(.*?)\]", fm)
+        if list_match:
+            for tag in list_match.group(1).split(","):
+                tag = tag.strip().strip("\"'")
+                if tag:
+                    tags.add(tag)
+        # YAML list format: tags:\n  - a\n  - b
+        yaml_list = re.search(r"tags:\s*\n((?:\s+-\s*.+\n?)+)", fm)
+        if yaml_list:
+            for tag in re.findall(r"-\s*(.+)", yaml_list.group(1)):
+                tag = tag.strip().strip("\"'")
+                if tag:
+                    tags.add(tag)
+        # Inline format: tags: a, b, c (只在沒有換行的情況)
+        if not list_match and not yaml_list:
+            line_match = re.search(r"tags:\s*([^\n]+)$", fm, re.MULTILINE)
+            if line_match:
+                val = line_match.group(1).strip()
+                if val and not val.startswith("-"):
+                    for tag in val.split(","):
+                        tag = tag.strip().strip("\"'")
+                        if tag:
+                            tags.add(tag)
+
+    # Inline #tags (排除 markdown headers)
+    inline_tags = re.findall(r"(?<!\S)#([a-zA-Z\u4e00-\u9fff][\w\u4e00-\u9fff/-]*)", content)
+    tags.update(inline_tags)
+
+    return [t for t in tags if t]
+
+
+_FENCED_CODE_RE = re.compile(r"^(```|~~~).*?^\1", re.DOTALL | re.MULTILINE)
+_INLINE_CODE_RE = re.compile(r"`[^`\n]*`")
+_WIKILINK_RE = re.compile(r"\[\[([^\[\]|#^]+)(?:[#^][^\[\]|]*)?(?:\|[^\[\]]*)?\]\]")
+_ATTACHMENT_SUFFIXES = {
+    *("png", "jpg", "jpeg", "gif", "svg", "webp", "bmp", "avif"),
+    *("pdf", "mp3", "wav", "m4a", "ogg", "flac", "mp4", "webm", "mov", "mkv"),
+    *("canvas", "base"),
+}
+
+
+def extract_links(content: str) -> list[str]:
+    """從 markdown 內容提取 [[wikilinks]] 的目標筆記（保留重複，可用來計算連結次數）
+
+    支援 [[筆記]]、[[資料夾/筆記]]、[[筆記#標題]]、[[筆記|別名]] 與 ![[嵌入]]；
+    忽略 code block 內的連結與非 markdown 的附件（圖片、PDF 等）
+    """
+    content = _INLINE_CODE_RE.sub("", _FENCED_CODE_RE.sub("", content))
+    links = []
+    for match in _WIKILINK_RE.finditer(content):
+        target = match.group(1).strip()
+        suffix = target.rsplit("/", 1)[-1].rpartition(".")[2].lower()
+        if target and suffix not in _ATTACHMENT_SUFFIXES:
+            links.append(target)
+    return links
+
+
+def is_hidden(rel_path: str) -> bool:
+    """路徑中任何一層以 . 開頭（.obsidian、.trash、.git 等）"""
+    return any(part.startswith(".") for part in Path(rel_path).parts)
+
+
+def content_hash(data: bytes) -> str:
+    """檔案內容的 hash，用來判斷 mtime 改變時內容是否真的有變"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def mtime_iso(mtime_ns: int) -> str:
+    """mtime（奈秒）轉 UTC ISO 字串，與 datetime.fromtimestamp(st_mtime) 結果相同"""
+    seconds, nanos = divmod(mtime_ns, 10**9)
+    return datetime.fromtimestamp(seconds + nanos * 1e-9, tz=timezone.utc).isoformat()
+
+
+def walk_markdown(root: Path, base: Path | None = None) -> Iterator[tuple[str, os.stat_result]]:
+    """以 os.scandir 走訪 root 下的 markdown 檔案，回傳 (相對於 base 的路徑, stat)
+
+    隱藏的資料夾與檔案（. 開頭）在進入前就略過；base 預設為 root
+    """
+    base = base or root
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.name.endswith(".md"):
+                    yield str(Path(entry.path).relative_to(base)), entry.stat()
+            except OSError:
+                continue
+
+
+def default_manifest_path(vault_path: Path) -> Path:
+    """每個 vault 一個 manifest（以絕對路徑的 hash 區分）"""
+    key = hashlib.sha1(str(vault_path.expanduser().resolve()).encode()).hexdigest()[:16]
+    return MANIFEST_DIR / f"manifest-{key}.json"
+
+
+def load_manifest(path: Path) -> dict[str, ManifestEntry]:
+    """讀取 manifest；不存在、損毀或版本不同時回傳空的 manifest"""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def save_manifest(path: Path, files: dict[str, ManifestEntry]) -> None:
+    """先寫暫存檔再 rename，多個工具同時掃描時不會讀到寫到一半的檔案"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(
+        json.dumps({"version": MANIFEST_VERSION, "files": files}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, path)
+
+
+def manifest_entry(size: int, mtime_ns: int, data: bytes) -> ManifestEntry:
+    """由檔案內容建立 manifest 項目；無法解碼時 hash 為空字串"""
+    try:
+        tags = sorted(extract_tags(data.decode("utf-8")))
+    except UnicodeDecodeError:
+        return ManifestEntry(size=size, mtime_ns=mtime_ns, hash="", tags=[])
+    return ManifestEntry(size=size, mtime_ns=mtime_ns, hash=content_hash(data), tags=tags)
+
+
+def scan_manifest(
+    vault_path: Path, manifest_path: Path | None = None, read: bool = True
+) -> ManifestScan:
+    """掃描 vault 並與上次的 manifest 比對，回傳目前的 manifest 與新增 / 變更 / 刪除的檔案
+
+    大小與 mtime_ns 都沒變的檔案沿用上次的 hash 與 tags，不重新讀取；
+    manifest 由 obsidian_rag 與 obsidian_index 共用，任一個工具掃描過的檔案另一個不必再讀。
+
+    read=False 時只 stat 不讀檔：大小或 mtime 改變的檔案列在 pending（hash 為空字串、
+    同時列入 added 或 changed），由呼叫端讀檔時以 manifest_entry() 補上後自行 save_manifest；
+    這裡存檔時 pending 的檔案不寫入，下次掃描會重新檢查。
+    """
+    manifest_path = manifest_path or default_manifest_path(vault_path)
+    previous = load_manifest(manifest_path)
+    files: dict[str, ManifestEntry] = {}
+    added: list[str] = []
+    changed: list[str] = []
+    pending: list[str] = []
+    read_count = 0
+    for rel_path, st in walk_markdown(vault_path):
+        old = previous.get(rel_path)
+        if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            files[rel_path] = old
+            continue
+
+        if not read:
+            files[rel_path] = ManifestEntry(
+                size=st.st_size, mtime_ns=st.st_mtime_ns, hash="", tags=[]
+            )
+            pending.append(rel_path)
+            (added if old is None else changed).append(rel_path)
+            continue
+
+        read_count += 1
+        try:
+            data = (vault_path / rel_path).read_bytes()
+        except OSError:
+            entry = ManifestEntry(size=st.st_size, mtime_ns=st.st_mtime_ns, hash="", tags=[])
+        else:
+            entry = manifest_entry(st.st_size, st.st_mtime_ns, data)
+        files[rel_path] = entry
+        if old is None:
+            added.append(rel_path)
+        elif old["hash"] != entry["hash"]:
+            changed.append(rel_path)
+
+    removed = sorted(previous.keys() - files.keys())
+    if read_count or removed or not manifest_path.exists():
+        skip = set(pending)
+        try:
+            save_manifest(manifest_path, {k: v for k, v in files.items() if k not in skip})
+        except OSError:
+            pass  # manifest 只是快取，寫入失敗時下次重新讀取
+    return ManifestScan(
+        files=files,
+        added=sorted(added),
+        changed=sorted(changed),
+        removed=removed,
+        read=read_count,
+        pending=sorted(pending),
+    )
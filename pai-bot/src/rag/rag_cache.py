@@ -0,0 +1,328 @@
+"""Obsidian RAG embedding cache - 以 chunk 內容 hash 快取向量（SQLite）
+
+key 為 (provider, model, dimension, sha256(text))，向量以 float32 blob 儲存；
+超過大小上限時依最後使用時間淘汰（LRU）。放在 Chroma DB 目錄之外，
+重建索引（換機器、DB 損毀、調整 HNSW 設定）時可直接取回，不必重新呼叫 API。
+
+QueryEmbeddingCache 另外快取搜尋查詢的向量：process 內 LRU + 磁碟（TTL 與筆數上限），
+重複的查詢（「我的閱讀清單」、「這週的任務」）不必每次都呼叫 embedding API。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeVar
+
+import numpy as np
+from rag_embeddings import EmbeddingProvider
+
+if TYPE_CHECKING:
+    from chromadb.api.types import Embeddings
+
+T = TypeVar("T")
+
+# 設定
+EMBED_CACHE_PATH = Path.home() / ".cache" / "obsidian-rag" / "embeddings.sqlite3"
+EMBED_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 約 8 萬個 1536 維向量
+EMBED_CACHE_EVICT_RATIO = 0.9  # 淘汰到上限的 90%，避免每次寫入都觸發淘汰
+QUERY_CACHE_PATH = EMBED_CACHE_PATH.with_name("queries.sqlite3")
+QUERY_CACHE_MAX_ITEMS = 5000  # 磁碟上保留的查詢數
+QUERY_CACHE_MEMORY_ITEMS = 256  # process 內 LRU 的查詢數
+QUERY_CACHE_TTL = 30 * 24 * 3600  # 秒
+QUERY_CACHE_FLUSH_EVERY = 64  # 命中計數與 last_used 累積這麼多次查詢才寫入磁碟
+
+_SQL_BATCH_SIZE = 500  # 單一 SQL 語句的參數數量上限（SQLite 預設 999）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimension INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (provider, model, dimension, text_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+_QUERY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimension INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (provider, model, dimension, query)
+);
+CREATE INDEX IF NOT EXISTS queries_last_used ON queries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """持久化的 embedding 快取（thread-safe，可多個 process 共用同一個檔案）"""
+
+    def __init__(self, path: str | Path = EMBED_CACHE_PATH, max_bytes: int = EMBED_CACHE_MAX_BYTES):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, embedder: EmbeddingProvider, texts: list[str]) -> list[np.ndarray | None]:
+        """依序回傳每段文字的快取向量，未命中為 None"""
+        hashes = [text_hash(t) for t in texts]
+        found: dict[str, np.ndarray] = {}
+        key = (embedder.name, embedder.model, embedder.dimension)
+        expected = embedder.dimension * 4
+        with self._lock:
+            for batch in _batched(sorted(set(hashes)), _SQL_BATCH_SIZE):
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings WHERE provider = ? AND model = ? "
+                    f"AND dimension = ? AND text_hash IN ({placeholders})",
+                    (*key, *batch),
+                ).fetchall()
+                found.update(
+                    (h, np.frombuffer(v, dtype=np.float32)) for h, v in rows if len(v) == expected
+                )
+            if found:
+                now = time.time()
+                for batch in _batched(sorted(found), _SQL_BATCH_SIZE):
+                    placeholders = ",".join("?" * len(batch))
+                    self._conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE provider = ? AND model = ? "
+                        f"AND dimension = ? AND text_hash IN ({placeholders})",
+                        (now, *key, *batch),
+                    )
+                self._conn.commit()
+
+            vectors = [found.get(h) for h in hashes]
+            hits = sum(v is not None for v in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, embedder: EmbeddingProvider, texts: list[str], vectors: Embeddings) -> None:
+        """寫入向量，超過大小上限時淘汰最久未使用的項目"""
+        now = time.time()
+        rows = [
+            (
+                embedder.name,
+                embedder.model,
+                embedder.dimension,
+                text_hash(text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(provider, model, dimension, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._total_bytes += sum(len(row[4]) for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """刪除最久未使用的項目，直到低於上限的 EMBED_CACHE_EVICT_RATIO（需持有 lock）"""
+        # 其他 process 也可能寫入，淘汰前重新計算實際大小
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        target = int(self.max_bytes * EMBED_CACHE_EVICT_RATIO)
+        excess = self._total_bytes - target
+        if excess <= 0:
+            return
+
+        victims: list[int] = []
+        freed = 0
+        for rowid, size in self._conn.execute(
+            "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            victims.append(rowid)
+            freed += size
+            if freed >= excess:
+                break
+        for batch in _batched(victims, _SQL_BATCH_SIZE):
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM embeddings WHERE rowid IN ({placeholders})", batch)
+        self._conn.commit()
+        self._total_bytes -= freed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def normalize_query(query: str) -> str:
+    """查詢正規化：NFKC（全形轉半形）、忽略大小寫、合併空白"""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """查詢向量快取：process 內 LRU，未命中時查磁碟，兩者都沒有才呼叫 API
+
+    命中 / 未命中次數與 last_used 先累積在記憶體，每 QUERY_CACHE_FLUSH_EVERY 次查詢、
+    寫入新查詢或 close 時才寫入磁碟（查詢路徑不必每次 commit），stats 命令（另一個 process）
+    讀到的是最後一次寫入的計數
+    """
+
+    def __init__(
+        self,
+        path: str | Path = QUERY_CACHE_PATH,
+        max_items: int = QUERY_CACHE_MAX_ITEMS,
+        ttl: float = QUERY_CACHE_TTL,
+        memory_items: int = QUERY_CACHE_MEMORY_ITEMS,
+    ):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self._memory: OrderedDict[tuple[str, str, int, str], tuple[np.ndarray, float]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # 尚未寫入磁碟的計數與 last_used
+        self._pending_counts: dict[str, int] = {}
+        self._pending_used: dict[tuple[str, str, int, str], float] = {}
+        self._pending_lookups = 0
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_QUERY_SCHEMA)
+
+    def get(self, embedder: EmbeddingProvider, query: str) -> np.ndarray | None:
+        key = (embedder.name, embedder.model, embedder.dimension, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            vector: np.ndarray | None = None
+            cached = self._memory.get(key)
+            if cached is not None and now - cached[1] < self.ttl:
+                self._memory.move_to_end(key)
+                vector = cached[0]
+            else:
+                self._memory.pop(key, None)
+                row = self._conn.execute(
+                    "SELECT vector, created_at FROM queries WHERE provider = ? AND model = ? "
+                    "AND dimension = ? AND query = ? AND created_at > ?",
+                    (*key, now - self.ttl),
+                ).fetchone()
+                if row is not None and len(row[0]) == embedder.dimension * 4:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector, row[1])
+                    self._pending_used[key] = now
+            name = "hits" if vector is not None else "misses"
+            self._pending_counts[name] = self._pending_counts.get(name, 0) + 1
+            self._pending_lookups += 1
+            if self._pending_lookups >= QUERY_CACHE_FLUSH_EVERY:
+                self._flush()
+        return vector
+
+    def put(self, embedder: EmbeddingProvider, query: str, vector: Any) -> None:
+        key = (embedder.name, embedder.model, embedder.dimension, normalize_query(query))
+        array = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._remember(key, array, now)
+            self._pending_used.pop(key, None)
+            self._flush(commit=False)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries "
+                "(provider, model, dimension, query, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, array.tobytes(), now, now),
+            )
+            # 過期的與超過筆數上限的（最久未使用）一併刪除
+            self._conn.execute("DELETE FROM queries WHERE created_at <= ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM queries WHERE rowid IN (SELECT rowid FROM queries "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_items,),
+            )
+            self._conn.commit()
+
+    def _remember(self, key: tuple[str, str, int, str], vector: np.ndarray, created: float) -> None:
+        self._memory[key] = (vector, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _flush(self, commit: bool = True) -> None:
+        """把累積的計數與 last_used 寫入磁碟（呼叫端持有 _lock）"""
+        if self._pending_used:
+            self._conn.executemany(
+                "UPDATE queries SET last_used = ? WHERE provider = ? AND model = ? "
+                "AND dimension = ? AND query = ?",
+                [(used, *key) for key, used in self._pending_used.items()],
+            )
+        if self._pending_counts:
+            self._conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                list(self._pending_counts.items()),
+            )
+        self._pending_used.clear()
+        self._pending_counts.clear()
+        self._pending_lookups = 0
+        if commit:
+            self._conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            self._flush()
+            entries = self._conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "entries": entries,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+def _batched(items: list[T], size: int) -> list[list[T]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
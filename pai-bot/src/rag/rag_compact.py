@@ -0,0 +1,102 @@
+"""Obsidian RAG compaction - DB 目錄各元件的磁碟用量、孤立的 HNSW 目錄與 SQLite vacuum
+
+Chroma 刪除或重新 upsert chunks 時，HNSW 索引只標記刪除、不回收空間，chroma.sqlite3 的
+embeddings_queue 與已刪除的頁面也會一直累積；刪除 collection 後其 HNSW 目錄仍留在磁碟上。
+向量索引的重建在 ObsidianRAG.compact() 中進行，這裡只處理檔案層級的工作。只使用標準函式庫。
+"""
+
+from __future__ import annotations
+
+import shutil
+import sqlite3
+import uuid
+from pathlib import Path
+
+# 設定
+CHROMA_SQLITE_FILE = "chroma.sqlite3"
+COMPACT_SUFFIX = "__compact"  # 重建中的暫存 collection 名稱後綴
+SQLITE_SUFFIXES = ("", "-wal", "-shm", "-journal")
+
+
+def _is_segment_dir(path: Path) -> bool:
+    """Chroma 的 HNSW 目錄以 segment UUID 命名"""
+    if not path.is_dir():
+        return False
+    try:
+        uuid.UUID(path.name)
+    except ValueError:
+        return False
+    return True
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def vector_segments(db_path: Path) -> dict[str, str]:
+    """{segment UUID: collection 名稱}，只含向量（HNSW）segment；以唯讀方式查詢 chroma.sqlite3"""
+    path = db_path / CHROMA_SQLITE_FILE
+    if not path.exists():
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        rows = conn.execute(
+            "SELECT s.id, c.name FROM segments s JOIN collections c ON s.collection = c.id "
+            "WHERE s.scope = 'VECTOR'"
+        ).fetchall()
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+    return dict(rows)
+
+
+def orphaned_segment_dirs(db_path: Path) -> list[Path]:
+    """不屬於任何 collection 的 HNSW 目錄（已刪除的 collection 留下的）"""
+    segments = vector_segments(db_path)
+    if not segments:
+        # 查不到 segments 時不判斷，避免誤刪
+        return []
+    return sorted(p for p in db_path.iterdir() if _is_segment_dir(p) and p.name not in segments)
+
+
+def db_footprint(db_path: Path) -> dict[str, int]:
+    """DB 目錄各元件的磁碟用量（bytes）
+
+    SQLite 檔案含 -wal / -shm；HNSW 目錄依 collection 分列為 vector:<name>，
+    孤立的目錄合計為 vector:orphaned；最後附上 total
+    """
+    segments = vector_segments(db_path)
+    sizes: dict[str, int] = {}
+    for path in sorted(db_path.iterdir()) if db_path.exists() else []:
+        if _is_segment_dir(path):
+            key = f"vector:{segments.get(path.name, 'orphaned')}"
+            size = _dir_size(path)
+        elif path.is_file():
+            key = path.name
+            for suffix in SQLITE_SUFFIXES[1:]:
+                key = key.removesuffix(suffix)
+            size = path.stat().st_size
+        else:
+            key, size = "other", _dir_size(path)
+        sizes[key] = sizes.get(key, 0) + size
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def remove_orphaned_segments(db_path: Path) -> int:
+    """刪除孤立的 HNSW 目錄，回傳刪除的數量"""
+    orphans = orphaned_segment_dirs(db_path)
+    for path in orphans:
+        shutil.rmtree(path, ignore_errors=True)
+    return len(orphans)
+
+
+def vacuum_sqlite(path: Path) -> None:
+    """VACUUM 並清空 WAL，把已刪除的頁面還給檔案系統"""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
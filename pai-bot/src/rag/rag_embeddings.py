@@ -0,0 +1,193 @@
+"""Obsidian RAG embedding providers
+
+- openai: OpenAI text-embedding-3-small（需要 OPENAI_API_KEY）
+- minilm: 本機 CPU 的 all-MiniLM-L6-v2（chromadb 內建的 ONNX 模型，首次使用會下載）
+- hash: 離線、可重現的 feature hashing，給測試與壓力測試用（不需 API，語意品質有限）
+
+維度可以縮短（--embedding-dim 或 OBSIDIAN_RAG_EMBEDDING_DIM）：text-embedding-3 系列為
+Matryoshka 表示，前 N 維重新正規化即為 N 維的 embedding，已有的完整向量可直接截斷沿用。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, cast
+
+import numpy as np
+from rag_lexical import tokenize
+
+if TYPE_CHECKING:
+    from chromadb.api.types import Embeddable, EmbeddingFunction, Embeddings
+
+EMBEDDING_PROVIDER_ENV = "OBSIDIAN_RAG_EMBEDDING"
+EMBEDDING_DIMENSION_ENV = "OBSIDIAN_RAG_EMBEDDING_DIM"
+DEFAULT_EMBEDDING_PROVIDER = "openai"
+
+
+def get_openai_embedding_function(
+    model: str = "text-embedding-3-small",
+    dimensions: int | None = None,
+) -> EmbeddingFunction[Embeddable]:
+    """取得 OpenAI embedding function（dimensions 只有 text-embedding-3 系列支援）"""
+    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY 環境變數未設定")
+
+    # OpenAIEmbeddingFunction 只接受 list[str]，但 chromadb API 期望 Embeddable
+    # 實際使用時只會傳入 list[str]，所以這個 cast 是安全的
+    return cast(
+        "EmbeddingFunction[Embeddable]",
+        OpenAIEmbeddingFunction(
+            api_key=api_key,
+            model_name=model,
+            dimensions=dimensions,
+        ),
+    )
+
+
+class EmbeddingProvider(ABC):
+    """Embedding provider 介面
+
+    name / model / dimension 會記錄在 collection metadata，用來拒絕混用不同向量空間；
+    full_dimension 為模型的原生維度，dimension 小於它時為縮短後的維度
+    """
+
+    name = ""
+    # 輸出可截斷的模型（Matryoshka）：完整向量截斷到前 N 維並重新正規化即為 N 維的結果
+    TRUNCATABLE_MODELS: tuple[str, ...] = ()
+
+    def __init__(self, model: str, dimension: int, full_dimension: int | None = None):
+        self.model = model
+        self.dimension = dimension
+        self.full_dimension = full_dimension or dimension
+
+    def can_truncate(self) -> bool:
+        return self.model in self.TRUNCATABLE_MODELS
+
+    def with_dimension(self, dimension: int) -> EmbeddingProvider:
+        """同一個模型、不同輸出維度的 provider"""
+        return type(self)(self.model, dimension=dimension)
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> Embeddings:
+        """計算 texts 的 embeddings（順序與輸入相同）"""
+
+    def describe(self) -> str:
+        if self.dimension != self.full_dimension:
+            return f"{self.name}:{self.model}@{self.dimension}"
+        return f"{self.name}:{self.model}"
+
+    def collection_metadata(self) -> dict[str, Any]:
+        return {
+            "embedding_provider": self.name,
+            "embedding_model": self.model,
+            "embedding_dimension": self.dimension,
+        }
+
+
+class OpenAIProvider(EmbeddingProvider):
+    name = "openai"
+    DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+    TRUNCATABLE_MODELS = ("text-embedding-3-small", "text-embedding-3-large")
+
+    def __init__(self, model: str = "text-embedding-3-small", dimension: int | None = None):
+        full_dimension = self.DIMENSIONS.get(model, 1536)
+        super().__init__(model, dimension or full_dimension, full_dimension)
+        _check_dimension(self)
+        shortened = self.dimension if self.dimension != full_dimension else None
+        self._fn = get_openai_embedding_function(model, shortened)
+
+    def embed(self, texts: list[str]) -> Embeddings:
+        return self._fn(cast("Embeddable", texts))
+
+
+class MiniLMProvider(EmbeddingProvider):
+    name = "minilm"
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2", dimension: int | None = None):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        super().__init__(model, dimension or 384, 384)
+        _check_dimension(self)
+        self._fn = ONNXMiniLM_L6_V2()
+
+    def embed(self, texts: list[str]) -> Embeddings:
+        return self._fn(texts)
+
+
+class HashProvider(EmbeddingProvider):
+    """Feature hashing：英數字取單字，CJK 取雙字（bigram），L2 正規化"""
+
+    name = "hash"
+
+    def __init__(self, model: str = "hash-v1", dimension: int | None = None):
+        # 任何維度都直接計算（不是截斷），每個維度都是完整的向量空間
+        super().__init__(model, dimension or 256)
+
+    def _vector(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimension
+        for feature in tokenize(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        if not norm:
+            # 沒有任何 feature（例如只有標點）時給固定方向，避免零向量
+            vector[0], norm = 1.0, 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts: list[str]) -> Embeddings:
+        return [np.array(self._vector(t), dtype=np.float32) for t in texts]
+
+
+def _check_dimension(provider: EmbeddingProvider) -> None:
+    if provider.dimension == provider.full_dimension:
+        return
+    if not provider.can_truncate() or not 0 < provider.dimension < provider.full_dimension:
+        raise ValueError(
+            f"{provider.name}:{provider.model} 不支援 {provider.dimension} 維"
+            f"（原生 {provider.full_dimension} 維）"
+        )
+
+
+def truncate_embedding(vector: Any, dimension: int) -> np.ndarray:
+    """Matryoshka 向量截斷到前 dimension 維並重新 L2 正規化"""
+    truncated = np.asarray(vector, dtype=np.float32)[:dimension]
+    return truncated / (np.linalg.norm(truncated) or 1.0)
+
+
+# 各 provider 以 (model=..., dimension=...) 建立，model 省略時為該 provider 的預設模型
+EMBEDDING_PROVIDERS: dict[str, Callable[..., EmbeddingProvider]] = {
+    "openai": OpenAIProvider,
+    "minilm": MiniLMProvider,
+    "hash": HashProvider,
+}
+
+
+def get_embedding_provider(
+    name: str | None = None, dimension: int | None = None
+) -> EmbeddingProvider:
+    """依名稱建立 provider；未指定時讀取 OBSIDIAN_RAG_EMBEDDING，預設 openai
+
+    dimension 未指定時讀取 OBSIDIAN_RAG_EMBEDDING_DIM，預設為模型的原生維度
+    """
+    name = name or os.environ.get(EMBEDDING_PROVIDER_ENV) or DEFAULT_EMBEDDING_PROVIDER
+    if name not in EMBEDDING_PROVIDERS:
+        choices = ", ".join(EMBEDDING_PROVIDERS)
+        raise ValueError(f"未知的 embedding provider: {name}（可用: {choices}）")
+    if dimension is None and os.environ.get(EMBEDDING_DIMENSION_ENV):
+        try:
+            dimension = int(os.environ[EMBEDDING_DIMENSION_ENV])
+        except ValueError:
+            raise ValueError(f"{EMBEDDING_DIMENSION_ENV} 需為整數") from None
+    return EMBEDDING_PROVIDERS[name](dimension=dimension)
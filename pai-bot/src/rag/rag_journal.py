@@ -0,0 +1,65 @@
+"""Obsidian RAG sync journal - 每個寫入批次的預寫日誌（SQLite）
+
+寫入 Chroma 前先記錄批次要做的操作（upsert / update / delete 的 chunk IDs、檔案 meta、
+連結），全部寫完後才刪除該筆記錄。sync 被中斷（OOM、重啟、API 中斷）時，
+下次啟動會看到未完成的記錄並 roll forward（見 ObsidianRAG._recover_journal），
+已寫入 Chroma 的 chunks 不必重新 embed。記錄不含 chunk 內容與向量。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+# 設定
+JOURNAL_FILE = "journal.sqlite3"  # 放在 Chroma DB 目錄中
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SyncJournal:
+    """未完成批次的記錄（thread-safe）"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 記錄必須在寫入 Chroma 前落地，不使用 synchronous=NORMAL
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+
+    def begin(self, payload: dict[str, Any]) -> int:
+        """記錄即將進行的操作，回傳序號（完成後以 commit 移除）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO entries (payload, created_at) VALUES (?, ?)",
+                (json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+            return int(cursor.lastrowid or 0)
+
+    def commit(self, seq: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE seq = ?", (seq,))
+            self._conn.commit()
+
+    def pending(self) -> list[tuple[int, dict[str, Any]]]:
+        """上次中斷時未完成的記錄，依寫入順序"""
+        with self._lock:
+            rows = self._conn.execute("SELECT seq, payload FROM entries ORDER BY seq").fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,125 @@
+"""Obsidian RAG 關鍵字索引 - BM25（SQLite FTS5）
+
+補足向量搜尋容易漏掉的精確詞：程式識別字、人名、短的中文關鍵字。
+文字先經 tokenize() 轉成詞（英數字與底線為完整單字，CJK 取雙字 bigram），
+以空白串接存入 FTS5，排序使用 FTS5 內建的 bm25()。
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+# 設定
+LEXICAL_INDEX_FILE = "lexical.sqlite3"  # 放在 Chroma DB 目錄中
+RRF_K = 60  # reciprocal rank fusion 常數
+_SQL_BATCH_SIZE = 500
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_CJK_RUN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    rowid INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(
+    terms, tokenize = "unicode61 tokenchars '_'"
+);
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """英數字取單字（保留底線），CJK 連續字元取 bigram（單一字元時取該字）"""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        tokens.extend(run[i : i + 2] for i in range(max(1, len(run) - 1)))
+    return tokens
+
+
+def reciprocal_rank_fusion(*rankings: Iterable[str], k: int = RRF_K) -> dict[str, float]:
+    """合併多個排序結果：score = Σ 1 / (k + rank)"""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+class LexicalIndex:
+    """chunk ID -> 詞的倒排索引（thread-safe）"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def count(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            return int(row[0])
+
+    def upsert(self, ids: list[str], documents: list[str]) -> None:
+        with self._lock:
+            self._delete(ids)
+            for chunk_id, document in zip(ids, documents):
+                cursor = self._conn.execute("INSERT INTO chunks (chunk_id) VALUES (?)", (chunk_id,))
+                self._conn.execute(
+                    "INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)",
+                    (cursor.lastrowid, " ".join(tokenize(document))),
+                )
+            self._conn.commit()
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+
+    def _delete(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), _SQL_BATCH_SIZE):
+            batch = ids[i : i + _SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rowids = [
+                (rowid,)
+                for (rowid,) in self._conn.execute(
+                    f"SELECT rowid FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                )
+            ]
+            self._conn.executemany("DELETE FROM chunk_terms WHERE rowid = ?", rowids)
+            self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", rowids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_terms")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        """BM25 搜尋，回傳 [(chunk_id, score)]，score 越高越相關"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        # 單一 CJK 字元沒有 bigram，以前綴比對包含該字開頭的詞
+        match = " OR ".join(
+            f'"{t}"*' if _CJK_RUN_RE.fullmatch(t) and len(t) == 1 else f'"{t}"' for t in terms
+        )
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunks.chunk_id, bm25(chunk_terms) FROM chunk_terms "
+                "JOIN chunks ON chunks.rowid = chunk_terms.rowid "
+                "WHERE chunk_terms MATCH ? ORDER BY bm25(chunk_terms) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        # FTS5 的 bm25() 越小越相關
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
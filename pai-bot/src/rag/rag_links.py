@@ -0,0 +1,137 @@
+"""Obsidian RAG 連結圖索引 - [[wikilinks]] 的正向連結與反向連結（SQLite）
+
+每個檔案的對外連結在 sync 時逐檔更新；連結目標以正規化後的名稱儲存，
+查詢時才對應到實際檔案（[[資料夾/筆記]] 比對完整路徑，[[筆記]] 比對檔名），
+因此之後新增的筆記不需要重新解析其他檔案也能被連到。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path, PurePosixPath
+
+# 設定
+LINK_INDEX_FILE = "links.sqlite3"  # 放在 Chroma DB 目錄中
+_SQL_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    path TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    stem TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_key ON notes (key);
+CREATE INDEX IF NOT EXISTS notes_stem ON notes (stem);
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (source, target)
+);
+CREATE INDEX IF NOT EXISTS links_target ON links (target);
+"""
+
+
+def link_key(target: str) -> str:
+    """連結目標或檔案路徑的正規化名稱：小寫、去掉 .md 與開頭的 /"""
+    key = target.strip().strip("/").lower()
+    return key[:-3] if key.endswith(".md") else key
+
+
+class LinkIndex:
+    """筆記間的連結圖（thread-safe）"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def count(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM notes").fetchone()
+            return int(row[0])
+
+    def update(self, files: dict[str, list[str]]) -> None:
+        """更新檔案的對外連結，files 為 {rel_path: 連結目標（可重複，次數即權重）}"""
+        if not files:
+            return
+        with self._lock:
+            for rel_path, targets in files.items():
+                key = link_key(rel_path)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO notes (path, key, stem) VALUES (?, ?, ?)",
+                    (rel_path, key, PurePosixPath(key).name),
+                )
+                self._conn.execute("DELETE FROM links WHERE source = ?", (rel_path,))
+                weights = Counter(link_key(t) for t in targets)
+                weights.pop(key, None)  # 忽略連到自己
+                self._conn.executemany(
+                    "INSERT INTO links (source, target, weight) VALUES (?, ?, ?)",
+                    [(rel_path, target, weight) for target, weight in weights.items() if target],
+                )
+            self._conn.commit()
+
+    def delete(self, rel_paths: list[str]) -> None:
+        """移除檔案與其對外連結（其他筆記連到它的連結保留，檔案重新出現時會再對應上）"""
+        with self._lock:
+            for i in range(0, len(rel_paths), _SQL_BATCH_SIZE):
+                batch = rel_paths[i : i + _SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM notes WHERE path IN ({placeholders})", batch)
+                self._conn.execute(f"DELETE FROM links WHERE source IN ({placeholders})", batch)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM notes")
+            self._conn.execute("DELETE FROM links")
+            self._conn.commit()
+
+    def neighbors(self, rel_paths: list[str], limit: int) -> list[tuple[str, int, list[str]]]:
+        """一步可達的筆記（正向 + 反向連結），依連結權重加總排序
+
+        回傳 [(rel_path, weight, 連到它的來源筆記)]，不包含 rel_paths 本身
+        """
+        weights: Counter[str] = Counter()
+        via: dict[str, set[str]] = {}
+        with self._lock:
+            for rel_path in rel_paths:
+                key = link_key(rel_path)
+                stem = PurePosixPath(key).name
+                # 正向：[[資料夾/筆記]] 比對完整路徑，[[筆記]] 比對檔名
+                forward = self._conn.execute(
+                    "SELECT notes.path, links.weight FROM links "
+                    "JOIN notes ON notes.key = links.target WHERE links.source = ? "
+                    "UNION ALL "
+                    "SELECT notes.path, links.weight FROM links "
+                    "JOIN notes ON notes.stem = links.target "
+                    "WHERE links.source = ? AND notes.key != links.target "
+                    "AND links.target NOT LIKE '%/%'",
+                    (rel_path, rel_path),
+                ).fetchall()
+                # 反向：其他筆記以完整路徑或檔名連到這篇
+                backward = self._conn.execute(
+                    "SELECT source, weight FROM links WHERE target = ? OR target = ?",
+                    (key, stem),
+                ).fetchall()
+                for neighbor, weight in forward + backward:
+                    if neighbor == rel_path:
+                        continue
+                    weights[neighbor] += weight
+                    via.setdefault(neighbor, set()).add(rel_path)
+
+        for rel_path in rel_paths:
+            weights.pop(rel_path, None)
+        return [
+            (neighbor, weight, sorted(via[neighbor]))
+            for neighbor, weight in weights.most_common(limit)
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,123 @@
+"""Obsidian RAG writer lease - DB 目錄的單一 writer 鎖（fcntl.flock）
+
+sync / compact 等寫入操作需持有 lease（watch 只在每批同步時持有）；搜尋與 stats 不取得 lease，
+直接讀取最後寫入的狀態。
+鎖由作業系統在 process 結束時釋放（含被 kill），不會留下過期的鎖。
+鎖檔內容記錄持有者（pid、命令、開始時間），讓其他 process 回報「sync 進行中」。
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+# 設定
+WRITER_LOCK_FILE = "writer.lock"  # 放在 Chroma DB 目錄中
+LOCK_POLL_INTERVAL = 0.5  # 等待 lease 時的檢查間隔（秒）
+
+
+class SyncInProgressError(RuntimeError):
+    """另一個 process 正持有 writer lease"""
+
+    def __init__(self, holder: dict[str, Any] | None):
+        self.holder = holder or {}
+        pid = self.holder.get("pid", "?")
+        started = self.holder.get("started_at", "?")
+        super().__init__(f"sync 進行中（pid {pid}，開始於 {started}）")
+
+
+class WriterLease:
+    """可重入的 writer lease（同一個 process 內以計數巢狀取得）"""
+
+    def __init__(self, path: str | Path, command: str | None = None):
+        self.path = Path(path).expanduser()
+        self.command = command  # 記錄在鎖檔中的命令名稱（如 sync、watch）
+        self._lock = threading.Lock()
+        self._fd: int | None = None
+        self._depth = 0
+
+    def acquire(self, timeout: float | None = 0) -> bool:
+        """取得 lease；timeout=0 不等待，None 一直等待。取得失敗回傳 False"""
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        os.close(fd)
+                        return False
+                    time.sleep(LOCK_POLL_INTERVAL)
+            holder = {
+                "pid": os.getpid(),
+                "command": self.command or "-",
+                "started_at": datetime.now(tz=timezone.utc).isoformat(),
+            }
+            data = json.dumps(holder).encode()
+            # 先覆寫再截斷，讀取端不會看到空的鎖檔
+            os.pwrite(fd, data, 0)
+            os.ftruncate(fd, len(data))
+            self._fd = fd
+            self._depth = 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._depth:
+                return
+            self._depth -= 1
+            if self._depth or self._fd is None:
+                return
+            os.ftruncate(self._fd, 0)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def held(self) -> bool:
+        return bool(self._depth)
+
+    def holder(self) -> dict[str, Any] | None:
+        """目前持有 lease 的 process 資訊；沒有人持有時回傳 None
+
+        只讀取鎖檔內容、不對鎖檔加鎖，避免探測時擋住正在取得 lease 的 writer。
+        釋放時會清空內容；被 kill 留下的內容以 pid 是否仍存在判斷過期。
+        """
+        try:
+            data = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if not data:
+            return None
+        try:
+            holder = json.loads(data)
+        except ValueError:
+            # 持有者正在寫入鎖檔
+            return {}
+        if not isinstance(holder, dict):
+            return {}
+        pid = holder.get("pid")
+        if not self._depth and isinstance(pid, int) and not _pid_alive(pid):
+            return None
+        return holder
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 其他使用者的 process
+        return True
+    return True
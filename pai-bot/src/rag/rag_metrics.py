@@ -0,0 +1,88 @@
+"""Obsidian RAG 同步指標 - 各階段耗時、資料量、embedding 延遲與重試次數
+
+階段（phase）耗時為各 thread 的累計時間：讀檔、chunk 與 embedding 在管線中併行，
+加總會大於 wall time，用來比較哪個階段最花時間。
+指標可附加到 JSONL 檔（每次 sync 一行），用來追蹤 sync 成本的變化。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+# 設定
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """nearest-rank 百分位數（values 需已排序且非空）"""
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[rank - 1]
+
+
+class SyncMetrics:
+    """單次 sync 的指標（thread-safe）"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.embed_latencies: list[float] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """計時一個階段，累加到 phases[name]"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def observe_embed(self, seconds: float) -> None:
+        """記錄一次 embedding 請求的延遲（不含限速等待與重試的退避時間）"""
+        with self._lock:
+            self.embed_latencies.append(seconds)
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.embed_latencies)
+            result: dict[str, Any] = {
+                "wall_seconds": round(self.elapsed(), 3),
+                "phases": {name: round(s, 3) for name, s in sorted(self.phases.items())},
+                "counts": dict(sorted(self.counts.items())),
+            }
+        embed_latency: dict[str, Any] = {"count": len(latencies)}
+        if latencies:
+            for p in LATENCY_PERCENTILES:
+                embed_latency[f"p{p}"] = round(percentile(latencies, p), 3)
+            embed_latency["max"] = round(latencies[-1], 3)
+        result["embed_latency"] = embed_latency
+        return result
+
+
+def append_metrics(path: str | Path, record: dict[str, Any]) -> None:
+    """將一次 sync 的指標附加到 JSONL 檔（自動加上 timestamp）"""
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(
+        {"timestamp": datetime.now(tz=timezone.utc).isoformat(), **record}, ensure_ascii=False
+    )
+    with path.open("a", encoding="utf-8") as f:
+        f.write(line + "\n")
@@ -0,0 +1,147 @@
+"""Obsidian RAG 同步管線 - 限速、重試與單一 writer 的批次處理"""
+
+from __future__ import annotations
+
+import queue
+import random
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+B = TypeVar("B")
+E = TypeVar("E")
+
+# 設定
+EMBED_MAX_RETRIES = 5
+EMBED_BACKOFF_BASE = 1.0  # 秒，每次重試加倍
+EMBED_BACKOFF_MAX = 60.0
+RATE_WINDOW = 60.0  # RPM / TPM 的計算視窗（秒）
+
+
+class RateLimiter:
+    """requests-per-minute 與 tokens-per-minute 限制（60 秒滑動視窗，thread-safe）
+
+    rpm / tpm 設為 0 表示不限制
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events: deque[tuple[float, int]] = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> None:
+        """等到視窗內還有額度，再記錄這次請求"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and self._events[0][0] <= now - RATE_WINDOW:
+                    self._tokens -= self._events.popleft()[1]
+
+                rpm_ok = not self.rpm or len(self._events) < self.rpm
+                # 單一請求超過 TPM 時，等視窗清空後放行，避免永遠卡住
+                tpm_ok = not self.tpm or not self._events or self._tokens + tokens <= self.tpm
+                if rpm_ok and tpm_ok:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                wait = self._events[0][0] + RATE_WINDOW - now
+            time.sleep(max(wait, 0.01))
+
+
+def call_with_retry(
+    fn: Callable[[], R],
+    label: str,
+    max_retries: int = EMBED_MAX_RETRIES,
+    on_retry: Callable[[], None] | None = None,
+) -> R:
+    """執行 fn，失敗時以指數退避（含 jitter）重試；每次重試前呼叫 on_retry（統計用）"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * 2**attempt)
+            delay *= 0.5 + random.random() / 2
+            print(
+                f"  {label} 失敗，{delay:.1f}s 後重試 ({attempt + 1}/{max_retries}): {e}",
+                file=sys.stderr,
+            )
+            if on_retry is not None:
+                on_retry()
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def bounded_map(
+    executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    """類似 executor.map，但最多只預先提交 window 個工作，結果依輸入順序回傳"""
+    pending: deque[Future[R]] = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class SyncPipeline(Generic[B, E]):
+    """併發 embedding + 單一 writer 的批次管線
+
+    submit() 的批次會在 embed pool 中併發 embed，writer thread 依提交順序逐批寫入；
+    writer 佇列有上限，embedding 跟不上時 submit() 會阻塞（backpressure）。
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[B], E],
+        write: Callable[[B, E | None], None],
+        concurrency: int,
+        has_work: Callable[[B], bool] = lambda _: True,
+    ):
+        self._embed = embed
+        self._write = write
+        self._has_work = has_work
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+        self._queue: queue.Queue[tuple[B, Future[E] | None] | None] = queue.Queue(
+            maxsize=concurrency * 2
+        )
+        self._error: BaseException | None = None
+        self._writer = threading.Thread(target=self._write_loop, name="writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, batch: B) -> None:
+        if self._error is not None:
+            raise self._error
+        future = self._pool.submit(self._embed, batch) if self._has_work(batch) else None
+        self._queue.put((batch, future))
+
+    def close(self) -> None:
+        """等待所有批次寫入完成；任何階段失敗都會在這裡拋出"""
+        self._queue.put(None)
+        self._writer.join()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._error is not None:
+            raise self._error
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue  # 已失敗：只清空佇列，不再寫入
+            batch, future = item
+            try:
+                self._write(batch, future.result() if future is not None else None)
+            except BaseException as e:
+                self._error = e
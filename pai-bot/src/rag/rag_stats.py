@@ -0,0 +1,32 @@
+"""Obsidian RAG 統計快照 - sync 完成時寫入，stats 命令直接讀取
+
+快照是 Chroma DB 目錄中的一個 JSON 檔（檔案數、chunk 數、各資料夾統計、上次 sync 的時間
+與耗時），讀取時不需要載入 chromadb 或開啟 PersistentClient。只使用標準函式庫。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+# 設定
+STATS_SNAPSHOT_FILE = "stats.json"  # 放在 Chroma DB 目錄中
+
+
+def write_snapshot(path: str | Path, snapshot: dict[str, Any]) -> None:
+    """寫入快照：先寫暫存檔再 rename，讀取端不會讀到寫到一半的檔案"""
+    path = Path(path).expanduser()
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(snapshot, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str | Path) -> dict[str, Any] | None:
+    """讀取快照；不存在或無法解析時回傳 None"""
+    try:
+        snapshot = json.loads(Path(path).expanduser().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return snapshot if isinstance(snapshot, dict) else None
@@ -0,0 +1,78 @@
+"""Obsidian RAG watch 模式 - 監看 vault 檔案變更
+
+優先使用 watchfiles（inotify / FSEvents），未安裝或指定 --poll 時改用輪詢。
+產生的每一組變更都已 debounce，內容是相對於 vault 的路徑（檔案或資料夾）。
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from obsidian_vault import is_hidden, walk_markdown
+
+# 設定
+WATCH_DEBOUNCE = 2.0  # 秒，連續寫入在這段時間內合併成一次同步
+WATCH_POLL_INTERVAL = 10.0  # 秒，輪詢模式的掃描間隔
+
+
+def _snapshot(vault_path: Path) -> dict[str, tuple[int, int]]:
+    """掃描 vault 的 markdown 檔案，回傳 {rel_path: (mtime_ns, size)}；不進入隱藏資料夾"""
+    return {rel_path: (st.st_mtime_ns, st.st_size) for rel_path, st in walk_markdown(vault_path)}
+
+
+def _poll_changes(vault_path: Path, debounce: float, interval: float) -> Iterator[set[str]]:
+    previous = _snapshot(vault_path)
+    while True:
+        time.sleep(interval)
+        current = _snapshot(vault_path)
+        changed = {p for p in previous.keys() | current.keys() if previous.get(p) != current.get(p)}
+        # 有變更時持續觀察，直到 debounce 時間內沒有新的寫入
+        while changed:
+            time.sleep(debounce)
+            latest = _snapshot(vault_path)
+            more = {p for p in current.keys() | latest.keys() if current.get(p) != latest.get(p)}
+            current = latest
+            if not more:
+                break
+            changed |= more
+        previous = current
+        if changed:
+            yield changed
+
+
+def _event_changes(vault_path: Path, debounce: float) -> Iterator[set[str]]:
+    from watchfiles import watch
+
+    for events in watch(vault_path, debounce=int(debounce * 1000), step=200):
+        changed: set[str] = set()
+        for _, path in events:
+            rel_path = os.path.relpath(path, vault_path)
+            if rel_path.startswith("..") or is_hidden(rel_path):
+                continue
+            # 資料夾整個搬移 / 刪除時只會收到資料夾本身的事件，資料夾名稱也可能含 .
+            # （v1.2/、2024.01/），不依副檔名過濾，由 sync_paths 判斷是檔案還是資料夾
+            changed.add(rel_path)
+        if changed:
+            yield changed
+
+
+def watch_vault_changes(
+    vault_path: Path,
+    debounce: float = WATCH_DEBOUNCE,
+    poll_interval: float = WATCH_POLL_INTERVAL,
+    force_polling: bool = False,
+) -> Iterator[set[str]]:
+    """持續產生 debounce 後的變更路徑集合"""
+    if not force_polling:
+        try:
+            import watchfiles  # noqa: F401
+        except ImportError:
+            print("watchfiles 未安裝，改用輪詢模式", file=sys.stderr)
+        else:
+            yield from _event_changes(vault_path, debounce)
+            return
+    yield from _poll_changes(vault_path, debounce, poll_interval)
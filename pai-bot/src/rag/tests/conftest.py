@@ -0,0 +1,45 @@
+"""pytest fixtures"""
+
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+# RAG 腳本以檔名互相 import（與 scripts/obsidian_index.py 相同）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from obsidian_rag import ObsidianRAG  # noqa: E402
+from rag_embeddings import HashProvider  # noqa: E402
+
+
+@pytest.fixture
+def vault(tmp_path: Path) -> Path:
+    """建立含數篇筆記的 vault"""
+    root = tmp_path / "vault"
+    (root / "Projects").mkdir(parents=True)
+    (root / ".obsidian").mkdir()
+    for i in range(5):
+        (root / "Projects" / f"n{i}.md").write_text(
+            f"# Note {i}\n\n連到 [[n{(i + 1) % 5}]]。\n\n" + f"Paragraph about topic{i}. " * 40,
+            encoding="utf-8",
+        )
+    (root / ".obsidian" / "hidden.md").write_text("hidden", encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def make_rag(tmp_path: Path, vault: Path) -> Callable[..., ObsidianRAG]:
+    """建立 ObsidianRAG（hash embedding，快取與 manifest 都放在暫存目錄）"""
+
+    def make(db: str = "db", **kwargs: object) -> ObsidianRAG:
+        options = {
+            "embedding": HashProvider(),
+            "embed_cache": tmp_path / "embed_cache.sqlite3",
+            "query_cache_size": 0,
+            "manifest_path": tmp_path / "manifest.json",
+            **kwargs,
+        }
+        return ObsidianRAG(vault, tmp_path / db, **options)  # type: ignore[arg-type]
+
+    return make
@@ -0,0 +1,60 @@
+"""測試 embedding 快取與查詢向量快取"""
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+from rag_cache import EmbeddingCache, QueryEmbeddingCache
+from rag_embeddings import HashProvider
+
+
+def _disk_counters(path: Path) -> dict[str, int]:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT name, value FROM counters").fetchall())
+
+
+class TestEmbeddingCache:
+    """chunk embedding 快取測試"""
+
+    def test_round_trip(self, tmp_path: Path) -> None:
+        """測試寫入的向量可由新的實例取回，未寫入的為 None"""
+        embedder = HashProvider()
+        vectors = embedder.embed(["alpha", "beta"])
+        cache = EmbeddingCache(tmp_path / "embed.sqlite3")
+        cache.put_many(embedder, ["alpha", "beta"], vectors)
+        cache.close()
+
+        cache = EmbeddingCache(tmp_path / "embed.sqlite3")
+        found = cache.get_many(embedder, ["beta", "gamma"])
+        assert found[0] is not None and np.allclose(found[0], vectors[1])
+        assert found[1] is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+class TestQueryEmbeddingCache:
+    """查詢向量快取測試"""
+
+    def test_hit_from_disk(self, tmp_path: Path) -> None:
+        """測試查詢正規化後命中，另一個實例從磁碟取回"""
+        embedder = HashProvider()
+        vector = embedder.embed(["Reading List"])[0]
+        cache = QueryEmbeddingCache(tmp_path / "queries.sqlite3")
+        cache.put(embedder, "Reading List", vector)
+        cache.close()
+
+        cache = QueryEmbeddingCache(tmp_path / "queries.sqlite3")
+        found = cache.get(embedder, "  reading   list ")
+        assert found is not None and np.allclose(found, vector)
+        assert cache.get(embedder, "something else") is None
+        assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+    def test_counters_flushed_lazily(self, tmp_path: Path) -> None:
+        """測試查詢不會每次都寫入磁碟，close 時才寫入累積的計數"""
+        path = tmp_path / "queries.sqlite3"
+        cache = QueryEmbeddingCache(path)
+        for _ in range(3):
+            cache.get(HashProvider(), "missing")
+        assert _disk_counters(path) == {}
+
+        cache.close()
+        assert _disk_counters(path) == {"misses": 3}
@@ -0,0 +1,40 @@
+"""測試 chunk_markdown"""
+
+import random
+
+from obsidian_rag import chunk_markdown, chunk_text, estimate_tokens, split_chunks
+
+
+class TestChunkMarkdown:
+    """markdown chunker 測試"""
+
+    def test_separators_count_toward_budget(self) -> None:
+        """測試區塊之間的空行計入 token 預算"""
+        text = "\n\n".join(["abcdefghijklmno"] * 8) + "\n"
+        chunks = chunk_markdown(text, max_tokens=16)
+        assert len(chunks) > 1
+        assert all(estimate_tokens(c["text"]) <= 16 for c in chunks)
+
+    def test_max_tokens_is_hard_limit(self) -> None:
+        """測試中英混合的隨機內容，每個 chunk 都不超過 max_tokens 且對應原文的 bytes"""
+        rng = random.Random(0)
+        words = ["alpha", "beta", "中文", "測試內容", "長句子。", "end.", "# H", "```", "- item"]
+        for _ in range(200):
+            paragraphs = [
+                " ".join(rng.choice(words) for _ in range(rng.randint(1, 20)))
+                for _ in range(rng.randint(1, 30))
+            ]
+            text = "\n\n".join(paragraphs)
+            max_tokens = rng.choice([16, 33, 64])
+            data = text.encode()
+            for chunk in chunk_markdown(text, max_tokens):
+                assert estimate_tokens(chunk["text"]) <= max_tokens
+                assert data[chunk["start_byte"] : chunk["end_byte"]].decode() == chunk["text"]
+
+    def test_default_strategy_is_paragraph(self) -> None:
+        """測試預設仍使用舊版段落切分（markdown 需明確指定），升級後不會重新 embed 整個 vault"""
+        text = "# Title\n\n" + "\n\n".join(f"Paragraph {i}. " * 30 for i in range(5))
+        chunks = split_chunks(text)
+        assert [c["text"] for c in chunks] == chunk_text(text)
+        assert all(c["start_byte"] == -1 for c in chunks)
+        assert split_chunks(text, "markdown") == chunk_markdown(text)
@@ -0,0 +1,44 @@
+"""測試 ObsidianRAG.compact"""
+
+from collections.abc import Callable
+
+from obsidian_rag import ObsidianRAG, _hnsw_config
+
+
+class TestCompact:
+    """compact 測試"""
+
+    def test_contents_and_settings_survive_swap(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試替換後筆數、ID、向量空間與指定的 HNSW 參數都保留"""
+        rag = make_rag()
+        rag.sync()
+        before = {
+            c.name: (sorted(c.get(include=[])["ids"]), c.metadata)
+            for c in (rag.collection, rag.meta_collection, rag.note_collection)
+        }
+
+        result = make_rag(hnsw={"obsidian_vault": {"M": 24}}).compact(probe_queries=2)
+
+        reopened = make_rag()
+        after = {
+            c.name: (sorted(c.get(include=[])["ids"]), c.metadata)
+            for c in (reopened.collection, reopened.meta_collection, reopened.note_collection)
+        }
+        assert after == before
+        assert result["collections"] == {name: len(ids) for name, (ids, _) in before.items()}
+        hnsw = _hnsw_config(reopened.collection)
+        assert hnsw["space"] == "cosine"
+        assert hnsw["max_neighbors"] == 24
+        assert [c.name for c in reopened.client.list_collections() if "__" in c.name] == []
+
+    def test_reader_recovers_after_swap(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試其他實例 compact 後，已開啟的實例搜尋時重新取得 collections"""
+        reader = make_rag()
+        reader.sync()
+        expected = reader.search("topic2", top_k=5)
+
+        make_rag().compact(probe_queries=0)
+
+        results = reader.search("topic2", top_k=5)
+        assert results[0] == expected[0]
+        assert {r["id"] for r in results} == {r["id"] for r in expected}
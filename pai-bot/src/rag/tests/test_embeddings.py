@@ -0,0 +1,32 @@
+"""測試 embedding providers"""
+
+import numpy as np
+import pytest
+from rag_embeddings import (
+    EMBEDDING_DIMENSION_ENV,
+    HashProvider,
+    get_embedding_provider,
+    truncate_embedding,
+)
+
+
+class TestEmbeddingProviders:
+    """provider registry 測試"""
+
+    def test_get_provider_by_name(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """測試依名稱建立 provider，維度可由環境變數指定"""
+        monkeypatch.setenv(EMBEDDING_DIMENSION_ENV, "64")
+        provider = get_embedding_provider("hash")
+        assert isinstance(provider, HashProvider)
+        assert provider.dimension == 64
+        assert len(provider.embed(["hello world"])[0]) == 64
+
+    def test_unknown_provider(self) -> None:
+        """測試未知的 provider 名稱"""
+        with pytest.raises(ValueError, match="未知的 embedding provider"):
+            get_embedding_provider("nope")
+
+    def test_truncate_embedding_normalized(self) -> None:
+        """測試截斷後的向量重新 L2 正規化"""
+        vector = truncate_embedding([3.0, 4.0, 12.0], 2)
+        assert np.allclose(vector, [0.6, 0.8])
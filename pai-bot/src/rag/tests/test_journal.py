@@ -0,0 +1,35 @@
+"""測試 sync journal 的中斷恢復"""
+
+from collections.abc import Callable
+from unittest.mock import patch
+
+import pytest
+from obsidian_rag import ObsidianRAG
+from rag_embeddings import HashProvider
+
+
+class TestJournalRecovery:
+    """中斷的寫入批次 roll forward 測試"""
+
+    def test_interrupted_batch_rolled_forward(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試 upsert 後中斷的批次在重新開啟後補完，collections 一致且不重新 embed"""
+        rag = make_rag(embed_cache_size=0)
+        with (
+            patch.object(ObsidianRAG, "_update_note_vectors", side_effect=RuntimeError("中斷")),
+            pytest.raises(RuntimeError),
+        ):
+            rag.sync()
+        assert rag.journal.pending()
+        assert rag.collection.count() == 5
+        assert rag.meta_collection.count() == 0
+
+        reopened = make_rag(embed_cache_size=0)
+        with patch.object(HashProvider, "embed", side_effect=AssertionError("不應呼叫")):
+            stats = reopened.sync()
+
+        assert reopened.metrics.counts["journal_recovered"] == 1
+        assert stats["unchanged"] == 5
+        assert not reopened.journal.pending()
+        assert reopened.meta_collection.count() == 5
+        assert reopened.note_collection.count() == 5
+        assert reopened.lexical.count() == reopened.collection.count() == 5
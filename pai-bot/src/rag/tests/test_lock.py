@@ -0,0 +1,36 @@
+"""測試 WriterLease"""
+
+import json
+from pathlib import Path
+
+from rag_lock import WriterLease
+
+
+class TestWriterLease:
+    """writer lease 測試"""
+
+    def test_holder_records_command(self, tmp_path: Path) -> None:
+        """測試鎖檔記錄傳入的命令名稱，其他 lease 讀得到持有者"""
+        lease = WriterLease(tmp_path / "writer.lock", command="sync")
+        assert lease.acquire()
+        try:
+            holder = WriterLease(tmp_path / "writer.lock").holder()
+            assert holder is not None
+            assert holder["command"] == "sync"
+            assert not WriterLease(tmp_path / "writer.lock").acquire()
+        finally:
+            lease.release()
+        assert WriterLease(tmp_path / "writer.lock").holder() is None
+
+    def test_stale_holder_ignored(self, tmp_path: Path) -> None:
+        """測試被 kill 的 process 留下的鎖檔內容不視為持有中"""
+        path = tmp_path / "writer.lock"
+        path.write_text(json.dumps({"pid": 2**22 + 1, "command": "sync"}))
+        assert WriterLease(path).holder() is None
+        assert WriterLease(path).acquire()
+
+    def test_malformed_holder(self, tmp_path: Path) -> None:
+        """測試鎖檔內容不是 JSON 物件時回傳空的持有者資訊"""
+        path = tmp_path / "writer.lock"
+        path.write_text("[1, 2]")
+        assert WriterLease(path).holder() == {}
@@ -0,0 +1,20 @@
+"""測試 ObsidianRAG.migrate"""
+
+from collections.abc import Callable
+
+from obsidian_rag import ObsidianRAG
+from rag_embeddings import HashProvider
+
+
+class TestMigrate:
+    """migrate 測試"""
+
+    def test_reopen_uses_migrated_dimension(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試 migrate 縮短維度後，未指定維度開啟時沿用 collection 記錄的維度"""
+        make_rag(embedding="hash").sync()
+        make_rag(readonly=True).migrate(HashProvider(dimension=64))
+
+        rag = make_rag(embedding="hash")
+        assert rag.embedder is not None
+        assert rag.embedder.dimension == 64
+        assert rag.search("topic1", top_k=1)
@@ -0,0 +1,107 @@
+"""測試同步管線"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from rag_pipeline import RateLimiter, SyncPipeline, bounded_map, call_with_retry
+
+
+class TestSyncPipeline:
+    """SyncPipeline 測試"""
+
+    def test_writes_in_submit_order(self) -> None:
+        """測試 embedding 併發完成的順序不同時，writer 仍依提交順序寫入"""
+        written: list[tuple[int, int]] = []
+
+        def embed(n: int) -> int:
+            time.sleep(0.01 * (5 - n))  # 先提交的批次較晚完成
+            return n * 10
+
+        pipeline: SyncPipeline[int, int] = SyncPipeline(
+            embed, lambda n, e: written.append((n, e or 0)), concurrency=4
+        )
+        for n in range(5):
+            pipeline.submit(n)
+        pipeline.close()
+        assert written == [(n, n * 10) for n in range(5)]
+
+    def test_skips_embedding_without_work(self) -> None:
+        """測試 has_work 為 False 的批次不送 embedding，寫入時 embeddings 為 None"""
+        written: list[tuple[int, int | None]] = []
+        pipeline: SyncPipeline[int, int] = SyncPipeline(
+            lambda n: n, lambda n, e: written.append((n, e)), 2, has_work=lambda n: n > 0
+        )
+        pipeline.submit(0)
+        pipeline.submit(1)
+        pipeline.close()
+        assert written == [(0, None), (1, 1)]
+
+    def test_embed_error_raised_on_close(self) -> None:
+        """測試 embedding 失敗時 close() 拋出錯誤，之後的批次不再寫入"""
+        written: list[int] = []
+
+        def embed(n: int) -> int:
+            if n == 1:
+                raise RuntimeError("boom")
+            return n
+
+        pipeline: SyncPipeline[int, int] = SyncPipeline(
+            embed, lambda n, e: written.append(n), concurrency=1
+        )
+        for n in range(3):
+            try:
+                pipeline.submit(n)
+            except RuntimeError:
+                break
+        with pytest.raises(RuntimeError, match="boom"):
+            pipeline.close()
+        assert written == [0]
+
+
+class TestHelpers:
+    """bounded_map / call_with_retry / RateLimiter 測試"""
+
+    def test_bounded_map_window(self) -> None:
+        """測試 bounded_map 依輸入順序回傳，且同時提交的工作不超過 window"""
+        running = peak = 0
+        lock = threading.Lock()
+
+        def work(n: int) -> int:
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.005)
+            with lock:
+                running -= 1
+            return n * n
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(bounded_map(pool, work, range(20), window=3)) == [n * n for n in range(20)]
+        assert peak <= 3
+
+    def test_call_with_retry(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """測試失敗後重試直到成功，每次重試呼叫 on_retry"""
+        monkeypatch.setattr("rag_pipeline.time.sleep", lambda _: None)
+        attempts: list[int] = []
+        retries: list[int] = []
+
+        def flaky() -> str:
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("temporary")
+            return "ok"
+
+        assert call_with_retry(flaky, "test", on_retry=lambda: retries.append(1)) == "ok"
+        assert len(attempts) == 3
+        assert len(retries) == 2
+
+    def test_rate_limiter_unlimited(self) -> None:
+        """測試 rpm / tpm 為 0 時不等待"""
+        limiter = RateLimiter(0, 0)
+        started = time.monotonic()
+        for _ in range(100):
+            limiter.acquire(10_000)
+        assert time.monotonic() - started < 0.5
@@ -0,0 +1,197 @@
+"""測試 ObsidianRAG.search"""
+
+import os
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from obsidian_rag import (
+    EXPAND_MAX_TOKENS,
+    ObsidianRAG,
+    build_where,
+    estimate_tokens,
+    mmr_select,
+)
+from rag_embeddings import HashProvider
+
+
+@pytest.fixture
+def rag(make_rag: Callable[..., ObsidianRAG]) -> ObsidianRAG:
+    """已同步的 ObsidianRAG"""
+    rag = make_rag()
+    rag.sync()
+    return rag
+
+
+class TestHybrid:
+    """hybrid（向量 + BM25）搜尋測試"""
+
+    def test_keyword_only_match_ranked_by_lexical(self, rag: ObsidianRAG) -> None:
+        """測試只由 BM25 找到的 chunk 依關鍵字排序，並補上內容與向量 distance"""
+        output = rag._fuse_lexical("topic3", rag._embed_query("topic3"), {}, None, 10, 3)
+
+        assert output[0]["file_path"] == "Projects/n3.md"
+        assert "topic3" in output[0]["chunk"]
+        assert 0.0 <= output[0]["distance"] <= 2.0
+        assert [r["score"] for r in output] == sorted((r["score"] for r in output), reverse=True)
+
+    def test_hybrid_search(self, rag: ObsidianRAG) -> None:
+        """測試 hybrid 搜尋的第一名是含有關鍵字的筆記"""
+        results = rag.search("topic3", top_k=3, mode="hybrid")
+        assert results[0]["file_path"] == "Projects/n3.md"
+
+
+class TestExpand:
+    """結果擴展（相鄰 chunks 合併成段落）測試"""
+
+    @pytest.fixture
+    def long_rag(self, make_rag: Callable[..., ObsidianRAG], vault: Path) -> ObsidianRAG:
+        sections = [f"Section {i} covers theme{i} in depth. " * 12 for i in range(6)]
+        (vault / "Projects" / "long.md").write_text("\n\n".join(sections), encoding="utf-8")
+        rag = make_rag()
+        rag.sync()
+        return rag
+
+    def test_neighbours_merged(self, long_rag: ObsidianRAG) -> None:
+        """測試命中的 chunk 與前後相鄰的 chunks 合併成一個連續段落"""
+        results = long_rag.search("theme3", top_k=1, folder="Projects", expand=EXPAND_MAX_TOKENS)
+
+        passage = results[0]
+        indices = passage["chunk_indices"]
+        assert passage["file_path"] == "Projects/long.md"
+        assert 3 in indices and len(indices) > 1
+        assert indices == list(range(indices[0], indices[-1] + 1))
+        assert "chunk_index" not in passage
+
+    def test_token_budget(self, long_rag: ObsidianRAG) -> None:
+        """測試補上的相鄰 chunks 不超過 token 上限"""
+        hit = long_rag.search("theme3", top_k=1)[0]
+        budget = estimate_tokens(hit["chunk"]) * 2
+
+        passage = long_rag._expand_results([hit], budget)[0]
+
+        assert len(passage["chunk_indices"]) == 2
+        assert sum(estimate_tokens(part) for part in passage["chunk"].split("\n\n")) <= budget
+
+
+class TestMMR:
+    """MMR 多樣性重排測試"""
+
+    def test_mmr_select_prefers_diverse(self) -> None:
+        """測試 lambda < 1 時略過與已選結果重複的候選，lambda = 1 時只看相關性"""
+        relevance = np.array([0.9, 0.89, 0.7])
+        vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+
+        assert mmr_select(relevance, vectors, 2, 0.5) == [0, 2]
+        assert mmr_select(relevance, vectors, 2, 1.0) == [0, 1]
+
+    def test_search_with_mmr(self, rag: ObsidianRAG) -> None:
+        """測試 MMR 搜尋回傳 top_k 個不重複的結果"""
+        results = rag.search("topic", top_k=3, mmr=0.5)
+
+        assert len(results) == 3
+        assert len({r["id"] for r in results}) == 3
+
+
+class TestTwoStage:
+    """筆記向量與兩階段檢索測試"""
+
+    def test_note_vectors_follow_sync(self, rag: ObsidianRAG, vault: Path) -> None:
+        """測試每篇筆記一個筆記向量，刪除筆記時一併移除"""
+        assert rag.note_collection.count() == 5
+        (vault / "Projects" / "n0.md").unlink()
+        rag.sync()
+        assert sorted(rag.note_collection.get()["ids"]) == [
+            f"Projects/n{i}.md" for i in range(1, 5)
+        ]
+
+    def test_search_within_top_notes(self, rag: ObsidianRAG) -> None:
+        """測試 notes 設定時只在最相關的筆記中排序 chunks"""
+        results = rag.search("topic2", top_k=5, notes=1)
+        assert {r["file_path"] for r in results} == {"Projects/n2.md"}
+
+
+class TestLinks:
+    """連結筆記測試"""
+
+    def test_linked_results(self, rag: ObsidianRAG) -> None:
+        """測試附上結果筆記的正向連結與反向連結筆記，各帶最接近查詢的一個 chunk"""
+        hit = rag.search("topic2", top_k=1)[0]
+        assert hit["file_path"] == "Projects/n2.md"
+
+        linked = rag._linked_results(rag._embed_query("topic2"), [hit], 5, None)
+
+        # n2 連到 n3（正向），n1 連到 n2（反向）
+        assert sorted(r["file_path"] for r in linked) == ["Projects/n1.md", "Projects/n3.md"]
+        assert all(r["linked_from"] == ["Projects/n2.md"] for r in linked)
+        assert all(r["link_weight"] == 1 and r["chunk"] for r in linked)
+
+    def test_linked_results_respect_filters(self, rag: ObsidianRAG) -> None:
+        """測試連結筆記也套用搜尋的過濾條件"""
+        hit = rag.search("topic2", top_k=1)[0]
+        where = {"folder": "Elsewhere"}
+        assert rag._linked_results(rag._embed_query("topic2"), [hit], 5, where) == []
+
+
+class TestSearchMany:
+    """批次搜尋測試"""
+
+    @pytest.mark.parametrize(
+        "options",
+        [{}, {"mode": "hybrid"}, {"notes": 2}, {"mmr": 0.5, "links": 1}],
+    )
+    def test_same_as_single_searches(self, rag: ObsidianRAG, options: dict[str, Any]) -> None:
+        """測試 search_many 的結果與逐一呼叫 search 相同"""
+        queries = ["topic1", "topic3", "Note 4"]
+
+        batched = rag.search_many(queries, top_k=3, **options)
+
+        assert batched == [rag.search(q, top_k=3, **options) for q in queries]
+
+    def test_single_embedding_request(self, rag: ObsidianRAG) -> None:
+        """測試所有查詢的向量以一次 embedding 請求取得"""
+        with patch.object(
+            HashProvider, "embed", autospec=True, side_effect=HashProvider.embed
+        ) as embed:
+            rag.search_many(["topic1", "topic2", "topic1"])
+        assert embed.call_count == 1
+
+
+class TestFilters:
+    """folder / tag / 日期過濾測試"""
+
+    @pytest.fixture
+    def filtered_rag(self, make_rag: Callable[..., ObsidianRAG], vault: Path) -> ObsidianRAG:
+        (vault / "Inbox").mkdir()
+        (vault / "Inbox" / "idea.md").write_text(
+            "# Idea\n\n#reading " + "Paragraph about topic2. " * 40, encoding="utf-8"
+        )
+        os.utime(vault / "Projects" / "n2.md", (0, 86400 * 365 * 20))  # 1989 年
+        rag = make_rag()
+        rag.sync()
+        return rag
+
+    def test_build_where(self) -> None:
+        """測試多個條件以 $and 合併，folder 只取頂層資料夾"""
+        assert build_where() is None
+        assert build_where(folder="Projects/sub/") == {"folder": "Projects"}
+        where = build_where(folder="Inbox", tag="#reading")
+        assert where == {"$and": [{"folder": "Inbox"}, {"tags": {"$contains": "reading"}}]}
+
+    def test_folder_and_tag(self, filtered_rag: ObsidianRAG) -> None:
+        """測試過濾在索引內進行，不符合的結果不佔 top_k 名額"""
+        in_folder = filtered_rag.search("topic2", top_k=3, folder="Projects")
+        assert len(in_folder) == 3
+        assert all(r["file_path"].startswith("Projects/") for r in in_folder)
+        tagged = filtered_rag.search("topic2", top_k=3, tag="reading")
+        assert [r["file_path"] for r in tagged] == ["Inbox/idea.md"]
+
+    def test_date_range(self, filtered_rag: ObsidianRAG) -> None:
+        """測試 since / until 依檔案修改時間過濾"""
+        old = filtered_rag.search("topic2", top_k=5, until="2000-01-01")
+        assert [r["file_path"] for r in old] == ["Projects/n2.md"]
+        recent = filtered_rag.search("topic2", top_k=5, since="30d")
+        assert "Projects/n2.md" not in {r["file_path"] for r in recent}
@@ -0,0 +1,187 @@
+"""測試 ObsidianRAG.sync"""
+
+import os
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+from obsidian_rag import ObsidianRAG
+from obsidian_vault import load_manifest
+from rag_embeddings import HashProvider
+from rag_stats import STATS_SNAPSHOT_FILE, read_snapshot
+
+
+class TestSync:
+    """sync 測試"""
+
+    def test_initial_sync(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試首次同步會索引所有非隱藏的筆記"""
+        rag = make_rag()
+        stats = rag.sync()
+        assert stats["added"] == 5
+        assert rag.meta_collection.count() == 5
+
+    def test_chunks_batched_across_files(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試多個檔案的 chunks 合併成一次 embedding 請求與一次 upsert"""
+        rag = make_rag(embed_cache_size=0)
+        with patch.object(
+            HashProvider, "embed", autospec=True, side_effect=HashProvider.embed
+        ) as embed:
+            rag.sync()
+        assert embed.call_count == 1
+        assert len(embed.call_args.args[1]) == rag.collection.count()
+        assert rag.metrics.counts["embed_requests"] == 1
+
+    def test_unchanged_sync(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試沒有變更時只比對預先載入的 meta，不讀取任何檔案"""
+        rag = make_rag()
+        rag.sync()
+        stats = rag.sync()
+        assert stats["unchanged"] == 5
+        assert "files_read" not in rag.metrics.counts
+
+    def test_touched_file_not_reembedded(
+        self, make_rag: Callable[..., ObsidianRAG], vault: Path
+    ) -> None:
+        """測試 mtime 改變但內容相同的檔案只更新 meta，不重新 embed"""
+        rag = make_rag(embed_cache_size=0)
+        rag.sync()
+        note = vault / "Projects" / "n2.md"
+        st = note.stat()
+        os.utime(note, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        with patch.object(HashProvider, "embed", side_effect=AssertionError("不應呼叫")):
+            stats = rag.sync()
+
+        assert stats["touched"] == 1
+        assert stats["updated"] == 0
+        meta = rag.meta_collection.get(ids=["Projects/n2.md"])["metadatas"] or []
+        assert meta[0]["mtime"] == rag._get_file_mtime(note)
+
+    def test_edit_reembeds_changed_chunks_only(
+        self, make_rag: Callable[..., ObsidianRAG], vault: Path
+    ) -> None:
+        """測試 chunk ID 由內容決定：修改一個段落只重新 embed 該段落的 chunk"""
+        note = vault / "Projects" / "long.md"
+        paragraphs = [f"Section {i} talks about subject{i}. " * 20 for i in range(4)]
+        note.write_text("\n\n".join(paragraphs), encoding="utf-8")
+        rag = make_rag(embed_cache_size=0)
+        rag.sync()
+        before = set(rag._get_files_chunk_ids(["Projects/long.md"])["Projects/long.md"])
+        assert len(before) == 4
+
+        paragraphs[2] = "Rewritten section about something else. " * 18
+        note.write_text("\n\n".join(paragraphs), encoding="utf-8")
+        with patch.object(
+            HashProvider, "embed", autospec=True, side_effect=HashProvider.embed
+        ) as embed:
+            stats = rag.sync()
+
+        assert stats["updated"] == 1
+        assert [len(call.args[1]) for call in embed.call_args_list] == [1]
+        after = set(rag._get_files_chunk_ids(["Projects/long.md"])["Projects/long.md"])
+        assert len(after & before) == 3
+
+    def test_deleted_files(self, make_rag: Callable[..., ObsidianRAG], vault: Path) -> None:
+        """測試已刪除檔案的 chunks 與 meta 一併移除"""
+        rag = make_rag()
+        rag.sync()
+        (vault / "Projects" / "n0.md").unlink()
+        (vault / "Projects" / "n1.md").unlink()
+
+        stats = rag.sync()
+
+        assert stats["deleted"] == 2
+        assert rag.meta_collection.count() == 3
+        remaining = rag.collection.get(include=["metadatas"])["metadatas"] or []
+        assert {m["file_path"] for m in remaining} == {f"Projects/n{i}.md" for i in (2, 3, 4)}
+
+    def test_sync_with_warm_cache(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試 embedding 快取命中時（快取回傳 ndarray）同步不呼叫 provider"""
+        make_rag("db1").sync()
+
+        rag = make_rag("db2")
+        with patch.object(HashProvider, "embed", side_effect=AssertionError("不應呼叫")):
+            stats = rag.sync()
+
+        assert stats["added"] == 5
+        assert rag.metrics.counts["embed_cache_hits"] == rag.collection.count()
+        assert "chunks_embedded" not in rag.metrics.counts
+
+    def test_initial_sync_reads_each_file_once(
+        self, make_rag: Callable[..., ObsidianRAG], tmp_path: Path
+    ) -> None:
+        """測試首次同步每個檔案只讀一次，並把 hash 補進 manifest"""
+        rag = make_rag()
+        read_bytes = Path.read_bytes
+        reads: list[str] = []
+
+        def counting(path: Path) -> bytes:
+            if path.suffix == ".md":
+                reads.append(path.name)
+            return read_bytes(path)
+
+        with patch.object(Path, "read_bytes", counting):
+            rag.sync()
+
+        assert sorted(reads) == sorted(set(reads))
+        assert len(reads) == 5
+        manifest = load_manifest(tmp_path / "manifest.json")
+        assert len(manifest) == 5
+        assert all(entry["hash"] for entry in manifest.values())
+
+    def test_folder_stats_updated_incrementally(
+        self, make_rag: Callable[..., ObsidianRAG], vault: Path
+    ) -> None:
+        """測試 sync_paths 以變化量更新快照的資料夾統計，不重新掃描 DB"""
+        rag = make_rag()
+        rag.sync()
+        (vault / "Inbox").mkdir()
+        (vault / "Inbox" / "idea.md").write_text("# Idea\n\n" + "words " * 50, encoding="utf-8")
+        (vault / "Projects" / "n0.md").unlink()
+        (vault / "Projects" / "n1.md").write_text("# Note 1\n\nshort", encoding="utf-8")
+
+        with patch.object(ObsidianRAG, "_folder_stats", side_effect=AssertionError("不應重算")):
+            rag.sync_paths(["Inbox/idea.md", "Projects/n0.md", "Projects/n1.md"])
+
+        snapshot = read_snapshot(rag.db_path / STATS_SNAPSHOT_FILE)
+        assert snapshot is not None
+        assert snapshot["folders"] == rag._folder_stats()
+        assert snapshot["folders"]["Inbox"]["files"] == 1
+        assert snapshot["folders"]["Projects"]["files"] == 4
+
+    def test_sync_paths_new_and_modified(
+        self, make_rag: Callable[..., ObsidianRAG], vault: Path
+    ) -> None:
+        """測試 sync_paths 把沒有 meta 的檔案視為新增，有 meta 的檔案比對後更新"""
+        rag = make_rag()
+        rag.sync()
+        (vault / "Projects" / "new.md").write_text("# New\n\n" + "fresh " * 50, encoding="utf-8")
+        (vault / "Projects" / "n1.md").write_text("# Note 1\n\n" + "edited " * 50, encoding="utf-8")
+
+        stats = rag.sync_paths(["Projects/new.md", "Projects/n1.md", "Projects/n2.md"])
+
+        assert stats["added"] == 1
+        assert stats["updated"] == 1
+        assert stats["unchanged"] == 1
+        assert rag.meta_collection.count() == 6
+
+    def test_layout_upgrade_reuses_stored_embeddings(
+        self, make_rag: Callable[..., ObsidianRAG]
+    ) -> None:
+        """測試舊版 metadata 與以位置編號的 chunk ID 升級時沿用已存的向量，不重新 embed"""
+        rag = make_rag(embed_cache_size=0)
+        with patch(
+            "obsidian_rag.generate_chunk_ids",
+            lambda path, chunks: [f"{path}#{i}" for i in range(len(chunks))],
+        ):
+            rag.sync()
+        files = rag.meta_collection.get()["ids"]
+        rag.meta_collection.update(ids=files, metadatas=[{"metadata_version": 1}] * len(files))
+
+        with patch.object(HashProvider, "embed", side_effect=AssertionError("不應呼叫")):
+            stats = rag.sync()
+
+        assert stats["updated"] == 5
+        assert rag.metrics.counts["embeddings_reused"] == rag.collection.count() == 5
+        assert not any("#" in chunk_id for chunk_id in rag.collection.get()["ids"])
@@ -0,0 +1,32 @@
+"""測試 ObsidianRAG.tune"""
+
+from collections.abc import Callable
+
+from obsidian_rag import ObsidianRAG
+
+
+class TestTune:
+    """tune 測試"""
+
+    def test_tune_grid(self, make_rag: Callable[..., ObsidianRAG]) -> None:
+        """測試量測目前設定與每組參數，結束後不留下暫存 collection"""
+        rag = make_rag()
+        rag.sync()
+
+        results = rag.tune(
+            top_k=3,
+            samples=5,
+            m_values=(8,),
+            construction_ef_values=(50,),
+            search_ef_values=(10, 50),
+        )
+
+        assert [r.get("current", False) for r in results] == [True, False, False]
+        assert [r["search_ef"] for r in results[1:]] == [10, 50]
+        assert all(0 <= r["recall"] <= 1 for r in results)
+        assert results[-1]["recall"] == 1.0
+        assert sorted(c.name for c in rag.client.list_collections()) == [
+            "obsidian_meta",
+            "obsidian_notes",
+            "obsidian_vault",
+        ]
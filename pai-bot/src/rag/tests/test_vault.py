@@ -0,0 +1,32 @@
+"""測試 vault manifest"""
+
+import json
+from pathlib import Path
+
+import pytest
+from obsidian_vault import MANIFEST_VERSION, load_manifest, manifest_entry, save_manifest
+
+
+class TestManifest:
+    """manifest 讀寫測試"""
+
+    def test_round_trip(self, tmp_path: Path) -> None:
+        """測試寫入的 manifest 可以讀回"""
+        files = {"a.md": manifest_entry(5, 1, b"#tag hello")}
+        save_manifest(tmp_path / "manifest.json", files)
+        assert load_manifest(tmp_path / "manifest.json") == files
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            "not json",
+            json.dumps([1, 2]),
+            json.dumps({"version": MANIFEST_VERSION + 1, "files": {}}),
+            json.dumps({"version": MANIFEST_VERSION, "files": ["a.md"]}),
+        ],
+    )
+    def test_invalid_manifest_is_empty(self, tmp_path: Path, content: str) -> None:
+        """測試損毀、版本不同或格式錯誤的 manifest 視為空的"""
+        path = tmp_path / "manifest.json"
+        path.write_text(content, encoding="utf-8")
+        assert load_manifest(path) == {}
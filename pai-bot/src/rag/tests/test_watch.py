@@ -0,0 +1,53 @@
+"""測試 watch 模式的變更事件"""
+
+import shutil
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from unittest.mock import patch
+
+from obsidian_rag import ObsidianRAG
+from rag_watch import _event_changes
+
+
+class TestWatch:
+    """watch 測試"""
+
+    def test_deleted_dotted_folder(self, make_rag: Callable[..., ObsidianRAG], vault: Path) -> None:
+        """測試刪除名稱含 . 的資料夾時，其下的筆記會從索引移除"""
+        (vault / "v1.2").mkdir()
+        (vault / "v1.2" / "release.md").write_text("# Release\n\nnotes", encoding="utf-8")
+        rag = make_rag()
+        rag.sync()
+        shutil.rmtree(vault / "v1.2")
+
+        events = [{(3, str(vault / "v1.2")), (3, str(vault / ".obsidian" / "workspace.json"))}]
+        with patch("watchfiles.watch", return_value=iter(events)):
+            changed = next(_event_changes(vault, 0.1))
+        assert changed == {"v1.2"}
+
+        stats = rag.sync_paths(changed)
+        assert stats["deleted"] == 1
+        assert rag.meta_collection.get(ids=["v1.2/release.md"])["ids"] == []
+
+    def test_batch_after_compact(self, make_rag: Callable[..., ObsidianRAG], vault: Path) -> None:
+        """測試兩批變更之間其他實例執行 compact，下一批仍能寫入替換後的 collections"""
+
+        def changes(*args: object) -> Iterator[set[str]]:
+            (vault / "Projects" / "n1.md").write_text(
+                "# Note 1\n\n" + "first " * 50, encoding="utf-8"
+            )
+            yield {"Projects/n1.md"}
+            make_rag().compact()
+            (vault / "Projects" / "n2.md").write_text(
+                "# Note 2\n\n" + "second " * 50, encoding="utf-8"
+            )
+            yield {"Projects/n2.md"}
+
+        rag = make_rag()
+        with patch("obsidian_rag.watch_vault_changes", changes):
+            rag.watch()
+
+        reader = make_rag()
+        assert reader.search("second", top_k=1)[0]["file_path"] == "Projects/n2.md"
+        meta = reader.meta_collection.get(ids=["Projects/n2.md"])["metadatas"] or []
+        assert meta[0]["mtime"] == rag._get_file_mtime(vault / "Projects" / "n2.md")
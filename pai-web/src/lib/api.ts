@@ -139,14 +139,43 @@ export const workspaceApi = {
 export interface RagStats {
   total_chunks: number
   total_files: number
+  total_notes: number
   db_path: string
   embedding: string
+  embedding_provider: string
+  embedding_dimension: number
+  query_cache_entries: number
+  query_cache_hits: number
+  query_cache_misses: number
+  last_sync_at?: string
+  last_sync_duration?: number
+  folders?: Record<string, { files: number; chunks: number }>
+  sync_in_progress?: boolean
+}
+
+export type RagSearchMode = 'vector' | 'hybrid'
+
+export interface RagSearchFilters {
+  expand?: number
+  mmr?: number
+  notes?: number
+  links?: number
+  folder?: string
+  tag?: string
+  since?: string
+  until?: string
 }
 
 export interface RagDocument {
   file_path: string
   chunk?: string
   distance: number
+  heading_path?: string
+  score?: number
+  chunk_index?: number
+  chunk_indices?: number[]
+  linked_from?: string[]
+  link_weight?: number
 }
 
 export interface RagQueryResult {
@@ -161,6 +190,21 @@ export interface RagSyncResult {
   updated: number
   deleted: number
   unchanged: number
+  touched: number
+  metrics?: RagSyncMetrics
+}
+
+export interface RagSyncMetrics {
+  wall_seconds: number
+  phases: Record<string, number>
+  counts: Record<string, number>
+  embed_latency: { count: number; p50?: number; p90?: number; p99?: number; max?: number }
+}
+
+// 另一個 sync 正在進行（持有 writer lease）時，sync 直接回傳此狀態
+export interface RagSyncInProgress {
+  status: 'sync_in_progress'
+  holder: { pid?: number; command?: string; started_at?: string }
 }
 
 // RAG API functions
@@ -173,14 +217,19 @@ export const ragApi = {
       body: JSON.stringify({ question, max_retries: maxRetries }),
     }),
 
-  search: (query: string, topK = 5) =>
+  search: (
+    query: string,
+    topK = 5,
+    mode: RagSearchMode = 'vector',
+    filters: RagSearchFilters = {},
+  ) =>
     apiFetch<{ results: RagDocument[] }>('/api/rag/search', {
       method: 'POST',
-      body: JSON.stringify({ query, top_k: topK }),
+      body: JSON.stringify({ query, top_k: topK, mode, ...filters }),
     }),
 
   sync: () =>
-    apiFetch<RagSyncResult>('/api/rag/sync', {
+    apiFetch<RagSyncResult | RagSyncInProgress>('/api/rag/sync', {
       method: 'POST',
     }),
 }
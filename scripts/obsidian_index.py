@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """產生 Obsidian vault 的 TOON 格式索引"""
 
-import re
+import sys
 from collections import Counter
 from datetime import UTC, datetime
 from pathlib import Path
@@ -9,6 +9,14 @@ from typing import TypedDict
 
 from toon_py import encode as toon_encode
 
+# vault 掃描與 manifest 與 RAG 索引共用，實作在 pai-bot/src/rag/obsidian_vault.py；
+# 該檔案不在 wheel 中（只打包 setup 與 scripts），本腳本需在 repo checkout 中執行
+RAG_DIR = Path(__file__).resolve().parent.parent / "pai-bot" / "src" / "rag"
+if not (RAG_DIR / "obsidian_vault.py").is_file():
+    sys.exit(f"找不到 {RAG_DIR / 'obsidian_vault.py'}，obsidian_index 需在 repo checkout 中執行")
+sys.path.insert(0, str(RAG_DIR))
+from obsidian_vault import mtime_iso, scan_manifest  # noqa: E402
+
 
 class FileInfo(TypedDict):
     path: str
@@ -34,71 +42,24 @@ class VaultData(TypedDict):
     recent_files: list[FileInfo]
 
 
-def extract_tags(content: str) -> list[str]:
-    """從 markdown 內容提取 tags"""
-    tags = set()
-
-    # Frontmatter tags (tags: [a, b] 或 tags: a, b)
-    frontmatter_match = re.search(r"^---\n(.*?)\n---", content, re.DOTALL)
-    if frontmatter_match:
-        fm = frontmatter_match.group(1)
-        # tags: [a, b, c]
-        list_match = re.search(r"tags:\s*\[(.*?)\]", fm)
-        if list_match:
-            for tag in list_match.group(1).split(","):
-                tag = tag.strip().strip("\"'")
-                if tag:
-                    tags.add(tag)
-        # YAML list format: tags:\n  - a\n  - b
-        yaml_list = re.search(r"tags:\s*\n((?:\s+-\s*.+\n?)+)", fm)
-        if yaml_list:
-            for tag in re.findall(r"-\s*(.+)", yaml_list.group(1)):
-                tag = tag.strip().strip("\"'")
-                if tag:
-                    tags.add(tag)
-        # Inline format: tags: a, b, c (只在沒有換行的情況)
-        if not list_match and not yaml_list:
-            line_match = re.search(r"tags:\s*([^\n]+)$", fm, re.MULTILINE)
-            if line_match:
-                val = line_match.group(1).strip()
-                if val and not val.startswith("-"):
-                    for tag in val.split(","):
-                        tag = tag.strip().strip("\"'")
-                        if tag:
-                            tags.add(tag)
-
-    # Inline #tags (排除 markdown headers)
-    inline_tags = re.findall(r"(?<!\S)#([a-zA-Z\u4e00-\u9fff][\w\u4e00-\u9fff/-]*)", content)
-    tags.update(inline_tags)
-
-    return [t for t in tags if t]
-
-
 def scan_vault(vault_path: Path) -> VaultData:
-    """掃描 vault 並收集資訊"""
+    """掃描 vault 並收集資訊
+
+    tags 來自共用的 manifest：RAG sync 讀過且未修改的檔案不會重新讀取
+    """
     files: list[FileInfo] = []
     all_tags: Counter[str] = Counter()
     folders: Counter[str] = Counter()
 
-    for md_file in vault_path.rglob("*.md"):
-        # 跳過隱藏資料夾
-        if any(part.startswith(".") for part in md_file.parts):
-            continue
-
-        rel_path = md_file.relative_to(vault_path)
-        mtime = datetime.fromtimestamp(md_file.stat().st_mtime, tz=UTC)
-
-        # 提取 tags
-        try:
-            content = md_file.read_text(encoding="utf-8")
-            tags = extract_tags(content)
-        except Exception:
-            tags = []
+    # 隱藏資料夾在掃描時就略過
+    for path, entry in scan_manifest(vault_path)["files"].items():
+        rel_path = Path(path)
+        tags = entry["tags"]
 
         files.append(
             FileInfo(
-                path=str(rel_path),
-                modified=mtime.isoformat(),
+                path=path,
+                modified=mtime_iso(entry["mtime_ns"]),
                 tags=tags,
             )
         )
@@ -149,8 +110,6 @@ def generate_index(vault_path: str | Path, output_path: str | Path | None = None
 
 
 if __name__ == "__main__":
-    import sys
-
     if len(sys.argv) < 2:
         print("Usage: python obsidian_index.py <vault_path> [output_path]")
         sys.exit(1)